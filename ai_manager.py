@@ -4,6 +4,8 @@ import os
 from dotenv import load_dotenv
 import random 
 import datetime
+import asyncio
+import metrics
 
 load_dotenv()
 api_key = os.getenv("GEMINI_API_KEY")
@@ -13,91 +15,134 @@ client = genai.Client(api_key=api_key)
 # 1. SWITCH TO STABLE MODEL (Fixes the 429/503 Crashes)
 MODEL_NAME = "gemini-3-flash-preview" 
 
+# Per-call deadlines (seconds). A slow model only delays the command that asked for it.
+QUESTION_TIMEOUT = 20
+DARE_TIMEOUT = 20
+CHOICES_TIMEOUT = 15
+DATETIME_TIMEOUT = 10
+
+@metrics.timed("ai", "gemini_request")
+async def _generate(prompt, timeout, config=None):
+    """
+    Runs one Gemini request on the SDK's async client with a hard deadline.
+    On timeout the request is cancelled and asyncio.TimeoutError is raised;
+    cancelling the calling task cancels the request too.
+    """
+    try:
+        response = await asyncio.wait_for(
+            client.aio.models.generate_content(
+                model=MODEL_NAME,
+                contents=prompt,
+                config=config
+            ),
+            timeout=timeout
+        )
+    except asyncio.TimeoutError:
+        raise asyncio.TimeoutError(f"no response within {timeout}s") from None
+    return response.text
+
 # ==========================================
 # 1. DAILY QUESTION (With Rotation Fix)
 # ==========================================
-async def get_ai_question():
-    try:
-        # 2. FORCE VARIETY: Pick the theme in Python, not AI
-        themes = [
-            "DEEP: Ask about a childhood memory, a core value, or a fear.",
-            "SPICY: Ask about a turn-on, an attractive trait, or a romantic wish.",
-            "FUTURE: Ask about a specific future scenario (kids, house, travel, aging).",
-            "HYPOTHETICAL: Ask a 'What if we were...' or 'Zombie apocalypse' style question.",
-            "NOSTALGIA: Ask about a specific happy memory from our relationship.",
-            "GRATITUDE: Ask what is one small thing they appreciate today."
-        ]
-        chosen_theme = random.choice(themes)
 
-        prompt = f"""
-        You are a relationship coach for a couple.
-        Generate ONE unique question for them based on this theme:
-        👉 {chosen_theme}
-        
-        CRITICAL INSTRUCTION: Do NOT ask about wrestling, fighting, or superpowers.
-        Output ONLY the question text. Keep it short and engaging.
-        """
-        
-        response = client.models.generate_content(
-            model=MODEL_NAME, 
-            contents=prompt, 
-            config=types.GenerateContentConfig(
-                temperature=1.1, # High creativity
-                top_p=0.95,
-                top_k=40,
-            )
+# 2. FORCE VARIETY: Pick the theme in Python, not AI
+QUESTION_THEMES = [
+    "DEEP: Ask about a childhood memory, a core value, or a fear.",
+    "SPICY: Ask about a turn-on, an attractive trait, or a romantic wish.",
+    "FUTURE: Ask about a specific future scenario (kids, house, travel, aging).",
+    "HYPOTHETICAL: Ask a 'What if we were...' or 'Zombie apocalypse' style question.",
+    "NOSTALGIA: Ask about a specific happy memory from our relationship.",
+    "GRATITUDE: Ask what is one small thing they appreciate today."
+]
+
+FALLBACK_QUESTION = "**If we could teleport anywhere right now, where would we go?**"
+
+@metrics.timed("ai")
+async def generate_question(theme):
+    """Asks Gemini for one question on `theme`. Raises on failure (no fallback)."""
+    prompt = f"""
+    You are a relationship coach for a couple.
+    Generate ONE unique question for them based on this theme:
+    👉 {theme}
+    
+    CRITICAL INSTRUCTION: Do NOT ask about wrestling, fighting, or superpowers.
+    Output ONLY the question text. Keep it short and engaging.
+    """
+    
+    text = await _generate(
+        prompt,
+        QUESTION_TIMEOUT,
+        config=types.GenerateContentConfig(
+            temperature=1.1, # High creativity
+            top_p=0.95,
+            top_k=40,
         )
-        
-        # Cleanup response
-        return f"**{response.text.strip().replace('*', '').replace('"', '')}**"
+    )
+    
+    # Cleanup response
+    cleaned = text.strip().replace('*', '').replace('"', '')
+    return f"**{cleaned}**"
 
+@metrics.timed("ai")
+async def get_ai_question():
+    try:
+        return await generate_question(random.choice(QUESTION_THEMES))
     except Exception as e:
         print(f"⚠️ AI Question Error: {e}")
-        return "**If we could teleport anywhere right now, where would we go?**"
+        return FALLBACK_QUESTION
 
 # ==========================================
 # 2. DAILY DARE (With Format Fix)
 # ==========================================
+
+FALLBACK_DARE = ("Send a selfie making a funny face.", 50)
+
+@metrics.timed("ai")
+async def generate_dare():
+    """Asks Gemini for one dare. Returns (task, price); raises on failure (no fallback)."""
+    prompt = """
+    Generate ONE fun relationship dare.
+    Format: DARE_TEXT | PRICE_INT
+    Example: Do a chicken dance | 50
+    
+    Constraints: 
+    - No touch (Long Distance). 
+    - No strangers. 
+    - Fun but slightly embarrassing or physically active (e.g., hold a plank, sing a song).
+    """
+    
+    text = await _generate(
+        prompt,
+        DARE_TIMEOUT,
+        config=types.GenerateContentConfig(
+            temperature=1.1,
+            top_p=0.95,
+            top_k=40,
+        )
+    )
+    
+    # 3. ROBUST CLEANING (Fixes "invalid literal" errors)
+    raw = text.strip().replace('*', '').replace('"', '')
+    
+    if '|' in raw:
+        parts = raw.split('|')
+        return parts[0].strip(), int(parts[1].strip())
+    else:
+        # Fallback if AI forgets the pipe
+        return raw, 30
+
+@metrics.timed("ai")
 async def get_ai_dare():
     try:
-        prompt = """
-        Generate ONE fun relationship dare.
-        Format: DARE_TEXT | PRICE_INT
-        Example: Do a chicken dance | 50
-        
-        Constraints: 
-        - No touch (Long Distance). 
-        - No strangers. 
-        - Fun but slightly embarrassing or physically active (e.g., hold a plank, sing a song).
-        """
-        
-        response = client.models.generate_content(
-            model=MODEL_NAME, 
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                temperature=1.1,
-                top_p=0.95,
-                top_k=40,
-            )
-        )
-        
-        # 3. ROBUST CLEANING (Fixes "invalid literal" errors)
-        raw = response.text.strip().replace('*', '').replace('"', '')
-        
-        if '|' in raw:
-            parts = raw.split('|')
-            return parts[0].strip(), int(parts[1].strip())
-        else:
-            # Fallback if AI forgets the pipe
-            return raw, 30
-            
+        return await generate_dare()
     except Exception as e:
         print(f"⚠️ AI Dare Error: {e}")
-        return "Send a selfie making a funny face.", 50
+        return FALLBACK_DARE
 
 # ==========================================
 # 3. DECISION ROOM (Food, Movies, etc.)
 # ==========================================
+@metrics.timed("ai")
 async def get_choices(category, criteria):
     try:
         prompt = f"""
@@ -107,13 +152,10 @@ async def get_choices(category, criteria):
         Output ONLY a simple list of 3 items.
         """
         
-        response = client.models.generate_content(
-            model=MODEL_NAME, 
-            contents=prompt
-        )
+        text = await _generate(prompt, CHOICES_TIMEOUT)
         
         # Split lines and clean up "1. ", "-", etc.
-        lines = response.text.strip().split('\n')
+        lines = text.strip().split('\n')
         clean_lines = [line.lstrip("1234567890.-* ") for line in lines if line.strip()]
         
         return clean_lines[:3] # Ensure we return exactly 3
@@ -125,6 +167,7 @@ async def get_choices(category, criteria):
 # ==========================================
 # 4. REMINDER PARSING (NLP)
 # ==========================================
+@metrics.timed("ai")
 async def extract_datetime(user_input, current_time_str):
     try:
         prompt = f"""
@@ -137,12 +180,9 @@ async def extract_datetime(user_input, current_time_str):
         If no time is found, output: None
         """
         
-        response = client.models.generate_content(
-            model=MODEL_NAME, 
-            contents=prompt
-        )
+        text = await _generate(prompt, DATETIME_TIMEOUT)
         
-        return response.text.strip()
+        return text.strip()
         
     except Exception as e:
         print(f"⚠️ AI Time Error: {e}")
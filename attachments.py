@@ -0,0 +1,150 @@
+import time
+import asyncio
+from collections import Counter
+from urllib.parse import urlparse, parse_qs
+import discord
+
+# Cache lifetime when the CDN URL carries no expiry
+DEFAULT_TTL = 6 * 3600
+# Treat signed CDN URLs as expired this long before Discord does
+EXPIRY_MARGIN = 10 * 60
+# How long to remember that a source message is gone
+MISSING_TTL = 10 * 60
+# Hot entries expiring within this window are refreshed ahead of time
+PREFETCH_WINDOW = 45 * 60
+PREFETCH_LIMIT = 25
+
+
+def cdn_expiry(url):
+    """Unix time a signed Discord CDN URL stops working (its `ex` param), or None."""
+    try:
+        ex = parse_qs(urlparse(url).query).get("ex")
+        return int(ex[0], 16) if ex else None
+    except ValueError:
+        return None
+
+
+class AttachmentResolver:
+    """
+    Turns stored "ChannelID|MessageID" strings into the message's first
+    attachment, with a cache that expires together with the signed CDN URL.
+    Deleted/edited source messages update the cache through the raw
+    message events, and hot entries are refreshed before they expire.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._cache = {}        # key -> (attachment or None, expires_at)
+        self._inflight = {}     # key -> Future, so concurrent lookups share one fetch
+        self.hits = Counter()   # key -> lookups, to find hot entries
+        self.stats = Counter()  # cache_hit / cache_miss / fetch_error
+
+    @staticmethod
+    def key(channel_id, message_id):
+        return f"{channel_id}|{message_id}"
+
+    # ==========================================
+    # 1. LOOKUPS
+    # ==========================================
+    async def resolve(self, attachment_data):
+        """Returns the discord.Attachment behind "ChannelID|MessageID", or None."""
+        if not attachment_data:
+            return None
+
+        self.hits[attachment_data] += 1
+        cached = self._cache.get(attachment_data)
+        if cached and cached[1] > time.time():
+            self.stats["cache_hit"] += 1
+            return cached[0]
+
+        self.stats["cache_miss"] += 1
+        return await self._fetch_shared(attachment_data)
+
+    async def resolve_url(self, attachment_data):
+        attachment = await self.resolve(attachment_data)
+        return attachment.url if attachment else None
+
+    async def _fetch_shared(self, attachment_data):
+        future = self._inflight.get(attachment_data)
+        if future:
+            return await future
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[attachment_data] = future
+        try:
+            attachment = await self._fetch(attachment_data)
+            future.set_result(attachment)
+            return attachment
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Waiters still get it; don't warn if there are none
+            raise
+        finally:
+            del self._inflight[attachment_data]
+
+    async def _fetch(self, attachment_data):
+        try:
+            c_id, m_id = attachment_data.split('|')
+            channel = self.bot.get_channel(int(c_id))
+            if not channel:
+                self._store(attachment_data, None)
+                return None
+            msg = await channel.fetch_message(int(m_id))
+        except (discord.NotFound, ValueError):
+            self._store(attachment_data, None)
+            return None
+        except discord.HTTPException as e:
+            # Transient (rate limit / 5xx): don't cache, let the next lookup retry
+            self.stats["fetch_error"] += 1
+            print(f"⚠️ Attachment fetch failed for {attachment_data}: {e}")
+            return None
+
+        attachment = msg.attachments[0] if msg.attachments else None
+        self._store(attachment_data, attachment)
+        return attachment
+
+    def _store(self, key, attachment):
+        now = time.time()
+        if attachment is None:
+            expires_at = now + MISSING_TTL
+        else:
+            expires_at = now + DEFAULT_TTL
+            cdn_ex = cdn_expiry(attachment.url)
+            if cdn_ex:
+                expires_at = min(expires_at, cdn_ex - EXPIRY_MARGIN)
+        self._cache[key] = (attachment, expires_at)
+
+    # ==========================================
+    # 2. INVALIDATION (From raw gateway events)
+    # ==========================================
+    def forget(self, channel_id, message_id):
+        """The source message was deleted: remember that it's gone."""
+        key = self.key(channel_id, message_id)
+        if key in self._cache or key in self.hits:
+            self._store(key, None)
+
+    def update_from_message(self, message):
+        """The source message was edited: take the fresh attachment from the event."""
+        key = self.key(message.channel.id, message.id)
+        if key in self._cache or key in self.hits:
+            self._store(key, message.attachments[0] if message.attachments else None)
+
+    # ==========================================
+    # 3. PREFETCH (Keep hot entries warm)
+    # ==========================================
+    async def refresh_hot(self):
+        """Re-resolves the most used entries that expire soon, so lookups stay at zero REST calls."""
+        deadline = time.time() + PREFETCH_WINDOW
+        refreshed = 0
+        for key, _ in self.hits.most_common(PREFETCH_LIMIT):
+            cached = self._cache.get(key)
+            if cached and cached[0] is None:
+                continue  # Known to be gone
+            if cached and cached[1] > deadline:
+                continue  # Still fresh
+            await self._fetch_shared(key)
+            refreshed += 1
+        return refreshed
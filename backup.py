@@ -0,0 +1,332 @@
+import io
+import os
+import gzip
+import json
+import time
+import asyncio
+import hashlib
+import tempfile
+import discord
+import psycopg2
+import database
+import outbox
+
+# pg_dump output is read this much at a time (memory stays flat)
+READ_SIZE = 64 * 1024
+# Headroom below the guild's upload limit for the multipart envelope
+UPLOAD_MARGIN = 512 * 1024
+# Used when the channel isn't in a guild (shouldn't happen for #database-backup)
+DEFAULT_UPLOAD_LIMIT = 10 * 1024 * 1024
+# Status message edits at most this often
+PROGRESS_INTERVAL = 5
+# bot_state key: last change_log id already covered by a backup
+CHECKPOINT_KEY = "backup_checkpoint"
+
+
+class ChunkUploader:
+    """
+    Takes a byte stream and uploads it to a channel as numbered parts that
+    each fit the upload limit. Parts are spooled to a temp file, never held
+    in memory, and every part is hashed so the manifest can verify them.
+    With a `queue` (outbox.Outbox), uploads and status edits wait for the
+    channel's rate budget at low priority.
+    """
+
+    def __init__(self, channel, name, queue=None):
+        self.channel = channel
+        self.name = name
+        self.queue = queue
+        limit = channel.guild.filesize_limit if getattr(channel, "guild", None) else DEFAULT_UPLOAD_LIMIT
+        self.part_size = max(limit - UPLOAD_MARGIN, limit // 2)
+
+        self.parts = []
+        self.total_size = 0
+        self.total_hash = hashlib.sha256()
+        self.started = time.monotonic()
+
+        self._file = None
+        self._part_hash = None
+        self._part_len = 0
+        self._status = None
+        self._last_progress = 0
+
+    async def write(self, data):
+        while data:
+            if self._file is None:
+                self._file = tempfile.TemporaryFile()
+                self._part_hash = hashlib.sha256()
+                self._part_len = 0
+
+            take = data[:self.part_size - self._part_len]
+            data = data[len(take):]
+            self._file.write(take)
+            self._part_hash.update(take)
+            self.total_hash.update(take)
+            self._part_len += len(take)
+            self.total_size += len(take)
+
+            if self._part_len >= self.part_size:
+                await self._upload_part()
+            await self._progress()
+
+    async def _upload_part(self):
+        index = len(self.parts) + 1
+        filename = f"{self.name}.part{index:03d}"
+        self._file.seek(0)
+        try:
+            await self._send(file=discord.File(self._file, filename=filename))
+        finally:
+            self._file.close()
+        self.parts.append({"file": filename, "size": self._part_len, "sha256": self._part_hash.hexdigest()})
+        self._file = None
+        await self._progress(force=True)
+
+    async def _progress(self, force=False, final=False):
+        now = time.monotonic()
+        if not force and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+
+        icon = "✅" if final else "⏳"
+        text = (
+            f"{icon} `{self.name}`: {self.total_size / 1024 / 1024:.1f} MB streamed, "
+            f"{len(self.parts)} part(s) uploaded, {now - self.started:.0f}s"
+        )
+        try:
+            if self._status:
+                await self._edit(self._status, content=text)
+            else:
+                self._status = await self._send(content=text)
+        except discord.HTTPException as e:
+            print(f"⚠️ Backup progress update failed: {e}")
+
+    async def finish(self, **extra):
+        """Uploads the last part and the manifest. Returns the manifest dict."""
+        if self._file is not None and self._part_len:
+            await self._upload_part()
+
+        manifest = {
+            "name": self.name,
+            "parts": self.parts,
+            "total_size": self.total_size,
+            "sha256": self.total_hash.hexdigest(),
+            "seconds": round(time.monotonic() - self.started, 1),
+            **extra,
+        }
+        data = json.dumps(manifest, indent=2).encode()
+        await self._send(file=discord.File(io.BytesIO(data), filename=f"{self.name}.manifest.json"))
+        await self._progress(force=True, final=True)
+        return manifest
+
+    def _send(self, **kwargs):
+        if self.queue:
+            return self.queue.send(self.channel, outbox.LOW, **kwargs)
+        return self.channel.send(**kwargs)
+
+    def _edit(self, message, **kwargs):
+        if self.queue:
+            return self.queue.edit(message, outbox.LOW, **kwargs)
+        return message.edit(**kwargs)
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# ==========================================
+# FULL DUMP (pg_dump, streamed)
+# ==========================================
+async def full_backup(channel, db_url, name, queue=None):
+    """
+    Runs pg_dump as an async subprocess and streams its output to `channel`
+    in upload-sized parts, followed by a manifest. pg_dump's custom format
+    is already zlib-compressed, so compression runs in the pg_dump process
+    rather than on the event loop. Returns the manifest.
+
+    On success the incremental checkpoint moves to the change log position
+    read before the dump started (later changes are in the next delta too;
+    replaying them twice is harmless) and older log entries are pruned.
+    """
+    head = await database.get_change_log_head()
+    proc = await asyncio.create_subprocess_exec(
+        "pg_dump", "--format=custom", "--no-owner", "--dbname", db_url,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    # Drain stderr alongside stdout so a chatty pg_dump can't fill the pipe and stall
+    stderr_task = asyncio.create_task(proc.stderr.read())
+
+    uploader = ChunkUploader(channel, name, queue)
+    try:
+        while True:
+            data = await proc.stdout.read(READ_SIZE)
+            if not data:
+                break
+            await uploader.write(data)
+
+        returncode = await proc.wait()
+        stderr = (await stderr_task).decode(errors="replace").strip()
+        if returncode != 0:
+            raise RuntimeError(f"pg_dump exited with {returncode}: {stderr[-500:]}")
+
+        manifest = await uploader.finish(kind="full", format="pg_dump custom", change_log_id=head)
+    except BaseException:
+        uploader.abort()
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        stderr_task.cancel()
+        raise
+
+    await database.set_state(CHECKPOINT_KEY, str(head))
+    await database.prune_change_log(head)
+    return manifest
+
+
+# ==========================================
+# INCREMENTAL (Rows changed since the checkpoint)
+# ==========================================
+async def incremental_backup(channel, name, queue=None):
+    """
+    Uploads the rows changed since the last checkpoint as a gzipped JSON-lines
+    delta (latest state per row, deletes included). Returns the manifest, or
+    None if nothing changed. Raises LookupError if there is no full backup
+    to build on yet.
+    """
+    checkpoint = await database.get_state(CHECKPOINT_KEY)
+    if checkpoint is None:
+        raise LookupError("no full backup recorded yet")
+    checkpoint = int(checkpoint)
+
+    with tempfile.TemporaryFile() as spool:
+        # Export + compression run on the DB worker thread, off the event loop
+        with gzip.GzipFile(fileobj=spool, mode="wb") as delta:
+            last_id, rows = await database.export_changes(checkpoint, delta)
+        if rows == 0:
+            return None
+
+        spool.seek(0)
+        uploader = ChunkUploader(channel, name, queue)
+        try:
+            while True:
+                data = spool.read(READ_SIZE)
+                if not data:
+                    break
+                await uploader.write(data)
+            manifest = await uploader.finish(
+                kind="incremental", format="jsonl.gz", after_id=checkpoint, last_id=last_id, rows=rows
+            )
+        except BaseException:
+            uploader.abort()
+            raise
+
+    await database.set_state(CHECKPOINT_KEY, str(last_id))
+    return manifest
+
+
+# ==========================================
+# REASSEMBLY (Run locally on downloaded parts)
+# ==========================================
+def reassemble(manifest_path, output_path):
+    """Joins the parts listed in a manifest (from the same folder), checking every hash."""
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    folder = os.path.dirname(os.path.abspath(manifest_path))
+
+    total_hash = hashlib.sha256()
+    with open(output_path, "wb") as out:
+        for part in manifest["parts"]:
+            part_hash = hashlib.sha256()
+            with open(os.path.join(folder, part["file"]), "rb") as f:
+                for block in iter(lambda: f.read(READ_SIZE), b""):
+                    part_hash.update(block)
+                    total_hash.update(block)
+                    out.write(block)
+            if part_hash.hexdigest() != part["sha256"]:
+                raise ValueError(f"{part['file']} is corrupted (sha256 mismatch)")
+
+    if total_hash.hexdigest() != manifest["sha256"]:
+        raise ValueError("reassembled file doesn't match the manifest sha256")
+    return manifest
+
+
+def replay(db_url, delta_path):
+    """
+    Applies one reassembled .jsonl.gz delta to a database restored from the
+    preceding full dump. Deltas must be replayed in order. Returns rows applied.
+    """
+    conn = psycopg2.connect(db_url)
+    applied = 0
+    try:
+        with conn.cursor() as cur, gzip.open(delta_path, "rt") as lines:
+            columns, generated = _table_columns(cur)
+            for line in lines:
+                change = json.loads(line)
+                table = change["table"]
+                if table not in database.CHANGE_TRACKED_TABLES:
+                    raise ValueError(f"unexpected table in delta: {table}")
+                key_columns = database.CHANGE_TRACKED_TABLES[table]
+                key_sql = " AND ".join(f"{c} = %s" for c in key_columns)
+                key_values = [change["key"][c] for c in key_columns]
+
+                if change["op"] == "DELETE":
+                    cur.execute(f"DELETE FROM {table} WHERE {key_sql}", key_values)
+                else:
+                    row = {c: v for c, v in change["row"].items() if c in columns[table] and c not in generated[table]}
+                    names = list(row)
+                    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in names if c not in key_columns)
+                    conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+                    cur.execute(
+                        f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join(['%s'] * len(names))}) "
+                        f"ON CONFLICT ({', '.join(key_columns)}) {conflict}",
+                        [row[c] for c in names],
+                    )
+                applied += 1
+
+            # Serial counters must not hand out IDs that the delta already used
+            for table in database.CHANGE_TRACKED_TABLES:
+                for column in columns[table]:
+                    cur.execute("SELECT pg_get_serial_sequence(%s, %s)", (table, column))
+                    sequence = cur.fetchone()[0]
+                    if sequence:
+                        cur.execute(f"SELECT setval(%s, GREATEST((SELECT MAX({column}) FROM {table}), 1))", (sequence,))
+        conn.commit()
+    finally:
+        conn.close()
+    return applied
+
+def _table_columns(cur):
+    """Returns ({table: {columns}}, {table: {generated columns}}) for the tracked tables."""
+    cur.execute("""
+        SELECT table_name, column_name, is_generated FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = ANY(%s)
+    """, (list(database.CHANGE_TRACKED_TABLES),))
+    columns = {table: set() for table in database.CHANGE_TRACKED_TABLES}
+    generated = {table: set() for table in database.CHANGE_TRACKED_TABLES}
+    for table, column, is_generated in cur.fetchall():
+        columns[table].add(column)
+        if is_generated == "ALWAYS":
+            generated[table].add(column)
+    return columns, generated
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rebuild and restore backups downloaded from Discord.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild = commands.add_parser("reassemble", help="join the parts listed in a manifest")
+    rebuild.add_argument("manifest")
+    rebuild.add_argument("output")
+    apply = commands.add_parser("replay", help="apply incremental deltas (in order) after pg_restore")
+    apply.add_argument("db_url")
+    apply.add_argument("deltas", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "reassemble":
+        result = reassemble(args.manifest, args.output)
+        print(f"✅ Rebuilt {args.output} from {len(result['parts'])} part(s), {result['total_size']} bytes")
+    else:
+        for path in args.deltas:
+            print(f"✅ {path}: {replay(args.db_url, path)} row(s) applied")
@@ -0,0 +1,405 @@
+"""
+End-to-end benchmark for the bot's hot paths, fully offline.
+
+Drives the real handlers from main.py (`!snap`, `!get`, `!dare`, the shop
+Buy modal, the daily-question Answer button + modal and the dashboard
+refresh) with stand-in Discord objects and a canned-latency Gemini client,
+against a real Postgres. Reports ops/sec and p50/p99 latency per path.
+
+The handlers write real rows (moments, answers, dares, ledger entries), so
+point it at a throwaway database:
+
+    python benchmarks/bench_e2e.py --db-url postgresql://localhost/bench \
+        [--ops N] [--concurrency N] [--ai-latency S] [--discord-latency S] [--paths snap,get,...]
+"""
+import os
+import io
+import sys
+import time
+import random
+import asyncio
+import argparse
+import datetime
+import itertools
+import contextlib
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PATHS = ("snap", "get", "dare", "shop", "answer", "dashboard")
+# Stand-in Discord users (two partners, like the real guild)
+USERS = ((900000000000000001, "BenchAlice"), (900000000000000002, "BenchBob"))
+WIKI_KEYS = ("anniversary", "favourite food", "first date", "wifi password", "ring size")
+STARTING_BALANCE = 10 ** 9
+# Untimed ops per path before the measured run
+WARMUP_OPS = 6
+
+
+# ==========================================
+# 1. STAND-INS (Discord + Gemini)
+# ==========================================
+class FakeDiscord:
+    """Hands out message IDs and applies the simulated REST round trip to every API call."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.ids = itertools.count(int(time.time() * 1000) << 22)
+        self.calls = 0
+        self.channels = {}
+
+    async def api(self):
+        self.calls += 1
+        await asyncio.sleep(self.latency * random.uniform(0.5, 1.5) if self.latency else 0)
+
+    def get_channel(self, channel_id):
+        if channel_id is None:
+            return None
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            channel = self.channels[channel_id] = FakeChannel(self, channel_id)
+        return channel
+
+
+class FakeAttachment:
+    def __init__(self, message_id):
+        self.url = f"https://cdn.example.invalid/attachments/{message_id}/photo.png"
+        self.filename = "photo.png"
+
+    async def to_file(self):
+        return None   # Stand-in: the fake channels ignore the file
+
+
+class FakeMessage:
+    def __init__(self, discord_api, channel, message_id=None, embeds=None, attachments=None, author=None):
+        self.discord = discord_api
+        self.id = message_id or next(discord_api.ids)
+        self.channel = channel
+        self.embeds = embeds or []
+        self.attachments = attachments or []
+        self.author = author
+
+    async def edit(self, embed=None, **kwargs):
+        await self.discord.api()
+        if embed is not None:
+            self.embeds = [embed]
+        return self
+
+    async def delete(self):
+        await self.discord.api()
+
+    async def add_reaction(self, emoji):
+        await self.discord.api()
+
+
+class FakeChannel:
+    def __init__(self, discord_api, channel_id):
+        self.discord = discord_api
+        self.id = channel_id
+        self.mention = f"<#{channel_id}>"
+
+    async def send(self, content=None, embed=None, view=None, **kwargs):
+        await self.discord.api()
+        return FakeMessage(self.discord, self, embeds=[embed] if embed else [])
+
+    async def fetch_message(self, message_id):
+        await self.discord.api()
+        return FakeMessage(self.discord, self, message_id, attachments=[FakeAttachment(message_id)])
+
+    def get_partial_message(self, message_id):
+        return FakeMessage(self.discord, self, message_id)
+
+    async def purge(self, limit=None):
+        await self.discord.api()
+
+
+class FakeUser:
+    def __init__(self, discord_api, user_id, name):
+        self.discord = discord_api
+        self.id = user_id
+        self.name = self.display_name = name
+        self.mention = f"<@{user_id}>"
+
+    async def send(self, content=None, embed=None, **kwargs):
+        await self.discord.api()
+
+
+class FakeContext:
+    """Just enough of commands.Context for the command callbacks."""
+
+    def __init__(self, discord_api, user, channel, attachments=False):
+        self.author = user
+        self.channel = channel
+        message_id = next(discord_api.ids)
+        self.message = FakeMessage(
+            discord_api, channel, message_id, attachments=[FakeAttachment(message_id)] if attachments else [], author=user
+        )
+
+    async def send(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+
+class FakeResponse:
+    def __init__(self, discord_api):
+        self.discord = discord_api
+        self.done = False
+        self.modal = None
+
+    def is_done(self):
+        return self.done
+
+    async def _respond(self):
+        await self.discord.api()
+        self.done = True
+
+    async def send_message(self, content=None, **kwargs):
+        await self._respond()
+
+    async def send_modal(self, modal):
+        self.modal = modal
+        await self._respond()
+
+    async def defer(self, **kwargs):
+        await self._respond()
+
+    async def edit_message(self, **kwargs):
+        await self._respond()
+
+
+class FakeInteraction:
+    def __init__(self, discord_api, user, channel, message=None):
+        self.id = next(discord_api.ids)
+        self.user = user
+        self.channel = channel
+        self.message = message
+        self.response = FakeResponse(discord_api)
+        self.followup = SimpleNamespace(send=channel.send)
+
+    async def edit_original_response(self, **kwargs):
+        await self.channel.discord.api()
+
+
+class FakeGemini:
+    """Replaces ai_manager.client: answers after a canned delay, in the formats the parsers expect."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self.generate_content))
+
+    async def generate_content(self, model, contents, config=None):
+        self.calls += 1
+        await asyncio.sleep(self.latency * random.uniform(0.8, 1.2))
+        if "DARE_TEXT | PRICE_INT" in contents:
+            text = f"Do {random.randint(10, 40)} jumping jacks on video | {random.choice((20, 30, 50))}"
+        else:
+            text = "**If we swapped lives for a day, what would you do first?**"
+        return SimpleNamespace(text=text)
+
+
+# ==========================================
+# 2. PATHS (One op = one user action through the real handler)
+# ==========================================
+class Bench:
+    def __init__(self, main, discord_api):
+        self.main = main
+        self.config = main.config
+        self.discord = discord_api
+        self.users = [FakeUser(discord_api, user_id, name) for user_id, name in USERS]
+        self.run_token = f"{int(time.time()):x}"
+
+    def channel(self, name):
+        return self.discord.get_channel(self.config.CHANNELS.get(name))
+
+    def user(self, n):
+        return self.users[n % len(self.users)]
+
+    async def setup(self):
+        database = self.main.database
+        await database.init_db()
+        for user in self.users:
+            # Top up rather than add, so repeated runs don't overflow the INTEGER balance
+            balance = await database.get_balance(user.id)
+            if balance < STARTING_BALANCE // 2:
+                await database.add_money(user.id, STARTING_BALANCE - balance, reason="benchmark float")
+        wiki = self.channel("wiki_of_us")
+        for key in WIKI_KEYS:
+            await database.set_wiki_entry(key, f"All about {key}.", f"{wiki.id}|{next(self.discord.ids)}", "bench")
+        for n in range(50):
+            await database.add_moment(
+                self.user(n).id, f"bench moment {n} at the beach" if n % 2 else f"bench moment {n} cooking dinner",
+                f"{self.channel('moments').id}|{next(self.discord.ids)}",
+                datetime.datetime.now(ZoneInfo(database.LOCAL_TZ)), "LOG",
+            )
+        await self.main.reservoir.refill()
+
+    async def snap(self, n):
+        # One challenged user per op: a user only ever has one open snap challenge
+        user_id, name = USERS[n % len(USERS)]
+        user = FakeUser(self.discord, user_id + 1000 * (n + 1), f"{name}{n}")
+        self.main.active_snaps[user.id] = datetime.datetime.now(ZoneInfo("Asia/Kuala_Lumpur")) + datetime.timedelta(minutes=15)
+        ctx = FakeContext(self.discord, user, self.channel("moments"), attachments=True)
+        await self.main.snap.callback(ctx, caption=f"bench snap {n}")
+
+    async def get(self, n):
+        # Exact keys, fuzzy matches (wiki + moment captions) and misses
+        key = (WIKI_KEYS[n % len(WIKI_KEYS)], "beach", "cooking", "wifi", f"nothing-{n}")[n % 5]
+        ctx = FakeContext(self.discord, self.user(n), self.channel("wiki_of_us"))
+        await self.main.get.callback(ctx, key=key)
+
+    async def dare(self, n):
+        ctx = FakeContext(self.discord, self.user(n), self.channel("truth_or_dare"))
+        await self.main.dare.callback(ctx)
+
+    async def shop(self, n):
+        main = self.main
+        menu = FakeMessage(self.discord, self.channel("shop"))
+        interaction = FakeInteraction(self.discord, self.user(n), menu.channel, menu)
+        await main.ShopView().buy_button.callback(interaction)
+
+        modal = interaction.response.modal
+        modal.item_id._value = random.choice(list(self.config.SHOP_ITEMS))
+        await modal.on_submit(FakeInteraction(self.discord, self.user(n), menu.channel, menu))
+
+    async def answer(self, n):
+        main = self.main
+        q_id = f"{datetime.datetime.now(ZoneInfo('Asia/Kuala_Lumpur')):%Y-%m-%d}_bench-{self.run_token}-{n // 2}"
+        embed = main.discord.Embed(title="💖 Daily Question", description="Bench question")
+        embed.set_footer(text=f"Both partners must answer to reveal. ID: {q_id}")
+        channel = self.channel("daily_question")
+        message = FakeMessage(self.discord, channel, embeds=[embed])
+
+        view = main.QuestionView()
+        interaction = FakeInteraction(self.discord, self.user(n), channel, message)
+        await view.answer_button.callback(interaction)
+
+        modal = interaction.response.modal
+        modal.answer._value = f"Bench answer {n}"
+        await modal.on_submit(FakeInteraction(self.discord, self.user(n), channel, message))
+
+    async def dashboard(self, n):
+        await self.main.live_dashboard.refresh(force=True)
+
+
+# ==========================================
+# 3. RUNNER
+# ==========================================
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+async def run_path(op, ops, concurrency, first=0):
+    """
+    Runs `ops` calls of `op` (numbered from `first`) from `concurrency` workers.
+    Returns (wall seconds, latencies, errors).
+    """
+    counter = itertools.count(first)
+    latencies, errors = [], []
+
+    async def worker():
+        for n in iter(lambda: next(counter), None):
+            if n >= first + ops:
+                return
+            started = time.perf_counter()
+            try:
+                await op(n)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started, latencies, errors
+
+
+def install_fakes(main, discord_api, gemini, rate_limit=False):
+    """Points the bot at the stand-ins (also used by bench_scheduler.py)."""
+    import outbox
+
+    main.bot.get_channel = discord_api.get_channel
+    main.ai_manager.client = gemini
+    if not rate_limit:
+        # The stand-in API has no rate limits, so don't time the per-channel token buckets
+        for channel_id in main.config.CHANNELS.values():
+            main.bot.outbox._buckets[channel_id] = outbox.TokenBucket(capacity=10 ** 9, rate=10 ** 9)
+
+
+async def run(args):
+    import main
+
+    discord_api = FakeDiscord(args.discord_latency)
+    gemini = FakeGemini(args.ai_latency)
+    install_fakes(main, discord_api, gemini, args.rate_limit)
+
+    bench = Bench(main, discord_api)
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        await bench.setup()
+
+    results = []
+    for name in args.paths:
+        op = getattr(bench, name)
+        with quiet:
+            warmup = min(WARMUP_OPS, args.ops)
+            await run_path(op, warmup, 1)   # Warm the pool, caches and code paths
+            ai_before = gemini.calls
+            wall, latencies, errors = await run_path(op, args.ops, args.concurrency, first=warmup)
+        results.append({
+            "path": name, "wall": wall, "latencies": latencies, "errors": errors, "ai_calls": gemini.calls - ai_before,
+        })
+        print(format_result(results[-1]), flush=True)
+
+    await asyncio.sleep(main.dashboard.REFRESH_DELAY + 0.5)   # Let the debounced dashboard refreshes finish
+    return results
+
+
+def format_result(r):
+    ms = [t * 1000 for t in r["latencies"]]
+    line = (
+        f"⚡ {r['path']:<10} {len(ms) / r['wall']:>8.1f} ops/s | p50 {percentile(ms, 50):>7.1f} ms | "
+        f"p99 {percentile(ms, 99):>7.1f} ms | max {max(ms):>7.1f} ms"
+    )
+    if r["ai_calls"]:
+        line += f" | {r['ai_calls']} Gemini calls"
+    if r["errors"]:
+        line += f"\n   ⚠️ {len(r['errors'])} errors, e.g. {r['errors'][0]}"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", default=os.environ.get("BENCH_DATABASE_URL"),
+                        help="throwaway Postgres to write to (default: BENCH_DATABASE_URL)")
+    parser.add_argument("--ops", type=int, default=200, help="timed operations per path")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent users per path")
+    parser.add_argument("--ai-latency", type=float, default=0.8, help="canned Gemini response time (seconds)")
+    parser.add_argument("--discord-latency", type=float, default=0.05, help="simulated Discord REST round trip (seconds)")
+    parser.add_argument("--paths", default=",".join(PATHS), help=f"comma-separated subset of {','.join(PATHS)}")
+    parser.add_argument("--rate-limit", action="store_true", help="keep the outbox's per-channel rate limits")
+    parser.add_argument("--verbose", action="store_true", help="show the handlers' own log output")
+    args = parser.parse_args()
+
+    args.paths = [p.strip() for p in args.paths.split(",") if p.strip()]
+    unknown = set(args.paths) - set(PATHS)
+    if unknown:
+        parser.error(f"unknown paths: {', '.join(sorted(unknown))}")
+    if not args.db_url:
+        parser.error("needs --db-url (or BENCH_DATABASE_URL); the handlers write real rows")
+
+    # Before main/database are imported: they read it at import time (.env doesn't override it)
+    os.environ["DATABASE_URL"] = args.db_url
+    os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+
+    print(f"🧪 {args.ops} ops per path, {args.concurrency} concurrent users | "
+          f"Gemini {args.ai_latency * 1000:.0f} ms, Discord {args.discord_latency * 1000:.0f} ms (simulated)\n")
+    asyncio.run(run(args))
+
+    import metrics
+    print(f"\n{metrics.REGISTRY.summary()}")
+
+
+if __name__ == "__main__":
+    main()
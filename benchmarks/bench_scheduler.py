@@ -0,0 +1,336 @@
+"""
+Virtual-clock replay of the scheduled jobs.
+
+Runs bot.scheduler (the real scheduler from create_scheduler, with
+its Postgres job store) and the real job functions - the 9 AM question, the
+6 PM dare, the snap planner and its three snaps per player, !remind nagging
+alerts and capsule deliveries - against a virtual clock. Idle time between
+jobs is skipped; time spent running jobs passes normally, so a month
+replays in seconds and slow jobs still show up as drift.
+
+Reports, per job kind: expected vs run, misfires, duplicates and dispatch
+drift (how late the scheduler started each job), plus overall throughput.
+Jobs and rows are written to the given database, so use a throwaway one:
+
+    python benchmarks/bench_scheduler.py --db-url postgresql://localhost/bench \
+        [--days N] [--start YYYY-MM-DD] [--seed N] [--memory-store] [--discord-latency S]
+"""
+import os
+import io
+import sys
+import time
+import types
+import random
+import asyncio
+import argparse
+import datetime
+import contextlib
+from collections import Counter, defaultdict
+from zoneinfo import ZoneInfo
+from apscheduler import events
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_e2e import USERS, FakeDiscord, FakeGemini, FakeContext, FakeInteraction, FakeUser, install_fakes, percentile
+
+MYT = ZoneInfo("Asia/Kuala_Lumpur")
+UTC = datetime.timezone.utc
+# How often a job kind may legitimately run per logical slot (see slot_key)
+ALLOWED_PER_SLOT = {"trigger_snap_for_user": 3}
+
+
+# ==========================================
+# 1. VIRTUAL CLOCK
+# ==========================================
+class VirtualClock:
+    """Aware UTC time that runs at real speed but can jump forward over idle gaps."""
+
+    def __init__(self, start):
+        self.base = start
+        self.anchor = time.perf_counter()
+        self.skipped = 0.0
+
+    def now(self):
+        return self.base + datetime.timedelta(seconds=time.perf_counter() - self.anchor)
+
+    def advance_to(self, moment):
+        now = self.now()
+        if moment > now:
+            self.skipped += (moment - now).total_seconds()
+            self.base, self.anchor = moment, time.perf_counter()
+
+
+def install_clock(clock, *modules):
+    """Makes datetime.datetime.now() in the bot and APScheduler read the virtual clock."""
+    class VirtualDatetime(datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            moment = clock.now()
+            return moment.astimezone(tz) if tz else moment.astimezone().replace(tzinfo=None)
+
+    # Bot modules use `datetime.datetime.now()`: give them a datetime module whose class is swapped
+    proxy = types.ModuleType("datetime")
+    proxy.__dict__.update(vars(datetime))
+    proxy.datetime = VirtualDatetime
+    for module in modules:
+        module.datetime = proxy
+
+    # APScheduler uses `from datetime import datetime`
+    import apscheduler.schedulers.base
+    import apscheduler.executors.base
+    apscheduler.schedulers.base.datetime = VirtualDatetime
+    apscheduler.executors.base.datetime = VirtualDatetime
+
+
+# ==========================================
+# 2. JOB LEDGER (From scheduler events)
+# ==========================================
+class JobLedger:
+    def __init__(self, scheduler, clock, end):
+        self.scheduler = scheduler
+        self.clock = clock
+        self.end = end
+        self.jobs = {}                     # job_id -> (kind, args)
+        self.expected = Counter()          # kind -> runs due before the end of the replay
+        self.pending = defaultdict(list)   # job_id -> run times not yet submitted
+        self.runs = defaultdict(list)      # kind -> [(scheduled, dispatched, args)]
+        self.missed = Counter()
+        self.errors = Counter()
+        self.cancelled = Counter()
+
+    def listen(self):
+        self.scheduler.add_listener(self.on_added, events.EVENT_JOB_ADDED)
+        self.scheduler.add_listener(self.on_removed, events.EVENT_JOB_REMOVED)
+        self.scheduler.add_listener(self.on_submitted, events.EVENT_JOB_SUBMITTED)
+        self.scheduler.add_listener(self.on_finished, events.EVENT_JOB_MISSED | events.EVENT_JOB_ERROR)
+
+    def kind(self, job_id):
+        return self.jobs.get(job_id, ("unknown", ()))[0]
+
+    def on_added(self, event):
+        job = self.scheduler.get_job(event.job_id)
+        if job is None:
+            return
+        self.jobs[job.id] = (job.func.__name__, tuple(job.args))
+        # Date jobs are expected once; cron jobs are counted from their trigger below
+        if job.next_run_time and job.next_run_time <= self.end and type(job.trigger).__name__ == "DateTrigger":
+            self.expected[job.func.__name__] += 1
+            self.pending[job.id].append(job.next_run_time)
+
+    def on_removed(self, event):
+        # Date jobs are also removed when they are submitted; only a removal before the run time is a cancellation
+        run_times = self.pending.get(event.job_id)
+        if run_times and run_times[-1] > self.clock.now():
+            del self.pending[event.job_id]
+            self.cancelled[self.kind(event.job_id)] += 1
+            self.expected[self.kind(event.job_id)] -= 1
+
+    def on_submitted(self, event):
+        dispatched = self.clock.now()
+        kind, args = self.jobs.get(event.job_id, ("unknown", ()))
+        self.pending.pop(event.job_id, None)
+        for scheduled in event.scheduled_run_times:
+            self.runs[kind].append((scheduled, dispatched, args))
+
+    def on_finished(self, event):
+        kind = self.kind(event.job_id)
+        if event.code == events.EVENT_JOB_MISSED:
+            self.missed[kind] += 1
+        else:
+            self.errors[kind] += 1
+            print(f"⚠️ {kind} raised: {event.exception!r}", file=sys.__stdout__)
+
+    def count_cron(self, start):
+        """Cron runs that should have happened in (start, end]."""
+        for job in self.scheduler.get_jobs():
+            if type(job.trigger).__name__ != "CronTrigger":
+                continue
+            fire, count = start, 0
+            while True:
+                fire = job.trigger.get_next_fire_time(None, fire + datetime.timedelta(seconds=1))
+                if fire is None or fire > self.end:
+                    break
+                count += 1
+            self.expected[job.func.__name__] += count
+
+
+def slot_key(kind, scheduled, args, players):
+    """The logical slot a run belongs to; more runs per slot than allowed are duplicates."""
+    if kind == "trigger_snap_for_user":
+        return (args[0], scheduled.astimezone(ZoneInfo(players.get(args[0], "UTC"))).date())
+    if kind in ("send_daily_question", "trigger_random_dare"):
+        return scheduled.astimezone(MYT).date()
+    if kind == "schedule_todays_snaps":
+        return scheduled.astimezone(UTC).date()
+    return (args, scheduled)   # Reminders and capsules: each alert / capsule once
+
+
+# ==========================================
+# 3. REPLAY
+# ==========================================
+def plan_actions(main, discord_api, start, end, rng):
+    """User activity on top of the schedule: one !remind and one buried capsule a day."""
+    # The bench users, not config.PLAYERS: the placeholder IDs there don't fit a BIGINT
+    players = [FakeUser(discord_api, user_id, name) for user_id, name in USERS]
+    actions = []
+    day = start.astimezone(MYT).replace(hour=0, minute=0, second=0, microsecond=0)
+    n = 0
+    while day < end:
+        user = players[n % len(players)]
+        remind_at = day + datetime.timedelta(minutes=rng.randint(8 * 60, 20 * 60))
+        task = f"stretch break in {rng.randint(2, 5)} hours"
+        actions.append((remind_at, "remind", user, task))
+        bury_at = day + datetime.timedelta(minutes=rng.randint(0, 24 * 60 - 1))
+        actions.append((bury_at, "random_btn" if n % 2 else "morning_btn", user, None))
+        day += datetime.timedelta(days=1)
+        n += 1
+    return sorted((a for a in actions if start < a[0] <= end), key=lambda a: a[0])
+
+
+async def perform(main, discord_api, action):
+    _, name, user, task = action
+    if name == "remind":
+        ctx = FakeContext(discord_api, user, discord_api.get_channel(main.config.CHANNELS.get("dua_requests")))
+        await main.remind.callback(ctx, args=task)
+        return
+    storage = main.config.CHANNELS.get("debug_logs")
+    view = main.CapsuleTypeView(user.id, f"{storage}|{next(discord_api.ids)}")
+    interaction = FakeInteraction(discord_api, user, discord_api.get_channel(main.config.CHANNELS.get("audio_capsule")))
+    await getattr(view, name).callback(interaction)
+
+
+def _running_jobs():
+    return [t for t in asyncio.all_tasks() if not t.done() and t.get_coro().__name__ == "run_coroutine_job"]
+
+
+async def run_due(scheduler):
+    """Lets the scheduler start everything that is due now and waits for those jobs to finish."""
+    while True:
+        scheduler.wakeup()
+        await asyncio.sleep(0)   # wakeup() is queued on the loop
+        await scheduler.last_wakeup   # Due jobs are read on the scheduler's worker thread
+        jobs = _running_jobs()
+        if not jobs:
+            return
+        await asyncio.gather(*jobs, return_exceptions=True)
+        await asyncio.sleep(0)   # Executor callbacks dispatch the execution events
+
+
+async def replay(args):
+    import main
+
+    start = args.start
+    end = start + datetime.timedelta(days=args.days)
+    clock = VirtualClock(start)
+    install_clock(clock, main, main.dashboard)
+
+    discord_api = FakeDiscord(args.discord_latency)
+    install_fakes(main, discord_api, FakeGemini(0))
+    await main.database.init_db()
+
+    # Same scheduler and first-boot sequence as on_ready
+    scheduler = main.bot.scheduler = main.create_scheduler()
+    if args.memory_store:
+        scheduler.remove_jobstore("default")   # start() falls back to an in-memory store
+
+    def virtual_timer(wait_seconds):
+        # The replay loop does the waiting, by jumping the clock
+        scheduler.next_wakeup = clock.now() + datetime.timedelta(seconds=wait_seconds) if wait_seconds is not None else None
+    scheduler._start_timer = virtual_timer
+    scheduler.next_wakeup = None
+
+    ledger = JobLedger(scheduler, clock, end)
+    await scheduler.start_async()
+    scheduler.remove_all_jobs()   # Leftovers from an earlier replay
+    ledger.listen()
+    await main.register_daily_jobs()
+    ledger.count_cron(start)
+    await main.schedule_todays_snaps()
+
+    actions = plan_actions(main, discord_api, start, end, random.Random(args.seed))
+    user_actions = len(actions)
+    started = time.perf_counter()
+    while True:
+        await run_due(scheduler)
+        candidates = [t for t in (scheduler.next_wakeup, actions[0][0] if actions else None) if t is not None]
+        target = min(candidates, default=None)
+        if target is None or target > end:
+            break
+        clock.advance_to(target)
+        while actions and actions[0][0] <= clock.now():
+            await perform(main, discord_api, actions.pop(0))
+    wall = time.perf_counter() - started
+
+    scheduler.shutdown(wait=False)
+    await asyncio.sleep(0)
+    return ledger, wall, clock, discord_api, user_actions
+
+
+def format_report(ledger, wall, clock, discord_api, user_actions, args):
+    lines = [
+        f"🗓️ Replayed {args.days} days from {args.start:%Y-%m-%d %H:%M} UTC in {wall:.1f}s "
+        f"({args.days * 86400 / wall:,.0f}x real time) | {user_actions} user actions | {discord_api.calls} Discord calls",
+        f"{'job':<24} {'expected':>8} {'ran':>5} {'missed':>6} {'dup':>4} {'err':>4} "
+        f"{'drift p50':>10} {'p99':>8} {'max':>8}",
+    ]
+    total_runs, all_drift = 0, []
+    for kind in sorted(set(ledger.expected) | set(ledger.runs)):
+        runs = ledger.runs.get(kind, [])
+        slots = Counter(slot_key(kind, scheduled, args_, args.players) for scheduled, _, args_ in runs)
+        duplicates = sum(max(0, count - ALLOWED_PER_SLOT.get(kind, 1)) for count in slots.values())
+        drift = [(dispatched - scheduled).total_seconds() * 1000 for scheduled, dispatched, _ in runs]
+        all_drift += drift
+        total_runs += len(runs)
+        ran = len(runs) - ledger.missed[kind]
+        flag = "" if ran == ledger.expected[kind] and not duplicates and not ledger.errors[kind] else "  ⚠️"
+        lines.append(
+            f"{kind:<24} {ledger.expected[kind]:>8} {ran:>5} {ledger.missed[kind]:>6} {duplicates:>4} "
+            f"{ledger.errors[kind]:>4} "
+            + (f"{percentile(drift, 50):>8.1f}ms {percentile(drift, 99):>6.1f}ms {max(drift):>6.1f}ms" if drift else f"{'-':>10}")
+            + flag
+        )
+    if ledger.cancelled:
+        lines.append("Cancelled before running: " + ", ".join(f"{k} {v}" for k, v in ledger.cancelled.items()))
+    if all_drift:
+        lines.append(
+            f"⚡ {total_runs} job runs, {total_runs / wall:.1f} jobs/s wall | "
+            f"dispatch drift p50 {percentile(all_drift, 50):.1f} ms, p99 {percentile(all_drift, 99):.1f} ms"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", default=os.environ.get("BENCH_DATABASE_URL"),
+                        help="throwaway Postgres for the job store and rows (default: BENCH_DATABASE_URL)")
+    parser.add_argument("--days", type=int, default=30, help="days to replay")
+    parser.add_argument("--start", help="first day (YYYY-MM-DD, midnight MYT; default: now)")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the user activity and snap times")
+    parser.add_argument("--memory-store", action="store_true", help="in-memory job store instead of Postgres")
+    parser.add_argument("--discord-latency", type=float, default=0.0, help="simulated Discord REST round trip (seconds)")
+    parser.add_argument("--verbose", action="store_true", help="show the jobs' own log output")
+    args = parser.parse_args()
+    if not args.db_url:
+        parser.error("needs --db-url (or BENCH_DATABASE_URL); the jobs write real rows")
+
+    if args.start:
+        args.start = datetime.datetime.strptime(args.start, "%Y-%m-%d").replace(tzinfo=MYT).astimezone(UTC)
+    else:
+        args.start = datetime.datetime.now(UTC)
+
+    os.environ["DATABASE_URL"] = args.db_url
+    os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+    random.seed(args.seed)   # Snap times and capsule delays use the global RNG
+
+    import config
+    args.players = {p["id"]: p["tz"] for p in config.PLAYERS}
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        result = asyncio.run(replay(args))
+    print(format_report(*result, args))
+
+
+if __name__ == "__main__":
+    main()
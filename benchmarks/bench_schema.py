@@ -0,0 +1,178 @@
+"""
+Benchmark for the typed-schema migrations (database.MIGRATIONS 2+).
+
+Builds the pre-migration TEXT schema in a scratch schema, fills it with
+synthetic rows, times the hot dashboard/date queries with EXPLAIN ANALYZE,
+applies the migrations and times the rewritten queries again. Runs in one
+transaction that is rolled back, so it is safe against a real database.
+
+    python benchmarks/bench_schema.py [--rows N] [--runs N] [--db-url URL]
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2
+import database
+
+# Benchmark data spans this many days back from today
+HISTORY_DAYS = 3 * 365
+SCHEMA = "bench_schema"
+
+# (name, query on the old TEXT schema, query after migrations 2-3)
+QUERIES = [
+    (
+        "dashboard: today's answers",
+        "SELECT COUNT(DISTINCT user_id) FROM answers WHERE question_id LIKE '{today}%'",
+        "SELECT COUNT(DISTINCT user_id) FROM answers WHERE question_date = '{today}'",
+    ),
+    (
+        "dashboard: active dares",
+        "SELECT COUNT(*) FROM dares WHERE status IN ('IN_PROGRESS', 'WAITING_APPROVAL')",
+        "SELECT COUNT(*) FROM dares WHERE status IN ('IN_PROGRESS', 'WAITING_APPROVAL')",
+    ),
+    (
+        "dashboard: buried capsules",
+        "SELECT COUNT(*) FROM audio_capsules WHERE status = 'PENDING'",
+        "SELECT COUNT(*) FROM audio_capsules WHERE status = 'PENDING'",
+    ),
+    (
+        "!mixtape",
+        "SELECT sender_id, label, created_at FROM audio_capsules WHERE status = 'ARCHIVED' ORDER BY created_at DESC LIMIT 10",
+        "SELECT sender_id, label, created_at FROM audio_capsules WHERE status = 'ARCHIVED' ORDER BY created_at DESC LIMIT 10",
+    ),
+    (
+        "!flashback today",
+        "SELECT moment_id FROM moments WHERE substring(timestamp from 6 for 5) = '{month_day}'",
+        "SELECT moment_id FROM moments WHERE date_part('month', timestamp AT TIME ZONE '{tz}') = {month}"
+        " AND date_part('day', timestamp AT TIME ZONE '{tz}') = {day}",
+    ),
+    (
+        "moments in one month",
+        "SELECT COUNT(*) FROM moments WHERE timestamp LIKE '{month_prefix}%'",
+        "SELECT COUNT(*) FROM moments WHERE timestamp >= '{month_start}' AND timestamp < '{month_end}'",
+    ),
+]
+
+
+def seed(cur, rows):
+    """Fills the old-style tables with `rows` moments/dares/capsules and two answers a day."""
+    today = datetime.datetime.now()
+    def text_time():
+        moment = today - datetime.timedelta(seconds=random.randint(0, HISTORY_DAYS * 86400))
+        return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+    cur.executemany(
+        "INSERT INTO moments (user_id, caption, attachment_data, timestamp, source) VALUES (%s, %s, %s, %s, %s)",
+        [(random.choice((1, 2)), f"moment {i}", f"1|{i}", text_time(), random.choice(("SNAP", "LOG"))) for i in range(rows)],
+    )
+    cur.executemany(
+        "INSERT INTO dares (dare_id, challenger_id, victim_id, task, reward, status) VALUES (%s, 1, 2, 'task', 20, %s)",
+        [(f"d{i}", "IN_PROGRESS" if i % 200 == 0 else "COMPLETED") for i in range(rows)],
+    )
+    cur.executemany(
+        "INSERT INTO audio_capsules (sender_id, attachment_url, label, deliver_at, status, created_at) VALUES (1, 'x', 'sad', %s, %s, %s)",
+        [(text_time(), "PENDING" if i % 200 == 0 else "ARCHIVED", text_time()) for i in range(rows)],
+    )
+    cur.executemany(
+        "INSERT INTO answers (question_id, user_id, username, content) VALUES (%s, %s, 'user', 'answer')",
+        [((today - datetime.timedelta(days=day)).strftime("%Y-%m-%d_09-00-00"), user)
+         for day in range(HISTORY_DAYS) for user in (1, 2)],
+    )
+    for table in ("moments", "dares", "audio_capsules", "answers"):
+        cur.execute(f"ANALYZE {table}")
+
+
+def explain(cur, sql):
+    """Returns (top plan node, scan nodes, execution ms) from EXPLAIN ANALYZE."""
+    cur.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}")
+    result = cur.fetchone()[0]
+    if isinstance(result, str):
+        result = json.loads(result)
+    plan = result[0]
+
+    scans = []
+    def walk(node):
+        if "Scan" in node["Node Type"]:
+            scans.append(f"{node['Node Type']}" + (f" ({node['Index Name']})" if node.get("Index Name") else ""))
+        for child in node.get("Plans", []):
+            walk(child)
+    walk(plan["Plan"])
+    return ", ".join(scans) or plan["Plan"]["Node Type"], plan["Execution Time"]
+
+
+def best_of(cur, sql, runs):
+    plan, best = None, None
+    for _ in range(runs):
+        plan, ms = explain(cur, sql)
+        best = ms if best is None else min(best, ms)
+    return plan, best
+
+
+def run(db_url, rows, runs):
+    """Returns [{"query", "before": (plan, ms), "after": (plan, ms)}] for QUERIES."""
+    now = datetime.datetime.now()
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0) - datetime.timedelta(days=365)
+    month_end = (month_start + datetime.timedelta(days=32)).replace(day=1)
+    params = {
+        "today": now.strftime("%Y-%m-%d"),
+        "month_day": now.strftime("%m-%d"), "month": now.month, "day": now.day, "tz": database.LOCAL_TZ,
+        "month_prefix": month_start.strftime("%Y-%m"),
+        "month_start": f"{month_start:%Y-%m-%d} {database.LOCAL_TZ}", "month_end": f"{month_end:%Y-%m-%d} {database.LOCAL_TZ}",
+    }
+
+    conn = psycopg2.connect(db_url, sslmode=database.DATABASE_SSLMODE)
+    results = []
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE SCHEMA {SCHEMA}")
+            cur.execute(f"SET LOCAL search_path = {SCHEMA}")
+
+            print(f"🌱 Seeding {rows} rows per table...")
+            database._migrate_baseline(cur)
+            seed(cur, rows)
+            before = [best_of(cur, old.format(**params), runs) for _, old, _ in QUERIES]
+
+            print("🗄️ Applying migrations...")
+            for version, description, step in database.MIGRATIONS:
+                if version > 1:
+                    step(cur)
+            after = [best_of(cur, new.format(**params), runs) for _, _, new in QUERIES]
+
+            for (name, _, _), old, new in zip(QUERIES, before, after):
+                results.append({"query": name, "before": old, "after": new})
+    finally:
+        conn.rollback()
+        conn.close()
+    return results
+
+
+def format_report(results):
+    lines = []
+    for r in results:
+        (old_plan, old_ms), (new_plan, new_ms) = r["before"], r["after"]
+        speedup = old_ms / new_ms if new_ms else float("inf")
+        lines.append(f"📊 {r['query']}: {old_ms:.2f} ms -> {new_ms:.2f} ms ({speedup:.1f}x)")
+        lines.append(f"     before: {old_plan}")
+        lines.append(f"     after:  {new_plan}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare query plans before and after the typed-schema migrations.")
+    parser.add_argument("--rows", type=int, default=50000, help="rows per table (default 50000)")
+    parser.add_argument("--runs", type=int, default=5, help="timed runs per query, best one is reported")
+    parser.add_argument("--db-url", default=os.environ.get("DATABASE_URL"))
+    args = parser.parse_args()
+    if not args.db_url:
+        parser.error("set DATABASE_URL or pass --db-url")
+    print(format_report(run(args.db_url, args.rows, args.runs)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Benchmark for the reminder time parser.
+
+Runs a corpus of typical `!remind` / `!ping` phrasings through the local
+parser and reports its hit rate and latency. With --ai, the phrasings the
+local parser can't read are also sent to Gemini (needs GEMINI_API_KEY)
+so both paths can be compared.
+
+    python benchmarks/bench_time_parser.py [--ai] [--repeat N]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import datetime
+import statistics
+from zoneinfo import ZoneInfo
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import time_parser
+
+CORPUS = [
+    # Relative
+    "call mom in 2 hours",
+    "in 30 mins drink water",
+    "in 1 hour and 30 minutes",
+    "in half an hour check the oven",
+    "in 1.5h",
+    "in an hour",
+    "in forty five minutes",
+    "stretch in 10m",
+    "2 hours from now",
+    "3 days later pay rent",
+    "in 1 week renew passport",
+    # Absolute: day + time
+    "tomorrow at 8pm",
+    "tomorrow at 8",
+    "tmr 7:30am gym",
+    "day after tomorrow at 6pm",
+    "tonight at 10",
+    "tonight at 12",
+    "call mom at 12 tonight",
+    "today 5pm",
+    "friday 7pm date night",
+    "next sunday at 10am",
+    "on saturday at 3pm",
+    "25 dec at 9am",
+    "dec 25th 9am",
+    "1st of january 12am",
+    "2026-11-01 14:00",
+    "12/11 at 6pm",
+    # Time only
+    "at 9",
+    "dinner at 7:30pm",
+    "20:30 movie",
+    "at noon",
+    "midnight",
+    "tomorrow morning",
+    "tonight",
+    # Timezones
+    "8pm harare time",
+    "9am your time",
+    "7pm my time",
+    "call at 6pm malaysia time",
+    # Hard ones (expected to fall back to the AI)
+    "the weekend after next",
+    "end of the month",
+    "a quarter past three",
+    "when I wake up",
+    "buy milk tomorrow",
+    "in a bit",
+    # Month names that aren't dates, and clashing dates (expected to fall back to the AI)
+    "tell may 2 jokes at 8pm",
+    "march 3 things to do tomorrow at 9am",
+    "dec 25th tomorrow at 9am",
+]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+def bench_local(now, user_id, repeat):
+    hits, misses, timings = [], [], []
+    for phrase in CORPUS:
+        result = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = time_parser.parse_datetime(phrase, now, user_id)
+            timings.append(time.perf_counter() - start)
+        (hits if result else misses).append((phrase, result))
+    return hits, misses, timings
+
+
+async def bench_ai(now, phrases):
+    import ai_manager
+
+    now_str = now.strftime("%Y-%m-%d %H:%M:%S")
+    results, timings = [], []
+    for phrase in phrases:
+        start = time.perf_counter()
+        result = await ai_manager.extract_datetime(phrase, now_str)
+        timings.append(time.perf_counter() - start)
+        results.append((phrase, result))
+    return results, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ai", action="store_true", help="also time Gemini on the local misses")
+    parser.add_argument("--repeat", type=int, default=200, help="local parses per phrase")
+    args = parser.parse_args()
+
+    user_id = config.PLAYERS[0]["id"] if config.PLAYERS else None
+    now = datetime.datetime.now(ZoneInfo("Asia/Kuala_Lumpur"))
+
+    hits, misses, timings = bench_local(now, user_id, args.repeat)
+    us = [t * 1e6 for t in timings]
+
+    print(f"📚 Corpus: {len(CORPUS)} phrasings (now = {now:%Y-%m-%d %H:%M %Z})\n")
+    for phrase, result in hits:
+        print(f"  ✅ {phrase:<34} -> {result:%Y-%m-%d %H:%M %Z}")
+    for phrase, _ in misses:
+        print(f"  ➡️  {phrase:<34} -> (falls back to AI)")
+
+    print(f"\n⚡ Local parser: hit rate {len(hits)}/{len(CORPUS)} ({100 * len(hits) / len(CORPUS):.0f}%)")
+    print(f"   latency p50 {statistics.median(us):.1f} µs | p99 {percentile(us, 99):.1f} µs | max {max(us):.1f} µs")
+
+    if args.ai:
+        if not os.getenv("GEMINI_API_KEY"):
+            print("\n⚠️ --ai needs GEMINI_API_KEY; skipping the AI path.")
+            return
+        results, ai_timings = asyncio.run(bench_ai(now, [phrase for phrase, _ in misses]))
+        ms = [t * 1000 for t in ai_timings]
+        print(f"\n🤖 Gemini fallback on {len(results)} misses:")
+        for phrase, result in results:
+            print(f"  {phrase:<34} -> {result}")
+        if ms:
+            print(f"   latency p50 {statistics.median(ms):.0f} ms | p99 {percentile(ms, 99):.0f} ms | max {max(ms):.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
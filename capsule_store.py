@@ -0,0 +1,264 @@
+import os
+import shutil
+import asyncio
+import hashlib
+import tempfile
+import aiohttp
+import discord
+import database
+
+# Download/upload block size (peak memory per capsule stays around this)
+CHUNK_SIZE = 64 * 1024
+# Speech-grade Opus settings for the optional transcoding stage
+OPUS_BITRATE = "24k"
+# ffmpeg processes allowed at once (each one is a CPU-bound child process)
+TRANSCODE_WORKERS = 2
+TRANSCODE_TIMEOUT = 120
+# attachment_data prefix for capsules kept in the blob store
+# (anything else is a legacy "ChannelID|MessageID" copy in #debug-logs)
+BLOB_PREFIX = "blob:"
+
+
+# ==========================================
+# 1. BACKENDS (Where the bytes live)
+# ==========================================
+class FileSystemBackend:
+    """Blobs as files under `root`, sharded by hash prefix. Also the stand-in for tests."""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self._path(digest))
+
+    def put(self, local_path, digest):
+        """Moves a finished temp file into place (same filesystem, so it's a rename)."""
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(local_path, path)
+
+    def open(self, digest):
+        return open(self._path(digest), "rb")
+
+
+class S3Backend:
+    """Blobs as objects in an S3-compatible bucket (AWS, R2, MinIO...). Needs boto3."""
+
+    def __init__(self, bucket, prefix="capsules/", endpoint_url=None):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("CAPSULE_STORE=s3 needs boto3 (pip install boto3)")
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.tmp_dir = tempfile.gettempdir()
+
+    def _key(self, digest):
+        return f"{self.prefix}{digest}"
+
+    def exists(self, digest):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(digest))
+            return True
+        except ClientError:
+            return False
+
+    def put(self, local_path, digest):
+        # upload_file streams from disk (multipart for large files)
+        self.client.upload_file(local_path, self.bucket, self._key(digest))
+        os.remove(local_path)
+
+    def open(self, digest):
+        """Downloads to a temp file (spooled to disk, not memory) and returns it rewound."""
+        fp = tempfile.TemporaryFile()
+        self.client.download_fileobj(self.bucket, self._key(digest), fp)
+        fp.seek(0)
+        return fp
+
+
+# ==========================================
+# 2. TRANSCODING (Optional, runs in ffmpeg child processes)
+# ==========================================
+class OpusTranscoder:
+    """
+    Re-encodes voice notes to mono Opus at a speech bitrate with ffmpeg.
+    Each job is its own process, capped at TRANSCODE_WORKERS, so the CPU
+    work never touches the event loop. Keeps the original when the result
+    isn't smaller or ffmpeg fails.
+    """
+
+    codec = "opus"
+
+    def __init__(self, ffmpeg="ffmpeg", workers=TRANSCODE_WORKERS):
+        self.ffmpeg = ffmpeg
+        self._slots = asyncio.Semaphore(workers)
+
+    async def run(self, local_path, filename):
+        """Returns (path, filename, codec) - the Opus file, or the input unchanged."""
+        out_path = local_path + ".ogg"
+        async with self._slots:
+            proc = await asyncio.create_subprocess_exec(
+                self.ffmpeg, "-nostdin", "-y", "-loglevel", "error", "-i", local_path,
+                "-vn", "-ac", "1", "-c:a", "libopus", "-b:a", OPUS_BITRATE, "-application", "voip",
+                out_path,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            try:
+                _, stderr = await asyncio.wait_for(proc.communicate(), TRANSCODE_TIMEOUT)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                stderr = b"timed out"
+
+        if proc.returncode != 0 or not os.path.exists(out_path):
+            print(f"⚠️ Transcode failed, keeping the original: {stderr.decode(errors='replace').strip()[-200:]}")
+            if os.path.exists(out_path):
+                os.remove(out_path)
+            return local_path, filename, None
+
+        if os.path.getsize(out_path) >= os.path.getsize(local_path):
+            os.remove(out_path)
+            return local_path, filename, None
+
+        os.remove(local_path)
+        return out_path, os.path.splitext(filename)[0] + ".ogg", self.codec
+
+
+# ==========================================
+# 3. STORE (Content-addressed capsules)
+# ==========================================
+class CapsuleStore:
+    """
+    Streams capsule audio from Discord's CDN straight into a backend, keyed by
+    its SHA-256 so the same clip sent twice is stored once. Deliveries are
+    uploaded from the store, so a clip crosses the bot twice (in and out).
+    With a transcoder, new clips are re-encoded before they are stored (the
+    key stays the hash of the original, so resends still deduplicate).
+    """
+
+    def __init__(self, backend, transcoder=None):
+        self.backend = backend
+        self.transcoder = transcoder
+        self._session = None
+
+    async def _http(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def ingest(self, attachment):
+        """Stores a discord.Attachment and returns its attachment_data ("blob:<sha256>:<filename>")."""
+        local_path, digest = await self._download(attachment.url)
+        original_size = os.path.getsize(local_path)
+
+        try:
+            stored = await asyncio.get_running_loop().run_in_executor(None, self.backend.exists, digest)
+        except BaseException:
+            os.remove(local_path)
+            raise
+        if stored:
+            # Same clip sent again: skip transcoding and storing, reuse the stored name
+            print(f"♻️ Capsule {digest[:12]} already stored, reusing it")
+            os.remove(local_path)
+            known = await database.get_capsule_blob(digest)
+            if known:
+                return f"{BLOB_PREFIX}{digest}:{known[0]}"
+            await database.record_capsule_blob(digest, attachment.filename, original_size, original_size, None)
+            return f"{BLOB_PREFIX}{digest}:{attachment.filename}"
+
+        filename, codec = attachment.filename, None
+        try:
+            if self.transcoder:
+                local_path, filename, codec = await self.transcoder.run(local_path, filename)
+            stored_size = os.path.getsize(local_path)
+        except BaseException:
+            if os.path.exists(local_path):
+                os.remove(local_path)
+            raise
+
+        await self._put(local_path, digest)
+        await database.record_capsule_blob(digest, filename, original_size, stored_size, codec)
+        if codec:
+            print(f"🗜️ Capsule {digest[:12]}: {original_size // 1024} KB -> {stored_size // 1024} KB ({codec})")
+        return f"{BLOB_PREFIX}{digest}:{filename}"
+
+    async def _download(self, url):
+        """Streams `url` to a temp file while hashing it. Returns (path, sha256)."""
+        sha = hashlib.sha256()
+        fd, local_path = tempfile.mkstemp(dir=self.backend.tmp_dir, suffix=".part")
+        try:
+            session = await self._http()
+            with os.fdopen(fd, "wb") as out:
+                async with session.get(url) as resp:
+                    resp.raise_for_status()
+                    async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                        sha.update(chunk)
+                        out.write(chunk)
+        except BaseException:
+            os.remove(local_path)
+            raise
+        return local_path, sha.hexdigest()
+
+    async def _put(self, local_path, digest):
+        """Moves a finished local file into the backend (off the event loop)."""
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.backend.put, local_path, digest)
+        except BaseException:
+            if os.path.exists(local_path):
+                os.remove(local_path)
+            raise
+
+    async def open_file(self, attachment_data):
+        """Returns a discord.File for a stored capsule, read from the backend as it uploads."""
+        digest, filename = parse_blob(attachment_data)
+        fp = await asyncio.get_running_loop().run_in_executor(None, self.backend.open, digest)
+        return discord.File(fp, filename=filename)
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+
+def is_blob(attachment_data):
+    return bool(attachment_data) and attachment_data.startswith(BLOB_PREFIX)
+
+def parse_blob(attachment_data):
+    """Splits "blob:<sha256>:<filename>" into (sha256, filename)."""
+    digest, _, filename = attachment_data[len(BLOB_PREFIX):].partition(":")
+    return digest, filename or "capsule.ogg"
+
+
+def from_env():
+    """
+    Builds the store from CAPSULE_STORE ("fs" or "s3"). Returns None when unset,
+    which keeps the old behaviour of parking capsules in #debug-logs.
+    CAPSULE_TRANSCODE=1 adds the Opus stage (needs ffmpeg on PATH).
+    """
+    kind = os.getenv("CAPSULE_STORE", "").lower()
+    if kind == "fs":
+        backend = FileSystemBackend(os.getenv("CAPSULE_STORE_PATH", "capsule_store"))
+    elif kind == "s3":
+        backend = S3Backend(
+            os.environ["CAPSULE_S3_BUCKET"],
+            prefix=os.getenv("CAPSULE_S3_PREFIX", "capsules/"),
+            endpoint_url=os.getenv("CAPSULE_S3_ENDPOINT") or None,
+        )
+    else:
+        return None
+
+    transcoder = None
+    if os.getenv("CAPSULE_TRANSCODE", "").lower() in ("1", "true", "yes"):
+        ffmpeg = shutil.which("ffmpeg")
+        if ffmpeg:
+            transcoder = OpusTranscoder(ffmpeg)
+        else:
+            print("⚠️ CAPSULE_TRANSCODE is set but ffmpeg isn't installed; storing clips as-is")
+    return CapsuleStore(backend, transcoder)
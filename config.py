@@ -53,4 +53,12 @@ SHOP_ITEMS = {
 DATES = {
     "relationship_start": "2024-01-15", # REPLACE with your Anniversary (YYYY-MM-DD)
     "last_seen": "2024-12-20"           # REPLACE with last time you met (YYYY-MM-DD)
-}
\ No newline at end of file
+}
+
+# WATCH PARTY COUNTDOWN
+# "edit" = one message edited every second, "timestamp" = Discord <t:…:R>
+# countdown shown by each client, "messages" = one message per second
+WATCH_COUNTDOWN = {
+    "mode": "edit",
+    "seconds": 5
+}
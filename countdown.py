@@ -0,0 +1,105 @@
+import time
+import asyncio
+import statistics
+import outbox
+
+# Delay before the first tick, so the first send isn't already late
+LEAD_TIME = 1.0
+# Weight of the newest latency sample in the running estimate
+LATENCY_SMOOTHING = 0.5
+# Used until the first send has been measured
+DEFAULT_LATENCY = 0.25
+
+MODES = ("edit", "timestamp", "messages")
+
+
+class CountdownEngine:
+    """
+    Runs the watch party countdown against one monotonic "go" deadline.
+    Every tick has a fixed target time; it is sent early by the measured
+    send latency so it lands on time, and a slow tick never pushes the
+    later ones back.
+
+    Modes:
+      edit      - one message edited in place every second
+      timestamp - one message with <t:…:R>, so each client counts down locally;
+                  only "PLAY NOW" is timed by the bot
+      messages  - one message per tick (the original style)
+    """
+
+    def __init__(self, channel, queue, seconds=5, mode="edit", latency_hint=None):
+        if mode not in MODES:
+            raise ValueError(f"unknown countdown mode: {mode}")
+        self.channel = channel
+        self.queue = queue
+        self.seconds = seconds
+        self.mode = mode
+        self.latency = latency_hint if latency_hint and latency_hint < 5 else DEFAULT_LATENCY
+        self.samples = []
+        self._clock = asyncio.get_running_loop().time   # monotonic
+
+    async def run(self):
+        """Counts down and says PLAY NOW at the deadline. Returns the drift report dict."""
+        go_time = self._clock() + LEAD_TIME + self.seconds
+
+        if self.mode == "timestamp":
+            go_unix = round(time.time() + (go_time - self._clock()))
+            message = await self._tick(
+                None, lambda: self.queue.send(self.channel, outbox.URGENT, content=f"# ▶️ Press play <t:{go_unix}:R>")
+            )
+            await self._tick(go_time, lambda: self.queue.edit(message, outbox.URGENT, content="# ▶️ PLAY NOW!"))
+            return self.report()
+
+        message = None
+        for remaining in range(self.seconds, -1, -1):
+            text = f"# {remaining}..." if remaining else "# ▶️ PLAY NOW!"
+            target = go_time - remaining
+            if self.mode == "edit" and message is not None:
+                await self._tick(target, lambda text=text: self.queue.edit(message, outbox.URGENT, content=text))
+            else:
+                sent = await self._tick(target, lambda text=text: self.queue.send(self.channel, outbox.URGENT, content=text))
+                message = message or sent
+        return self.report()
+
+    async def _tick(self, target, action):
+        """Runs `action` so that it completes at `target` (None = right away) and records the drift."""
+        if target is not None:
+            delay = target - self.latency - self._clock()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        started = self._clock()
+        result = await action()
+        finished = self._clock()
+
+        took = finished - started
+        self.latency = LATENCY_SMOOTHING * took + (1 - LATENCY_SMOOTHING) * self.latency
+        if target is not None:
+            self.samples.append({"latency": took, "drift": finished - target})
+        return result
+
+    # ==========================================
+    # REPORT
+    # ==========================================
+    def report(self):
+        drifts = [s["drift"] for s in self.samples]
+        latencies = [s["latency"] for s in self.samples]
+        return {
+            "mode": self.mode,
+            "ticks": len(self.samples),
+            "latency_avg": statistics.mean(latencies) if latencies else 0,
+            "latency_max": max(latencies, default=0),
+            "drift_avg": statistics.mean(abs(d) for d in drifts) if drifts else 0,
+            "drift_max": max((abs(d) for d in drifts), default=0),
+            "go_drift": drifts[-1] if drifts else 0,
+        }
+
+    def format_report(self):
+        r = self.report()
+        ms = lambda seconds: f"{seconds * 1000:+.0f} ms"
+        return (
+            f"🎬 Countdown ({r['mode']}, {r['ticks']} timed ticks): "
+            f"PLAY NOW landed {ms(r['go_drift'])} from target | "
+            f"drift avg {r['drift_avg'] * 1000:.0f} ms, max {r['drift_max'] * 1000:.0f} ms | "
+            f"send latency avg {r['latency_avg'] * 1000:.0f} ms, max {r['latency_max'] * 1000:.0f} ms"
+        )
@@ -0,0 +1,195 @@
+import asyncio
+import datetime
+from zoneinfo import ZoneInfo
+import discord
+import config
+import database
+import outbox
+import metrics
+
+# Counters change by events; only the clocks need a timer
+CLOCK_INTERVAL_MINUTES = 5
+# Bursts of events (accept -> done -> approve) turn into one edit
+REFRESH_DELAY = 2
+
+MESSAGE_STATE_KEY = "dashboard_message_id"
+ACTIVE_DARE_STATUSES = ("IN_PROGRESS", "WAITING_APPROVAL")
+
+TZ_HUSB = ZoneInfo("Asia/Kuala_Lumpur")
+TZ_WIFE = ZoneInfo("Africa/Lusaka")
+
+
+class LiveDashboard:
+    """
+    The #live-stats board. Counters are loaded from Postgres once (and again
+    at the start of each MYT day), then kept up to date in memory by the
+    event hooks below. The message is only edited when the rendered embed
+    actually changes, and its ID is stored so history is never scanned.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.stats = None
+        self.stats_date = None
+        self.message_id = None
+        self.last_rendered = None
+        self._refresh_task = None
+        self._lock = asyncio.Lock()
+
+    # ==========================================
+    # 1. COUNTERS (In-memory, pushed by events)
+    # ==========================================
+    async def load(self):
+        today = datetime.datetime.now(TZ_HUSB).date()
+        self.stats = await database.get_dashboard_stats(today.strftime("%Y-%m-%d"))
+        self.stats_date = today
+
+    def adjust(self, key, delta):
+        if self.stats is None:
+            return  # Not loaded yet - the first load reads the truth from the DB
+        self.stats[key] = max(0, self.stats[key] + delta)
+        self.request_refresh()
+
+    def dare_moved(self, old_status, new_status):
+        was_active = old_status in ACTIVE_DARE_STATUSES
+        is_active = new_status in ACTIVE_DARE_STATUSES
+        if was_active != is_active:
+            self.adjust("active_dares", 1 if is_active else -1)
+
+    def bounty_opened(self):
+        self.adjust("open_bounties", 1)
+
+    def bounty_moved(self, old_status, new_status):
+        if (old_status == "OPEN") != (new_status == "OPEN"):
+            self.adjust("open_bounties", 1 if new_status == "OPEN" else -1)
+
+    def capsule_buried(self):
+        self.adjust("buried_capsules", 1)
+
+    def capsule_dug_up(self, old_status):
+        if old_status == "PENDING":
+            self.adjust("buried_capsules", -1)
+
+    def answer_saved(self, question_id):
+        """Call once per first answer; question_id starts with its MYT date."""
+        if self.stats_date and question_id.startswith(self.stats_date.strftime("%Y-%m-%d")):
+            self.adjust("daily_q_count", 1)
+
+    # ==========================================
+    # 2. RENDERING
+    # ==========================================
+    def render(self):
+        stats = self.stats
+
+        # --- A. CLOCKS ---
+        time_husb = datetime.datetime.now(TZ_HUSB).strftime("%I:%M %p")
+        time_wife = datetime.datetime.now(TZ_WIFE).strftime("%I:%M %p")
+
+        # --- B. COUNTERS ---
+        now = datetime.datetime.now()
+        try:
+            start_date = datetime.datetime.strptime(config.DATES["relationship_start"], "%Y-%m-%d")
+            days_together = (now - start_date).days
+        except:
+            days_together = "0"
+
+        try:
+            last_seen_date = datetime.datetime.strptime(config.DATES["last_seen"], "%Y-%m-%d")
+            days_apart = (now - last_seen_date).days
+        except:
+            days_apart = "0"
+
+        # Format Question Status
+        q_count = stats['daily_q_count']
+        if q_count >= 2:
+            q_status = "✅ Completed by both"
+        elif q_count == 1:
+            q_status = "⏳ Waiting for partner"
+        else:
+            q_status = "❌ Not started yet"
+
+        # --- C. BUILD EMBED ---
+        embed = discord.Embed(title="📊 Relationship Control Center", color=discord.Color.dark_teal())
+
+        # Row 1: Clocks
+        embed.add_field(name="🇲🇾 Husband", value=f"**{time_husb}**", inline=True)
+        embed.add_field(name="🇿🇲 Wife", value=f"**{time_wife}**", inline=True)
+
+        # Row 2: The Counters
+        embed.add_field(
+            name="⏳ Timeline",
+            value=f"❤️ **{days_together}** Days Together\n💔 **{days_apart}** Days Apart",
+            inline=False
+        )
+
+        # Row 3: Action Items
+        action_text = (
+            f"🔥 **{stats['active_dares']}** Active Dares\n"
+            f"📜 **{stats['open_bounties']}** Open Bounties\n"
+            f"❓ Daily Question: **{q_status}**"
+        )
+        embed.add_field(name="⚡ Pending Actions", value=action_text, inline=False)
+
+        # Row 4: Buried Treasure
+        embed.add_field(
+            name="🏴‍☠️ Buried Treasure",
+            value=f"🎙️ **{stats['buried_capsules']}** Audio Capsules Hidden",
+            inline=False
+        )
+
+        embed.set_footer(text=f"Live • Clocks tick every {CLOCK_INTERVAL_MINUTES} min")
+        return embed
+
+    # ==========================================
+    # 3. PUBLISHING (Edit only when changed)
+    # ==========================================
+    def request_refresh(self):
+        """Schedules a refresh shortly; repeated calls in the meantime are merged."""
+        if self._refresh_task and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.create_task(self._delayed_refresh())
+
+    async def _delayed_refresh(self):
+        await asyncio.sleep(REFRESH_DELAY)
+        await self.refresh()
+
+    @metrics.timed("task", "dashboard_refresh")
+    async def refresh(self, force=False):
+        """Re-renders the board and edits the message if anything changed."""
+        channel = self.bot.get_channel(config.CHANNELS.get("live_stats"))
+        if not channel:
+            return
+
+        async with self._lock:
+            try:
+                today = datetime.datetime.now(TZ_HUSB).date()
+                if force or self.stats is None or self.stats_date != today:
+                    await self.load()
+
+                embed = self.render()
+                rendered = embed.to_dict()
+                if rendered == self.last_rendered and not force:
+                    return
+
+                await self._publish(channel, embed)
+                self.last_rendered = rendered
+            except Exception as e:
+                # If Discord 500s here, just skip this update
+                print(f"⚠️ Dashboard Error: {e}")
+
+    async def _publish(self, channel, embed):
+        if self.message_id is None:
+            stored = await database.get_state(MESSAGE_STATE_KEY)
+            self.message_id = int(stored) if stored else None
+
+        if self.message_id:
+            try:
+                # Partial message: edit by ID without fetching it first (lowest priority, coalesced)
+                await self.bot.outbox.edit(channel.get_partial_message(self.message_id), outbox.LOW, content=None, embed=embed)
+                return
+            except discord.NotFound:
+                print("⚠️ Dashboard message was deleted, posting a new one.")
+
+        msg = await self.bot.outbox.send(channel, outbox.LOW, embed=embed)
+        self.message_id = msg.id
+        await database.set_state(MESSAGE_STATE_KEY, str(msg.id))
@@ -1,377 +1,1312 @@
 import os
+import re
+import json
+import time
+import random
+import asyncio
+import functools
+import datetime
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from zoneinfo import ZoneInfo
 import psycopg2
 from psycopg2.extras import RealDictCursor
+import config
+import metrics
 
 # Heroku automatically sets this env variable
 DATABASE_URL = os.environ.get('DATABASE_URL')
+# Heroku Postgres needs TLS; override with DATABASE_SSLMODE=disable for a local database
+DATABASE_SSLMODE = os.environ.get('DATABASE_SSLMODE', 'require')
 
-def get_connection():
-    return psycopg2.connect(DATABASE_URL, sslmode='require')
+def sqlalchemy_url():
+    """DATABASE_URL for SQLAlchemy: Heroku still hands out postgres://, and we want the psycopg2 driver."""
+    if not DATABASE_URL:
+        return DATABASE_URL
+    scheme, sep, rest = DATABASE_URL.partition("://")
+    if scheme in ("postgres", "postgresql"):
+        return "postgresql+psycopg2://" + rest
+    return DATABASE_URL
 
-async def init_db():
-    """Initializes tables in PostgreSQL."""
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            # 1. Table for Daily Questions
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS answers (
-                    question_id TEXT,
-                    user_id BIGINT,
-                    username TEXT,
-                    content TEXT,
-                    PRIMARY KEY (question_id, user_id)
-                )
-            """)
-            
-            # 2. Table for Us-Bucks (Wallet)
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id BIGINT PRIMARY KEY,
-                    balance INTEGER DEFAULT 0
-                )
-            """)
-            
-            # 3. Table for Bounties
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS bounties (
-                    message_id BIGSERIAL PRIMARY KEY,
-                    description TEXT,
-                    reward INTEGER,
-                    status TEXT DEFAULT 'OPEN',
-                    claimed_by TEXT
-                )
-            """)
+# --- CONNECTION POOL ---
+POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN', 1))
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX', 4))
+POOL_MAX_IDLE = 300        # Close connections idle longer than this (seconds)
+POOL_HEALTH_CHECK = 30     # Ping connections idle longer than this before reuse (seconds)
 
-            # 4. Table for Truth or Dare
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS dares (
-                    dare_id TEXT PRIMARY KEY,
-                    challenger_id BIGINT,
-                    victim_id BIGINT,
-                    task TEXT,
-                    reward INTEGER,
-                    status TEXT DEFAULT 'PENDING' 
-                )
-            """)
 
-            # 5. Table for Wiki (Memory System)
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS wiki (
-                    key_name TEXT PRIMARY KEY,
-                    content TEXT,
-                    attachment_data TEXT,
-                    added_by TEXT
-                )
-            """)
+class ConnectionPool:
+    """
+    Keeps up to max_size open TLS connections so the handshake happens once per
+    connection instead of once per query. Connections are health-checked after
+    sitting idle and recycled once they have been idle for too long.
+    """
 
-            # 6. Table for Moments (Time Capsule)
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS moments (
-                    moment_id BIGSERIAL PRIMARY KEY,
-                    user_id BIGINT,
-                    caption TEXT,
-                    attachment_data TEXT,
-                    timestamp TEXT,
-                    source TEXT
-                )
-            """)
+    def __init__(self, dsn, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self._idle = []            # [(conn, last_used)] - most recently used last
+        self._open = 0
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
 
-            # 7. Audio Capsules Table
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS audio_capsules (
-                    id BIGSERIAL PRIMARY KEY,
-                    sender_id BIGINT,
-                    attachment_url TEXT,
-                    label TEXT,
-                    deliver_at TEXT,
-                    status TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-        conn.commit()
-    finally:
-        conn.close()
+    def _connect(self):
+        # Session time zone: TIMESTAMPTZ values come back as MYT-aware datetimes
+        return psycopg2.connect(self.dsn, sslmode=DATABASE_SSLMODE, options=f"-c timezone={LOCAL_TZ}")
 
-# --- DAILY QUESTION FUNCTIONS ---
+    def _discard(self, conn):
+        with self._lock:
+            self._open -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
 
-async def save_answer(q_id, user_id, username, content):
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            # Save the text answer
-            cur.execute("""
-                INSERT INTO answers (question_id, user_id, username, content)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (question_id, user_id) 
-                DO UPDATE SET content = EXCLUDED.content, username = EXCLUDED.username
-            """, (q_id, user_id, username, content))
-            
-            # Add 10 Us-Bucks reward
-            cur.execute("""
-                INSERT INTO users (user_id, balance) VALUES (%s, 10)
-                ON CONFLICT (user_id) DO UPDATE SET balance = users.balance + 10
-            """, (user_id,))
-        conn.commit()
-    finally:
-        conn.close()
+    def _is_healthy(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if idle_for < POOL_HEALTH_CHECK:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
 
-async def get_answers(q_id):
-    conn = get_connection()
+    def acquire(self):
+        """Blocks (in a worker thread) until a healthy connection is available."""
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    item = self._idle.pop() if self._idle else None
+                    if item is None:
+                        self._open += 1
+                if item is None:
+                    try:
+                        return self._connect()
+                    except Exception:
+                        with self._lock:
+                            self._open -= 1
+                        raise
+
+                conn, last_used = item
+                if self._is_healthy(conn, time.monotonic() - last_used):
+                    return conn
+                self._discard(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn):
+        try:
+            if conn.closed:
+                self._discard(conn)
+                return
+            # Never hand a connection with an open transaction to the next caller
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        except psycopg2.Error:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+        self.recycle_idle()
+
+    def recycle_idle(self):
+        """Closes connections idle beyond POOL_MAX_IDLE, keeping at least min_size open."""
+        now = time.monotonic()
+        stale = []
+        with self._lock:
+            while self._idle and self._open - len(stale) > self.min_size:
+                conn, last_used = self._idle[0]
+                if now - last_used < POOL_MAX_IDLE:
+                    break
+                stale.append(self._idle.pop(0)[0])
+        for conn in stale:
+            self._discard(conn)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+
+_pool = None
+# One worker thread per pooled connection, so queries never queue inside the pool itself
+_executor = ThreadPoolExecutor(max_workers=POOL_MAX_SIZE, thread_name_prefix="db")
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool(DATABASE_URL)
+    return _pool
+
+
+def close_pool():
+    """Closes every idle pooled connection (call on shutdown)."""
+    if _pool is not None:
+        _pool.close()
+
+
+def _run_pooled(func, args, kwargs):
+    pool = get_pool()
+    conn = pool.acquire()
     try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT username, content FROM answers WHERE question_id = %s", (q_id,))
-            return cur.fetchall()
+        return func(conn, *args, **kwargs)
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
     finally:
-        conn.close()
+        pool.release(conn)
+
+
+def pooled(func):
+    """
+    Turns a blocking `func(conn, ...)` into a coroutine `func(...)` that borrows a
+    pooled connection and runs on the DB thread pool, off the event loop.
+    Latency (queueing for a connection included) goes to the "db" metrics.
+    """
+    @metrics.timed("db", func.__name__)
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, _run_pooled, func, args, kwargs)
+    return wrapper
+
+# --- SCHEMA MIGRATIONS ---
+
+# Timezone the bot lives in: naive times it stored as TEXT were MYT wall-clock times
+# (except "morning" capsules, see _migrate_typed_times)
+LOCAL_TZ = "Asia/Kuala_Lumpur"
+# pg_advisory_xact_lock key, so two bot processes never migrate at the same time
+MIGRATION_LOCK_ID = 804120
+
+def _migrate_baseline(cur):
+    """The schema as it was created before migrations existed (every step is idempotent)."""
+    # 1. Table for Daily Questions
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS answers (
+            question_id TEXT,
+            user_id BIGINT,
+            username TEXT,
+            content TEXT,
+            PRIMARY KEY (question_id, user_id)
+        )
+    """)
+    
+    # 2. Table for Us-Bucks (Wallet)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id BIGINT PRIMARY KEY,
+            balance INTEGER DEFAULT 0
+        )
+    """)
+    
+    # 2b. Append-only Us-Bucks ledger (double-entry: every row moves `amount`
+    # from one account to another; users.balance is the running total)
+    cur.execute("SELECT to_regclass('ledger')")
+    ledger_is_new = cur.fetchone()[0] is None
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ledger (
+            id BIGSERIAL PRIMARY KEY,
+            debit_account TEXT NOT NULL,
+            credit_account TEXT NOT NULL,
+            amount INTEGER NOT NULL CHECK (amount > 0),
+            reason TEXT,
+            idempotency_key TEXT UNIQUE,
+            created_at TIMESTAMPTZ DEFAULT NOW()
+        )
+    """)
+    if ledger_is_new:
+        # Balances from before the ledger become opening entries, so the books add up
+        cur.execute("""
+            INSERT INTO ledger (debit_account, credit_account, amount, reason)
+            SELECT %s, 'user:' || user_id, balance, 'opening balance' FROM users WHERE balance > 0
+        """, (OPENING,))
+    
+    # 3. Table for Bounties (keyed by the board message, see BOUNTY_TRANSITIONS)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS bounties (
+            message_id BIGSERIAL PRIMARY KEY,
+            description TEXT,
+            reward INTEGER,
+            status TEXT DEFAULT 'OPEN',
+            claimed_by TEXT
+        )
+    """)
+    cur.execute("ALTER TABLE bounties ADD COLUMN IF NOT EXISTS channel_id BIGINT")
+    cur.execute("ALTER TABLE bounties ADD COLUMN IF NOT EXISTS employer_id BIGINT")
+    cur.execute("ALTER TABLE bounties ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ DEFAULT NOW()")
+    cur.execute("ALTER TABLE bounties ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW()")
+    # claimed_by was TEXT but never written: it holds the worker's user ID
+    cur.execute("""
+        SELECT data_type FROM information_schema.columns
+        WHERE table_name = 'bounties' AND column_name = 'claimed_by'
+    """)
+    if cur.fetchone()[0] != 'bigint':
+        cur.execute("ALTER TABLE bounties ALTER COLUMN claimed_by TYPE BIGINT USING claimed_by::BIGINT")
+    # Dashboard counts open bounties
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_bounties_status ON bounties (status)")
+
+    # 4. Table for Truth or Dare
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS dares (
+            dare_id TEXT PRIMARY KEY,
+            challenger_id BIGINT,
+            victim_id BIGINT,
+            task TEXT,
+            reward INTEGER,
+            status TEXT DEFAULT 'PENDING' 
+        )
+    """)
+
+    # 5. Table for Wiki (Memory System)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS wiki (
+            key_name TEXT PRIMARY KEY,
+            content TEXT,
+            attachment_data TEXT,
+            added_by TEXT
+        )
+    """)
+
+    # 6. Table for Moments (Time Capsule)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS moments (
+            moment_id BIGSERIAL PRIMARY KEY,
+            user_id BIGINT,
+            caption TEXT,
+            attachment_data TEXT,
+            timestamp TEXT,
+            source TEXT
+        )
+    """)
+    # Keyset pagination for !moments walks this index newest-first
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_moments_ts_id ON moments (timestamp, moment_id)")
+    # !flashback bookkeeping: least-recently-shown and "on this day" lookups stay index-only
+    cur.execute("ALTER TABLE moments ADD COLUMN IF NOT EXISTS last_shown_at TIMESTAMP")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_moments_last_shown ON moments (last_shown_at NULLS FIRST, moment_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_moments_month_day ON moments ((substring(timestamp from 6 for 5)))")
+
+    # 7. Audio Capsules Table
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS audio_capsules (
+            id BIGSERIAL PRIMARY KEY,
+            sender_id BIGINT,
+            attachment_url TEXT,
+            label TEXT,
+            deliver_at TEXT,
+            status TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # 7b. Blob store metadata for capsules (keyed by the original clip's hash)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS capsule_blobs (
+            sha256 TEXT PRIMARY KEY,
+            filename TEXT,
+            original_size BIGINT,
+            stored_size BIGINT,
+            codec TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # 8. Pre-generated AI content (questions/dares ready to post)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ai_reservoir (
+            id BIGSERIAL PRIMARY KEY,
+            kind TEXT,
+            theme TEXT,
+            content TEXT,
+            reward INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ai_reservoir_kind ON ai_reservoir (kind, theme, id)")
+
+    # 9. Small key/value store for bot bookkeeping (e.g. dashboard message ID)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS bot_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+
+def _local_time_sql(column):
+    """USING expression for a TEXT column holding "YYYY-MM-DD[ HH:MM[:SS]]" in MYT (anything else becomes NULL)."""
+    return rf"""
+        CASE WHEN {column} ~ '^\d{{4}}-\d{{2}}-\d{{2}}( \d{{2}}:\d{{2}}(:\d{{2}}(\.\d+)?)?)?$'
+             THEN {column}::TIMESTAMP AT TIME ZONE '{LOCAL_TZ}' END
+    """
+
+def _capsule_recipient_tz(sender_id):
+    """The zone the old "morning" button used: the other player's (first non-sender in config.PLAYERS), else MYT."""
+    for player in config.PLAYERS:
+        if player["id"] != sender_id:
+            return ZoneInfo(player["tz"])
+    return ZoneInfo(LOCAL_TZ)
+
+def _migrate_typed_times(cur):
+    """
+    TEXT timestamps become TIMESTAMPTZ, answers get a real DATE; existing rows are converted in place.
+    The text times are MYT wall-clock times, except deliver_at of "morning" capsules, which was
+    7:00 in the recipient's zone: those rows are restated in MYT first, then everything converts alike.
+    """
+    # The old month-day index is an expression on the TEXT column and can't survive the type change
+    cur.execute("DROP INDEX IF EXISTS idx_moments_month_day")
+
+    # TIMESTAMP columns were filled by NOW() / CURRENT_TIMESTAMP in the server's default zone (UTC)
+    cur.execute(f"""
+        ALTER TABLE moments
+            ALTER COLUMN timestamp TYPE TIMESTAMPTZ USING {_local_time_sql('timestamp')},
+            ALTER COLUMN last_shown_at TYPE TIMESTAMPTZ USING last_shown_at AT TIME ZONE 'UTC'
+    """)
+    cur.execute(r"""
+        SELECT id, sender_id, deliver_at FROM audio_capsules
+        WHERE label = 'morning' AND deliver_at ~ '^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$'
+    """)
+    for capsule_id, sender_id, deliver_at in cur.fetchall():
+        local = datetime.datetime.strptime(deliver_at, "%Y-%m-%d %H:%M:%S").replace(tzinfo=_capsule_recipient_tz(sender_id))
+        cur.execute(
+            "UPDATE audio_capsules SET deliver_at = %s WHERE id = %s",
+            (local.astimezone(ZoneInfo(LOCAL_TZ)).strftime("%Y-%m-%d %H:%M:%S"), capsule_id)
+        )
+    cur.execute(f"""
+        ALTER TABLE audio_capsules
+            ALTER COLUMN deliver_at TYPE TIMESTAMPTZ USING {_local_time_sql('deliver_at')},
+            ALTER COLUMN created_at TYPE TIMESTAMPTZ USING created_at AT TIME ZONE 'UTC'
+    """)
+    for table in ("capsule_blobs", "ai_reservoir"):
+        cur.execute(f"ALTER TABLE {table} ALTER COLUMN created_at TYPE TIMESTAMPTZ USING created_at AT TIME ZONE 'UTC'")
+
+    # question_id is "YYYY-MM-DD_HH-MM-SS"; the generated column backfills itself
+    cur.execute(r"""
+        ALTER TABLE answers ADD COLUMN IF NOT EXISTS question_date DATE GENERATED ALWAYS AS (
+            CASE WHEN question_id ~ '^\d{4}-\d{2}-\d{2}'
+                 THEN make_date(substr(question_id, 1, 4)::INT, substr(question_id, 6, 2)::INT, substr(question_id, 9, 2)::INT)
+            END
+        ) STORED
+    """)
+
+def _migrate_status_date_indexes(cur):
+    """Indexes for the dashboard counts and the date/status lookups."""
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_answers_question_date ON answers (question_date)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_dares_status ON dares (status)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_audio_capsules_status ON audio_capsules (status, created_at)")
+    # "On this day" in MYT (timezone() with a constant zone is immutable, so it can be indexed)
+    cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_moments_month_day ON moments (
+            (date_part('month', timestamp AT TIME ZONE '{LOCAL_TZ}')),
+            (date_part('day', timestamp AT TIME ZONE '{LOCAL_TZ}'))
+        )
+    """)
+    for table in ("answers", "dares", "audio_capsules", "moments"):
+        cur.execute(f"ANALYZE {table}")
+
+# Applied in order, each exactly once (recorded in schema_migrations). Never edit a
+# released entry - append a new one.
+MIGRATIONS = [
+    (1, "baseline tables", _migrate_baseline),
+    (2, "typed timestamps and question dates", _migrate_typed_times),
+    (3, "status and date indexes", _migrate_status_date_indexes),
+]
+
+def migrate(cur, migrations=MIGRATIONS):
+    """Applies the pending migrations inside the caller's transaction. Returns the versions applied."""
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMPTZ DEFAULT NOW(),
+            seconds REAL
+        )
+    """)
+    cur.execute("SELECT version FROM schema_migrations")
+    done = {row[0] for row in cur.fetchall()}
+
+    applied = []
+    for version, description, step in migrations:
+        if version in done:
+            continue
+        started = time.monotonic()
+        step(cur)
+        seconds = time.monotonic() - started
+        cur.execute(
+            "INSERT INTO schema_migrations (version, description, seconds) VALUES (%s, %s, %s)",
+            (version, description, seconds)
+        )
+        print(f"🗄️ Migration {version} applied: {description} ({seconds:.2f}s)")
+        applied.append(version)
+    return applied
+
+@pooled
+def init_db(conn):
+    """Brings the schema up to date. One transaction: a failed migration leaves nothing half-applied."""
+    with conn.cursor() as cur:
+        migrate(cur)
+
+        # Re-run on every start: pg_trgm may have become available, and every
+        # tracked table needs its change-log trigger
+        init_search_index(cur)
+        init_change_log(cur)
+    conn.commit()
+
+# --- DAILY QUESTION FUNCTIONS ---
+
+@pooled
+def save_answer(conn, q_id, user_id, username, content):
+    """Saves the answer and pays the reward. Returns True if this was the user's first answer."""
+    with conn.cursor() as cur:
+        # Save the text answer (xmax = 0 only for freshly inserted rows)
+        cur.execute("""
+            INSERT INTO answers (question_id, user_id, username, content)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (question_id, user_id) 
+            DO UPDATE SET content = EXCLUDED.content, username = EXCLUDED.username
+            RETURNING (xmax = 0)
+        """, (q_id, user_id, username, content))
+        inserted = cur.fetchone()[0]
+        
+        # Add 10 Us-Bucks reward (once per question, however often the answer is edited)
+        with balance_cache.writing([user_id]) as balances:
+            _, new_balances = _transfer(cur, REWARDS, user_account(user_id), 10, "daily question", f"answer:{q_id}:{user_id}")
+            conn.commit()
+            balances.update(new_balances)
+    return inserted
+
+@pooled
+def get_answers(conn, q_id):
+    with conn.cursor() as cur:
+        cur.execute("SELECT username, content FROM answers WHERE question_id = %s", (q_id,))
+        return cur.fetchall()
 
 # --- ECONOMY FUNCTIONS ---
 
-async def get_balance(user_id):
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT balance FROM users WHERE user_id = %s", (user_id,))
-            row = cur.fetchone()
-            return row[0] if row else 0
-    finally:
-        conn.close()
+# Ledger accounts: players are "user:<id>" (balance kept in users), the rest are system accounts
+REWARDS = "system:rewards"    # Mints rewards and payouts
+SHOP = "system:shop"          # Receives purchases
+ESCROW = "system:escrow"      # Holds bounty rewards until paid out or refunded
+OPENING = "system:opening"    # Balances that existed before the ledger
 
-async def purchase_item(user_id, cost):
-    """Safely attempts to buy an item."""
-    conn = get_connection()
-    try:
+def user_account(user_id):
+    return f"user:{user_id}"
+
+def _user_id(account):
+    return int(account[5:]) if account.startswith("user:") else None
+
+class BalanceCache:
+    """
+    Write-through cache of users.balance. Every transfer hands its new
+    balances (from RETURNING) to the cache after commit, so wallet checks
+    never touch Postgres once a balance is known. If two writes for the same
+    user overlap, their commit order is unknown and the entry is dropped
+    instead; a read that raced a write is not cached either.
+    """
+
+    def __init__(self):
+        self._balances = {}
+        self._writers = Counter()     # user_id -> writes in flight
+        self._generation = Counter()  # user_id -> writes started so far
+        self._lock = threading.Lock()
+        self.stats = Counter()        # hit / miss / write / invalidate
+
+    def get(self, user_id):
+        """Returns (balance, None) on a hit, or (None, generation) to pass to fill() on a miss."""
+        with self._lock:
+            if user_id in self._balances:
+                self.stats["hit"] += 1
+                return self._balances[user_id], None
+            self.stats["miss"] += 1
+            return None, self._generation[user_id]
+
+    def fill(self, user_id, balance, generation):
+        """Caches a balance read from the DB, unless a write started since the read did."""
+        with self._lock:
+            if self._generation[user_id] == generation and not self._writers[user_id]:
+                self._balances[user_id] = balance
+
+    @contextmanager
+    def writing(self, user_ids):
+        """Wraps a balance-changing transaction; put the committed balances into the yielded dict."""
+        with self._lock:
+            started = {}
+            for user_id in user_ids:
+                self._generation[user_id] += 1
+                started[user_id] = (self._generation[user_id], self._writers[user_id])
+                self._writers[user_id] += 1
+        committed = {}
+        try:
+            yield committed
+        finally:
+            with self._lock:
+                for user_id in user_ids:
+                    self._writers[user_id] -= 1
+                    generation, others = started[user_id]
+                    overlapped = others or self._generation[user_id] != generation
+                    if user_id in committed and not overlapped:
+                        self._balances[user_id] = committed[user_id]
+                        self.stats["write"] += 1
+                    elif self._balances.pop(user_id, None) is not None:
+                        self.stats["invalidate"] += 1
+
+    def clear(self):
+        """Forgets everything (after balances were changed outside the bot)."""
+        with self._lock:
+            self._balances.clear()
+
+    def summary(self):
+        lookups = self.stats["hit"] + self.stats["miss"]
+        rate = self.stats["hit"] / lookups * 100 if lookups else 0
+        return (
+            f"💳 Balance cache: {len(self._balances)} wallets | hit rate {rate:.1f}% "
+            f"({self.stats['hit']} hits, {self.stats['miss']} misses) | "
+            f"{self.stats['write']} written through, {self.stats['invalidate']} invalidated"
+        )
+
+
+balance_cache = BalanceCache()
+
+def _transfer(cur, debit_account, credit_account, amount, reason, idempotency_key=None):
+    """
+    Moves `amount` between two accounts in ONE statement: claims the
+    idempotency key by writing the ledger row, debits the payer only if the
+    balance covers it (conditional UPDATE, safe under concurrent clicks) and
+    credits the payee. Returns (status, balances) where status is "ok",
+    "duplicate" (key already used) or "insufficient" - in that case the
+    caller must roll back, which also drops the ledger row.
+    balances maps user_id -> new balance for the user accounts touched.
+    """
+    debit_user, credit_user = _user_id(debit_account), _user_id(credit_account)
+    cur.execute("""
+        WITH entry AS (
+            INSERT INTO ledger (debit_account, credit_account, amount, reason, idempotency_key)
+            VALUES (%(debit)s, %(credit)s, %(amount)s, %(reason)s, %(key)s)
+            ON CONFLICT (idempotency_key) DO NOTHING
+            RETURNING id
+        ), debit AS (
+            UPDATE users SET balance = balance - %(amount)s
+            WHERE user_id = %(debit_user)s AND balance >= %(amount)s AND EXISTS (SELECT 1 FROM entry)
+            RETURNING balance
+        ), credit AS (
+            INSERT INTO users (user_id, balance)
+            SELECT %(credit_user)s, %(amount)s WHERE %(credit_user)s IS NOT NULL AND EXISTS (SELECT 1 FROM entry)
+            ON CONFLICT (user_id) DO UPDATE SET balance = users.balance + EXCLUDED.balance
+            RETURNING balance
+        )
+        SELECT (SELECT id FROM entry), (SELECT balance FROM debit), (SELECT balance FROM credit)
+    """, {
+        "debit": debit_account, "credit": credit_account, "amount": amount, "reason": reason,
+        "key": idempotency_key, "debit_user": debit_user, "credit_user": credit_user,
+    })
+    entry_id, debit_balance, credit_balance = cur.fetchone()
+
+    if entry_id is None:
+        return "duplicate", {}
+    if debit_user is not None and debit_balance is None:
+        return "insufficient", {}
+
+    balances = {}
+    if debit_user is not None:
+        balances[debit_user] = debit_balance
+    if credit_user is not None:
+        balances[credit_user] = credit_balance
+    return "ok", balances
+
+def _run_transfer(conn, debit_account, credit_account, amount, reason, idempotency_key):
+    """Runs one _transfer as its own transaction, writing the new balances through the cache."""
+    users = [u for u in (_user_id(debit_account), _user_id(credit_account)) if u is not None]
+    with balance_cache.writing(users) as balances:
         with conn.cursor() as cur:
-            # Check balance
-            cur.execute("SELECT balance FROM users WHERE user_id = %s", (user_id,))
-            row = cur.fetchone()
-            current_balance = row[0] if row else 0
-        
-            if current_balance < cost:
-                return False
-            
-            # Deduct balance
-            new_balance = current_balance - cost
-            cur.execute("UPDATE users SET balance = %s WHERE user_id = %s", (new_balance, user_id))
+            status, new_balances = _transfer(cur, debit_account, credit_account, amount, reason, idempotency_key)
+        if status == "insufficient":
+            conn.rollback()
+        else:
+            conn.commit()
+            balances.update(new_balances)
+    return status
+
+@pooled
+def transfer(conn, debit_account, credit_account, amount, reason, idempotency_key=None):
+    """Single ledger transfer. Returns "ok", "duplicate" or "insufficient"."""
+    return _run_transfer(conn, debit_account, credit_account, amount, reason, idempotency_key)
+
+@metrics.timed("db")
+async def get_balance(user_id):
+    """Served from balance_cache; only the first lookup per user reaches Postgres."""
+    balance, generation = balance_cache.get(user_id)
+    if balance is not None:
+        return balance
+    balance = await _read_balance(user_id)
+    balance_cache.fill(user_id, balance, generation)
+    return balance
+
+@pooled
+def _read_balance(conn, user_id):
+    with conn.cursor() as cur:
+        cur.execute("SELECT balance FROM users WHERE user_id = %s", (user_id,))
+        row = cur.fetchone()
+        return row[0] if row else 0
+
+@pooled
+def purchase_item(conn, user_id, cost, reason="shop", idempotency_key=None, payee=SHOP):
+    """
+    Atomically pays `cost` from the user to `payee` (the shop, or escrow for bounties).
+    Returns False only if the balance doesn't cover it; a repeated idempotency key
+    counts as already paid.
+    """
+    return _run_transfer(conn, user_account(user_id), payee, cost, reason, idempotency_key) != "insufficient"
+
+@pooled
+def add_money(conn, user_id, amount, reason="reward", idempotency_key=None, payer=REWARDS):
+    """Credits the user from `payer`. Returns False if the idempotency key was already used."""
+    return _run_transfer(conn, payer, user_account(user_id), amount, reason, idempotency_key) == "ok"
+
+# --- BOUNTY FUNCTIONS ---
+
+# State machine: status -> statuses it may move to
+BOUNTY_TRANSITIONS = {
+    "OPEN": ("IN_PROGRESS", "CANCELLED"),
+    "IN_PROGRESS": ("PENDING_APPROVAL", "OPEN", "CANCELLED"),
+    "PENDING_APPROVAL": ("PAID", "IN_PROGRESS"),
+}
+# Final states release the escrow to this column's user
+BOUNTY_PAYOUTS = {"PAID": "claimed_by", "CANCELLED": "employer_id"}
+
+@pooled
+def create_bounty(conn, message_id, channel_id, employer_id, description, reward):
+    """Records a bounty whose reward is already in escrow, keyed by its board message."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO bounties (message_id, channel_id, employer_id, description, reward, status)
+            VALUES (%s, %s, %s, %s, %s, 'OPEN')
+        """, (message_id, channel_id, employer_id, description, reward))
+    conn.commit()
+
+@pooled
+def get_bounty(conn, message_id):
+    """Returns the bounty as a dict, or None."""
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("SELECT * FROM bounties WHERE message_id = %s", (message_id,))
+        return cur.fetchone()
+
+@pooled
+def advance_bounty(conn, message_id, new_status, claimed_by=None):
+    """
+    Moves a bounty to `new_status` if BOUNTY_TRANSITIONS allows it from its
+    current status (one conditional UPDATE, so a stale button or a double
+    click finds nothing to move). Going back to OPEN clears the worker.
+    PAID / CANCELLED release the escrow in the same transaction.
+    Returns (old_status, bounty dict), or None if the move isn't allowed.
+    """
+    allowed_from = [status for status, targets in BOUNTY_TRANSITIONS.items() if new_status in targets]
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            UPDATE bounties b SET
+                status = %(new)s,
+                claimed_by = CASE WHEN %(new)s = 'OPEN' THEN NULL ELSE COALESCE(%(claimed_by)s, b.claimed_by) END,
+                updated_at = NOW()
+            FROM (SELECT message_id, status FROM bounties WHERE message_id = %(id)s FOR UPDATE) old
+            WHERE b.message_id = old.message_id AND old.status = ANY(%(allowed)s)
+            RETURNING old.status AS old_status, b.*
+        """, {"new": new_status, "claimed_by": claimed_by, "id": message_id, "allowed": allowed_from})
+        row = cur.fetchone()
+    if row is None:
+        conn.rollback()
+        return None
+
+    bounty = dict(row)
+    old_status = bounty.pop("old_status")
+    payee_column = BOUNTY_PAYOUTS.get(new_status)
+    if payee_column:
+        payee = bounty[payee_column]
+        with balance_cache.writing([payee]) as balances, conn.cursor() as cur:
+            _, new_balances = _transfer(
+                cur, ESCROW, user_account(payee), bounty["reward"],
+                f"bounty {new_status.lower()}", f"bounty:{message_id}:settle"
+            )
+            conn.commit()
+            balances.update(new_balances)
+    else:
         conn.commit()
-        return True
-    finally:
-        conn.close()
+    return old_status, bounty
+
+# --- SEARCH FUNCTIONS (!get across wiki + moments) ---
+
+# Set by init_db: pg_trgm adds typo-tolerant matching and "did you mean"
+TRIGRAM_SEARCH = False
 
-async def add_money(user_id, amount):
-    conn = get_connection()
+def init_search_index(cur):
+    """Creates the search_index table (full-text + trigram indexes) and backfills it once."""
+    global TRIGRAM_SEARCH
+
+    cur.execute("SAVEPOINT trgm")
     try:
-        with conn.cursor() as cur:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cur.execute("RELEASE SAVEPOINT trgm")
+        TRIGRAM_SEARCH = True
+    except psycopg2.Error as e:
+        cur.execute("ROLLBACK TO SAVEPOINT trgm")
+        TRIGRAM_SEARCH = False
+        print(f"⚠️ pg_trgm unavailable, search is full-text only: {e}")
+
+    cur.execute("SELECT to_regclass('search_index')")
+    is_new = cur.fetchone()[0] is None
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS search_index (
+            kind TEXT,
+            ref TEXT,
+            title TEXT,
+            body TEXT,
+            document tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(body, '')), 'B')
+            ) STORED,
+            PRIMARY KEY (kind, ref)
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_search_document ON search_index USING GIN (document)")
+    if TRIGRAM_SEARCH:
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_search_title_trgm ON search_index USING GIN (title gin_trgm_ops)")
+
+    if is_new:
+        cur.execute("""
+            INSERT INTO search_index (kind, ref, title, body)
+            SELECT 'wiki', key_name, key_name, content FROM wiki
+            UNION ALL
+            SELECT 'moment', moment_id::TEXT, caption, NULL FROM moments
+            ON CONFLICT DO NOTHING
+        """)
+
+def _index_document(cur, kind, ref, title, body=None):
+    """Upserts one searchable item; call inside the write that creates it."""
+    cur.execute("""
+        INSERT INTO search_index (kind, ref, title, body) VALUES (%s, %s, %s, %s)
+        ON CONFLICT (kind, ref) DO UPDATE SET title = EXCLUDED.title, body = EXCLUDED.body
+    """, (kind, str(ref), title, body))
+
+def _prefix_tsquery(text):
+    """'sunset bea' -> 'sunset:* & bea:*' (so partial words still hit the GIN index)."""
+    words = re.findall(r"\w+", text.lower())
+    return " & ".join(f"{w}:*" for w in words)
+
+@pooled
+def search_memories(conn, text, limit=5):
+    """
+    Ranked search over wiki entries and moment captions.
+    Returns [(kind, ref, title, matched, score)], best first; `matched` is False
+    for rows that are only similar spellings (use them as "did you mean").
+    """
+    tsq = _prefix_tsquery(text)
+    if not tsq:
+        return []
+
+    params = {"tsq": tsq, "q": text, "limit": limit}
+    with conn.cursor() as cur:
+        if TRIGRAM_SEARCH:
             cur.execute("""
-                INSERT INTO users (user_id, balance) VALUES (%s, %s)
-                ON CONFLICT (user_id) DO UPDATE SET balance = users.balance + %s
-            """, (user_id, amount, amount))
-        conn.commit()
-    finally:
-        conn.close()
+                SELECT kind, ref, title, document @@ to_tsquery('english', %(tsq)s) AS matched,
+                       ts_rank(document, to_tsquery('english', %(tsq)s)) + word_similarity(%(q)s, title) AS score
+                FROM search_index
+                WHERE document @@ to_tsquery('english', %(tsq)s) OR %(q)s <%% title
+                ORDER BY matched DESC, score DESC LIMIT %(limit)s
+            """, params)
+        else:
+            cur.execute("""
+                SELECT kind, ref, title, TRUE AS matched,
+                       ts_rank(document, to_tsquery('english', %(tsq)s)) AS score
+                FROM search_index
+                WHERE document @@ to_tsquery('english', %(tsq)s)
+                ORDER BY score DESC LIMIT %(limit)s
+            """, params)
+        return cur.fetchall()
 
 # --- WIKI FUNCTIONS ---
 
-async def set_wiki_entry(key, content, attachment_data, user_name):
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO wiki (key_name, content, attachment_data, added_by) 
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (key_name) DO UPDATE SET 
-                    content=EXCLUDED.content, 
-                    attachment_data=EXCLUDED.attachment_data,
-                    added_by=EXCLUDED.added_by
-            """, (key.lower(), content, attachment_data, user_name))
-        conn.commit()
-    finally:
-        conn.close()
+@pooled
+def set_wiki_entry(conn, key, content, attachment_data, user_name):
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO wiki (key_name, content, attachment_data, added_by) 
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (key_name) DO UPDATE SET 
+                content=EXCLUDED.content, 
+                attachment_data=EXCLUDED.attachment_data,
+                added_by=EXCLUDED.added_by
+        """, (key.lower(), content, attachment_data, user_name))
+        _index_document(cur, "wiki", key.lower(), key.lower(), content)
+    conn.commit()
 
-async def get_wiki_entry(key):
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT content, attachment_data FROM wiki WHERE key_name = %s", (key.lower(),))
-            return cur.fetchone()
-    finally:
-        conn.close()
+@pooled
+def get_wiki_entry(conn, key):
+    with conn.cursor() as cur:
+        cur.execute("SELECT content, attachment_data FROM wiki WHERE key_name = %s", (key.lower(),))
+        return cur.fetchone()
 
-async def get_all_wiki_keys():
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT key_name FROM wiki ORDER BY key_name ASC")
-            rows = cur.fetchall()
-            return [row[0] for row in rows]
-    finally:
-        conn.close()
+@pooled
+def get_all_wiki_keys(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT key_name FROM wiki ORDER BY key_name ASC")
+        rows = cur.fetchall()
+        return [row[0] for row in rows]
+
+# --- CAPSULE BLOB FUNCTIONS ---
+
+@pooled
+def record_capsule_blob(conn, sha256, filename, original_size, stored_size, codec):
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO capsule_blobs (sha256, filename, original_size, stored_size, codec)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (sha256) DO UPDATE SET
+                filename = EXCLUDED.filename,
+                original_size = EXCLUDED.original_size,
+                stored_size = EXCLUDED.stored_size,
+                codec = EXCLUDED.codec
+        """, (sha256, filename, original_size, stored_size, codec))
+    conn.commit()
+
+@pooled
+def get_capsule_blob(conn, sha256):
+    """Returns (filename, original_size, stored_size, codec) or None."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT filename, original_size, stored_size, codec FROM capsule_blobs WHERE sha256 = %s", (sha256,))
+        return cur.fetchone()
 
 # --- TRUTH OR DARE FUNCTIONS ---
 
-async def create_dare(d_id, challenger_id, task, reward):
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO dares (dare_id, challenger_id, task, reward)
-                VALUES (%s, %s, %s, %s)
-            """, (d_id, challenger_id, task, reward))
-        conn.commit()
-    finally:
-        conn.close()
+@pooled
+def create_dare(conn, d_id, challenger_id, task, reward):
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO dares (dare_id, challenger_id, task, reward)
+            VALUES (%s, %s, %s, %s)
+        """, (d_id, challenger_id, task, reward))
+    conn.commit()
 
-async def update_dare_status(d_id, status, victim_id=None):
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            sql = "UPDATE dares SET status = %s"
-            params = [status]
-            
-            if victim_id:
-                sql += ", victim_id = %s"
-                params.append(victim_id)
-                
-            sql += " WHERE dare_id = %s"
-            params.append(d_id)
+@pooled
+def update_dare_status(conn, d_id, status, victim_id=None):
+    """Returns the status the dare had before this update (None if not found)."""
+    with conn.cursor() as cur:
+        sql = "UPDATE dares d SET status = %s"
+        params = [status]
+        
+        if victim_id:
+            sql += ", victim_id = %s"
+            params.append(victim_id)
             
-            cur.execute(sql, tuple(params))
-        conn.commit()
-    finally:
-        conn.close()
+        sql += """
+            FROM (SELECT dare_id, status FROM dares WHERE dare_id = %s FOR UPDATE) old
+            WHERE d.dare_id = old.dare_id
+            RETURNING old.status
+        """
+        params.append(d_id)
+        
+        cur.execute(sql, tuple(params))
+        row = cur.fetchone()
+    conn.commit()
+    return row[0] if row else None
 
 # --- MOMENTS (BeReal) FUNCTIONS ---
 
-async def add_moment(user_id, caption, attachment_data, timestamp, source):
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO moments (user_id, caption, attachment_data, timestamp, source)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (user_id, caption, attachment_data, timestamp, source))
-        conn.commit()
-    finally:
-        conn.close()
+@pooled
+def add_moment(conn, user_id, caption, attachment_data, timestamp, source):
+    """`timestamp` is a timezone-aware datetime."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO moments (user_id, caption, attachment_data, timestamp, source)
+            VALUES (%s, %s, %s, %s, %s)
+            RETURNING moment_id
+        """, (user_id, caption, attachment_data, timestamp, source))
+        _index_document(cur, "moment", cur.fetchone()[0], caption)
+    conn.commit()
 
-async def get_random_moment():
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT user_id, caption, attachment_data, timestamp, source FROM moments ORDER BY RANDOM() LIMIT 1")
-            return cur.fetchone()
-    finally:
-        conn.close()
+# Exact ID probes before settling for the next ID up (only biased by gaps in the IDs)
+RANDOM_MOMENT_PROBES = 3
+
+# Picks a moment and stamps it as shown in the same statement (the stamp alone is not change-logged)
+_SHOW_MOMENT = """
+    UPDATE moments SET last_shown_at = NOW()
+    WHERE moment_id = ({})
+    RETURNING moment_id, user_id, caption, attachment_data, timestamp, source
+"""
+
+@pooled
+def get_random_moment(conn):
+    """
+    Uniform-ish random moment without sorting the table: picks a random ID
+    between MIN and MAX (both read from the primary key index) and retries
+    a few times on gaps. Returns (moment_id, user_id, caption, attachment_data, timestamp, source).
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT MIN(moment_id), MAX(moment_id) FROM moments")
+        low, high = cur.fetchone()
+        if low is None:
+            return None
+
+        row = None
+        for _ in range(RANDOM_MOMENT_PROBES):
+            cur.execute(_SHOW_MOMENT.format("%s"), (random.randint(low, high),))
+            row = cur.fetchone()
+            if row:
+                break
+        if not row:
+            cur.execute(_SHOW_MOMENT.format(
+                "SELECT moment_id FROM moments WHERE moment_id >= %s ORDER BY moment_id LIMIT 1"
+            ), (random.randint(low, high),))
+            row = cur.fetchone()
+    conn.commit()
+    return row
 
-async def get_all_moments():
+@pooled
+def get_on_this_day_moment(conn, month, day):
+    """A random moment from this calendar day (MYT) in any year, or None."""
+    with conn.cursor() as cur:
+        # Same expressions as idx_moments_month_day
+        cur.execute(_SHOW_MOMENT.format(f"""
+            SELECT moment_id FROM moments
+            WHERE date_part('month', timestamp AT TIME ZONE '{LOCAL_TZ}') = %s
+              AND date_part('day', timestamp AT TIME ZONE '{LOCAL_TZ}') = %s
+            ORDER BY RANDOM() LIMIT 1
+        """), (month, day))
+        row = cur.fetchone()
+    conn.commit()
+    return row
+
+@pooled
+def get_least_recently_shown_moment(conn):
+    """The moment that hasn't been shown for the longest time (never-shown ones first)."""
+    with conn.cursor() as cur:
+        cur.execute(_SHOW_MOMENT.format(
+            "SELECT moment_id FROM moments ORDER BY last_shown_at NULLS FIRST, moment_id LIMIT 1"
+        ))
+        row = cur.fetchone()
+    conn.commit()
+    return row
+
+@pooled
+def get_all_moments(conn):
     """Returns all moments sorted by timestamp (newest first). Includes source (SNAP/LOG)."""
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT user_id, caption, attachment_data, timestamp, source FROM moments ORDER BY timestamp DESC")
-            return cur.fetchall()
-    finally:
-        conn.close()
+    with conn.cursor() as cur:
+        cur.execute("SELECT user_id, caption, attachment_data, timestamp, source FROM moments ORDER BY timestamp DESC NULLS LAST")
+        return cur.fetchall()
 
-async def get_moment_by_caption(caption):
-    """Search for a moment by caption (case-insensitive)."""
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT user_id, caption, attachment_data, timestamp, source FROM moments WHERE LOWER(caption) LIKE LOWER(%s)", (f"%{caption}%",))
-            return cur.fetchone()
-    finally:
-        conn.close()
+# Below this many rows an exact COUNT(*) is cheap enough
+MOMENTS_EXACT_COUNT_LIMIT = 10000
+
+@pooled
+def get_moments_page(conn, limit, before=None):
+    """
+    Returns one page of moments, newest first: (rows, has_more).
+    Rows are (moment_id, user_id, caption, attachment_data, timestamp, source).
+    `before` is the (timestamp, moment_id) of the last row of the previous page.
+    Moments whose old text timestamp couldn't be read have a NULL timestamp;
+    they come after all dated ones, newest ID first.
+    """
+    columns = "moment_id, user_id, caption, attachment_data, timestamp, source"
+    # Row comparisons with NULL are never true, so dated and undated moments
+    # are fetched separately, each walking idx_moments_ts_id
+    branches, params = [], []
+    if before is None or before[0] is not None:
+        dated = "timestamp IS NOT NULL" if before is None else "(timestamp, moment_id) < (%s, %s)"
+        branches.append(f"""(SELECT {columns} FROM moments WHERE {dated}
+            ORDER BY timestamp DESC, moment_id DESC LIMIT %s)""")
+        params += ([] if before is None else [before[0], before[1]]) + [limit + 1]
+    undated = "" if before is None or before[0] is not None else " AND moment_id < %s"
+    branches.append(f"""(SELECT {columns} FROM moments WHERE timestamp IS NULL{undated}
+        ORDER BY moment_id DESC LIMIT %s)""")
+    params += ([] if not undated else [before[1]]) + [limit + 1]
+
+    with conn.cursor() as cur:
+        cur.execute(
+            f"SELECT * FROM ({' UNION ALL '.join(branches)}) AS page"
+            " ORDER BY timestamp DESC NULLS LAST, moment_id DESC LIMIT %s",
+            params + [limit + 1]
+        )
+        rows = cur.fetchall()
+    return rows[:limit], len(rows) > limit
+
+@pooled
+def estimate_moment_count(conn):
+    """Row count from the planner statistics; exact when the table is still small."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT reltuples::BIGINT FROM pg_class WHERE oid = 'moments'::regclass")
+        row = cur.fetchone()
+        estimate = row[0] if row else -1
+        if estimate < MOMENTS_EXACT_COUNT_LIMIT:  # -1 = never analyzed
+            cur.execute("SELECT COUNT(*) FROM moments")
+            return cur.fetchone()[0]
+    return estimate
+
+@pooled
+def get_moment(conn, moment_id):
+    with conn.cursor() as cur:
+        cur.execute("SELECT user_id, caption, attachment_data, timestamp, source FROM moments WHERE moment_id = %s", (int(moment_id),))
+        return cur.fetchone()
 
 # --- AUDIO CAPSULE FUNCTIONs ---
-async def add_capsule(sender_id, url, label, deliver_at, status):
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO audio_capsules (sender_id, attachment_url, label, deliver_at, status, created_at)
-                VALUES (%s, %s, %s, %s, %s, NOW())
-                RETURNING id
-            """, (sender_id, url, label, deliver_at, status))
-            new_id = cur.fetchone()[0]
-        conn.commit()
-        return new_id
-    finally:
-        conn.close()
+@pooled
+def add_capsule(conn, sender_id, url, label, deliver_at, status):
+    """`deliver_at` is a timezone-aware datetime (None for OPEN_WHEN capsules)."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO audio_capsules (sender_id, attachment_url, label, deliver_at, status, created_at)
+            VALUES (%s, %s, %s, %s, %s, NOW())
+            RETURNING id
+        """, (sender_id, url, label, deliver_at, status))
+        new_id = cur.fetchone()[0]
+    conn.commit()
+    return new_id
 
-async def get_pending_capsules():
+@pooled
+def get_pending_capsules(conn):
     """For restoring scheduled jobs on bot restart."""
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id, sender_id, attachment_url, deliver_at FROM audio_capsules WHERE status = 'PENDING'")
-            return cur.fetchall()
-    finally:
-        conn.close()
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, sender_id, attachment_url, deliver_at FROM audio_capsules WHERE status = 'PENDING'")
+        return cur.fetchall()
 
-async def get_open_when_capsule(label):
+@pooled
+def get_open_when_capsule(conn, label):
     """Finds an undelivered capsule with a specific label."""
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT id, sender_id, attachment_url FROM audio_capsules 
-                WHERE label = %s AND status = 'OPEN_WHEN'
-                ORDER BY created_at ASC LIMIT 1
-            """, (label,))
-            return cur.fetchone()
-    finally:
-        conn.close()
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT id, sender_id, attachment_url FROM audio_capsules 
+            WHERE label = %s AND status = 'OPEN_WHEN'
+            ORDER BY created_at ASC LIMIT 1
+        """, (label,))
+        return cur.fetchone()
 
-async def mark_capsule_delivered(c_id):
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("UPDATE audio_capsules SET status = 'ARCHIVED' WHERE id = %s", (c_id,))
-        conn.commit()
-    finally:
-        conn.close()
+@pooled
+def mark_capsule_delivered(conn, c_id):
+    """Returns the status the capsule had before archiving (None if not found)."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE audio_capsules c SET status = 'ARCHIVED'
+            FROM (SELECT id, status FROM audio_capsules WHERE id = %s FOR UPDATE) old
+            WHERE c.id = old.id
+            RETURNING old.status
+        """, (c_id,))
+        row = cur.fetchone()
+    conn.commit()
+    return row[0] if row else None
 
-async def get_mixtape_list():
+@pooled
+def get_mixtape_list(conn):
     """Returns list of archived/delivered messages."""
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT sender_id, label, created_at FROM audio_capsules WHERE status = 'ARCHIVED' ORDER BY created_at DESC LIMIT 10")
-            return cur.fetchall()
-    finally:
-        conn.close()
+    with conn.cursor() as cur:
+        cur.execute("SELECT sender_id, label, created_at FROM audio_capsules WHERE status = 'ARCHIVED' ORDER BY created_at DESC LIMIT 10")
+        return cur.fetchall()
+
+# --- AI RESERVOIR FUNCTIONS ---
+
+@pooled
+def add_reservoir_item(conn, kind, theme, content, reward=None):
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO ai_reservoir (kind, theme, content, reward)
+            VALUES (%s, %s, %s, %s)
+        """, (kind, theme, content, reward))
+    conn.commit()
+
+@pooled
+def take_reservoir_item(conn, kind, theme=None):
+    """
+    Pops the oldest ready item of `kind` (optionally for one theme).
+    Returns (theme, content, reward) or None if the buffer is empty.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            DELETE FROM ai_reservoir WHERE id = (
+                SELECT id FROM ai_reservoir
+                WHERE kind = %s AND (%s::TEXT IS NULL OR theme = %s)
+                ORDER BY id ASC LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING theme, content, reward
+        """, (kind, theme, theme))
+        row = cur.fetchone()
+    conn.commit()
+    return row
+
+@pooled
+def get_reservoir_levels(conn):
+    """Returns {(kind, theme): count} for every non-empty buffer."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT kind, theme, COUNT(*) FROM ai_reservoir GROUP BY kind, theme")
+        return {(kind, theme): count for kind, theme, count in cur.fetchall()}
+
+# --- BOT STATE FUNCTIONS ---
+
+@pooled
+def get_state(conn, key):
+    with conn.cursor() as cur:
+        cur.execute("SELECT value FROM bot_state WHERE key = %s", (key,))
+        row = cur.fetchone()
+        return row[0] if row else None
+
+@pooled
+def set_state(conn, key, value):
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO bot_state (key, value) VALUES (%s, %s)
+            ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+        """, (key, value))
+    conn.commit()
 
 # --- STATS FUNCTIONS ---
 
-async def get_dashboard_stats(todays_date_str):
+@pooled
+def get_dashboard_stats(conn, todays_date_str):
     """
     Returns a dictionary of all stats needed for the dashboard.
     todays_date_str format: "YYYY-MM-DD" (to find today's question)
     """
     stats = {}
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            # 1. Active Dares (In Progress or Waiting Approval)
-            cur.execute("SELECT COUNT(*) FROM dares WHERE status IN ('IN_PROGRESS', 'WAITING_APPROVAL')")
-            stats['active_dares'] = cur.fetchone()[0]
-
-            # 2. Open Bounties
-            cur.execute("SELECT COUNT(*) FROM bounties WHERE status = 'OPEN'")
-            stats['open_bounties'] = cur.fetchone()[0]
-
-            # 3. Buried Treasure (Pending Capsules)
-            cur.execute("SELECT COUNT(*) FROM audio_capsules WHERE status = 'PENDING'")
-            stats['buried_capsules'] = cur.fetchone()[0]
-
-            # 4. Daily Question Status
-            # question_id format is "YYYY-MM-DD_HH-MM-SS"
-            query_pattern = f"{todays_date_str}%"
-            cur.execute("SELECT COUNT(DISTINCT user_id) FROM answers WHERE question_id LIKE %s", (query_pattern,))
-            stats['daily_q_count'] = cur.fetchone()[0]
-            
-    finally:
-        conn.close()
+    with conn.cursor() as cur:
+        # 1. Active Dares (In Progress or Waiting Approval)
+        cur.execute("SELECT COUNT(*) FROM dares WHERE status IN ('IN_PROGRESS', 'WAITING_APPROVAL')")
+        stats['active_dares'] = cur.fetchone()[0]
+
+        # 2. Open Bounties
+        cur.execute("SELECT COUNT(*) FROM bounties WHERE status = 'OPEN'")
+        stats['open_bounties'] = cur.fetchone()[0]
+
+        # 3. Buried Treasure (Pending Capsules)
+        cur.execute("SELECT COUNT(*) FROM audio_capsules WHERE status = 'PENDING'")
+        stats['buried_capsules'] = cur.fetchone()[0]
+
+        # 4. Daily Question Status (question_date is derived from question_id)
+        cur.execute("SELECT COUNT(DISTINCT user_id) FROM answers WHERE question_date = %s", (todays_date_str,))
+        stats['daily_q_count'] = cur.fetchone()[0]
+
+    return stats
+
+# --- CHANGE LOG FUNCTIONS (Incremental backups) ---
+
+# Tables whose row changes are logged, with their primary key columns.
+# bot_state is left out: it holds bookkeeping (incl. the backup checkpoint itself).
+CHANGE_TRACKED_TABLES = {
+    "answers": ("question_id", "user_id"),
+    "users": ("user_id",),
+    "ledger": ("id",),
+    "bounties": ("message_id",),
+    "dares": ("dare_id",),
+    "wiki": ("key_name",),
+    "moments": ("moment_id",),
+    "audio_capsules": ("id",),
+    "capsule_blobs": ("sha256",),
+    "ai_reservoir": ("id",),
+    "search_index": ("kind", "ref"),
+}
+# Bookkeeping columns: an UPDATE that only touches these isn't logged
+CHANGE_LOG_IGNORED_COLUMNS = {
+    "moments": ("last_shown_at",),   # Stamped on every !flashback
+}
+
+def init_change_log(cur):
+    """Creates change_log and an AFTER trigger on every tracked table that appends to it."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS change_log (
+            id BIGSERIAL PRIMARY KEY,
+            table_name TEXT,
+            op TEXT,
+            row_key JSONB,
+            row_data JSONB,
+            changed_at TIMESTAMPTZ DEFAULT NOW()
+        )
+    """)
+    # Trigger arguments are the table's primary key columns
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION log_change() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            doc JSONB := CASE WHEN TG_OP = 'DELETE' THEN to_jsonb(OLD) ELSE to_jsonb(NEW) END;
+        BEGIN
+            INSERT INTO change_log (table_name, op, row_key, row_data)
+            VALUES (
+                TG_TABLE_NAME, TG_OP,
+                (SELECT jsonb_object_agg(k, doc -> k) FROM unnest(TG_ARGV) AS k),
+                doc
+            );
+            RETURN NULL;
+        END $$
+    """)
+    for table, key_columns in CHANGE_TRACKED_TABLES.items():
+        args = ", ".join(f"'{column}'" for column in key_columns)
+        cur.execute(f"DROP TRIGGER IF EXISTS trg_change_log ON {table}")
+        cur.execute(f"DROP TRIGGER IF EXISTS trg_change_log_update ON {table}")
+        ignored = CHANGE_LOG_IGNORED_COLUMNS.get(table)
+        if not ignored:
+            cur.execute(f"""
+                CREATE TRIGGER trg_change_log AFTER INSERT OR UPDATE OR DELETE ON {table}
+                FOR EACH ROW EXECUTE FUNCTION log_change({args})
+            """)
+            continue
+        # WHEN can only compare OLD and NEW on an UPDATE-only trigger
+        columns = "ARRAY[" + ", ".join(f"'{column}'" for column in ignored) + "]"
+        cur.execute(f"""
+            CREATE TRIGGER trg_change_log AFTER INSERT OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION log_change({args})
+        """)
+        cur.execute(f"""
+            CREATE TRIGGER trg_change_log_update AFTER UPDATE ON {table}
+            FOR EACH ROW WHEN ((to_jsonb(OLD) - {columns}) IS DISTINCT FROM (to_jsonb(NEW) - {columns}))
+            EXECUTE FUNCTION log_change({args})
+        """)
+
+@pooled
+def get_change_log_head(conn):
+    """Highest change_log id so far (0 when empty)."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM change_log")
+        return cur.fetchone()[0]
+
+@pooled
+def export_changes(conn, after_id, out):
+    """
+    Writes the latest state of every row changed after change_log id `after_id`
+    to the binary file `out` as JSON lines ({"table", "op", "key", "row"}),
+    oldest change first. Returns (last_id, rows_written).
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT COALESCE(MAX(id), %s) FROM change_log", (after_id,))
+        last_id = cur.fetchone()[0]
+
+    written = 0
+    # Server-side cursor: rows are streamed, not loaded all at once
+    with conn.cursor(name="export_changes") as cur:
+        cur.itersize = 500
+        cur.execute("""
+            SELECT table_name, op, row_key, row_data FROM (
+                SELECT DISTINCT ON (table_name, row_key) id, table_name, op, row_key, row_data
+                FROM change_log WHERE id > %s AND id <= %s
+                ORDER BY table_name, row_key, id DESC
+            ) latest ORDER BY id
+        """, (after_id, last_id))
+        for table_name, op, row_key, row_data in cur:
+            line = json.dumps({"table": table_name, "op": op, "key": row_key, "row": row_data}, default=str)
+            out.write(line.encode() + b"\n")
+            written += 1
+    conn.commit()
+    return last_id, written
 
-    return stats
\ No newline at end of file
+@pooled
+def prune_change_log(conn, upto_id):
+    """Drops log entries already covered by a full dump."""
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM change_log WHERE id <= %s", (upto_id,))
+        deleted = cur.rowcount
+    conn.commit()
+    return deleted
@@ -0,0 +1,168 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from collections import Counter, deque
+
+# Heartbeat period: lag is how late each heartbeat wakes up
+HEARTBEAT_INTERVAL = 0.1
+# A heartbeat this late counts as a stall; the watchdog grabs the stack at this point
+STALL_THRESHOLD = 0.25
+# Lag samples kept for the percentiles (~1.5 hours at the heartbeat rate)
+SAMPLE_WINDOW = 50000
+# Stalls kept with their full stack
+RECENT_STALLS = 20
+STACK_DEPTH = 12
+
+# Frames from these files are "ours" and get the blame for a stall
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class LoopMonitor:
+    """
+    Measures event-loop lag with a heartbeat coroutine and catches whatever
+    blocks the loop. A watchdog thread notices when the heartbeat is overdue
+    and snapshots the loop thread's stack while it is still stuck, so the
+    stall is attributed to the function that was actually running (the
+    innermost frame in this project), not to whoever ran next.
+    """
+
+    def __init__(self, interval=HEARTBEAT_INTERVAL, threshold=STALL_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.samples = deque(maxlen=SAMPLE_WINDOW)   # Lag per heartbeat (seconds)
+        self.stalls = deque(maxlen=RECENT_STALLS)    # {culprit, task, lag, stack, at}
+        self.offenders = Counter()                   # culprit -> stalls
+        self.offender_time = Counter()               # culprit -> seconds blocked
+        self.offender_max = {}                       # culprit -> worst stall
+
+        self._beat = None          # monotonic time the next heartbeat is due (None while it runs)
+        self._capture = None       # (due, snapshot) grabbed by the watchdog during a stall
+        self._loop = None
+        self._loop_thread = None
+        self._task = None
+        self._stop = threading.Event()
+        self.reported_stalls = 0   # Stall count at the last periodic report
+
+    # ==========================================
+    # 1. LIFECYCLE
+    # ==========================================
+    def start(self):
+        """Call from the running loop."""
+        if self._task:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic() + self.interval
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat(), name="loop-monitor-heartbeat")
+        threading.Thread(target=self._watchdog, name="loop-monitor-watchdog", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    # ==========================================
+    # 2. HEARTBEAT (On the loop) + WATCHDOG (Own thread)
+    # ==========================================
+    async def _heartbeat(self):
+        while True:
+            due = time.monotonic() + self.interval
+            self._beat = due
+            await asyncio.sleep(self.interval)
+            self._beat = None
+            lag = max(0.0, time.monotonic() - due)
+            self.samples.append(lag)
+            if lag >= self.threshold:
+                capture = self._capture
+                # A capture taken for an earlier heartbeat belongs to a different stall
+                self._record_stall(lag, capture[1] if capture and capture[0] == due else None)
+
+    def _watchdog(self):
+        poll = min(self.threshold / 4, 0.05)
+        while not self._stop.wait(poll):
+            beat = self._beat
+            if beat is None or (self._capture and self._capture[0] == beat):
+                continue
+            if time.monotonic() - beat >= self.threshold:
+                self._capture = (beat, self._snapshot())
+
+    def _snapshot(self):
+        """Stack of the loop thread right now (called from the watchdog thread)."""
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return None
+        stack = traceback.extract_stack(frame)
+        task = None
+        try:
+            current = asyncio.current_task(self._loop)
+            task = current.get_name() if current else None
+        except RuntimeError:
+            pass
+        return {"stack": stack, "task": task, "culprit": _culprit(stack)}
+
+    def _record_stall(self, lag, capture):
+        capture = capture or {"stack": [], "task": None, "culprit": "unknown (finished before the watchdog looked)"}
+        culprit = capture["culprit"]
+        self.offenders[culprit] += 1
+        self.offender_time[culprit] += lag
+        self.offender_max[culprit] = max(self.offender_max.get(culprit, 0), lag)
+        self.stalls.append({
+            "culprit": culprit,
+            "task": capture["task"],
+            "lag": lag,
+            "stack": capture["stack"][-STACK_DEPTH:],
+            "at": time.time(),
+        })
+        print(f"🐢 Event loop blocked for {lag * 1000:.0f} ms in {culprit} (task: {capture['task']})")
+
+    # ==========================================
+    # 3. REPORT
+    # ==========================================
+    def percentiles(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {}
+        pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+        return {"p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": ordered[-1]}
+
+    def stall_count(self):
+        return sum(self.offenders.values())
+
+    def report(self, top=5, with_stack=True):
+        p = self.percentiles()
+        if not p:
+            return "🐢 Loop monitor: no samples yet."
+        ms = lambda seconds: f"{seconds * 1000:.0f} ms"
+        lines = [
+            f"🐢 Event loop lag ({len(self.samples)} heartbeats): p50 {ms(p['p50'])} | p95 {ms(p['p95'])} | "
+            f"p99 {ms(p['p99'])} | max {ms(p['max'])}",
+            f"Stalls over {ms(self.threshold)}: {self.stall_count()}",
+        ]
+        for culprit, seconds in self.offender_time.most_common(top):
+            lines.append(
+                f"  {culprit}: {self.offenders[culprit]}x, {seconds:.1f}s blocked, worst {ms(self.offender_max[culprit])}"
+            )
+
+        worst = max(self.stalls, key=lambda s: s["lag"], default=None)
+        if with_stack and worst and worst["stack"]:
+            lines.append(f"Worst recent stall ({ms(worst['lag'])}, task {worst['task']}):")
+            for frame in worst["stack"]:
+                lines.append(f"  {os.path.basename(frame.filename)}:{frame.lineno} in {frame.name}")
+        return "\n".join(lines)
+
+
+def _culprit(stack):
+    """Innermost project frame ("file.py:function"); the innermost frame if none is ours."""
+    for frame in reversed(stack):
+        filename = os.path.abspath(frame.filename)
+        if filename.startswith(PROJECT_DIR) and os.path.basename(filename) != "loop_monitor.py":
+            return f"{os.path.basename(filename)}:{frame.name}"
+    if stack:
+        frame = stack[-1]
+        return f"{os.path.basename(frame.filename)}:{frame.name}"
+    return "unknown"
@@ -1,15 +1,29 @@
 import discord
 from discord.ext import commands
 import os
+import io
 from dotenv import load_dotenv
 import config
 import database
 import datetime
 import random
 import asyncio
-import subprocess
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 import ai_manager 
+import reservoir
+import time_parser
+import dashboard
+import attachments
+import backup
+import capsule_store
+import outbox
+import countdown
+import metrics
+import loop_monitor
+import profiler
+import scheduling
 from zoneinfo import ZoneInfo
 from discord.ext import tasks
 
@@ -23,9 +37,37 @@ intents = discord.Intents.default()
 intents.message_content = True
 bot = commands.Bot(command_prefix='!', intents=intents)
 
+# Rate-limited, prioritised queue for outbound channel sends/edits
+bot.outbox = outbox.Outbox()
+
+# Latency/error metrics for every command and button (DB and AI calls time themselves)
+metrics.instrument_bot(bot)
+
+# Event-loop lag + blocking-call detector (started in on_ready, reports to #debug-logs)
+loop_watchdog = loop_monitor.LoopMonitor()
+
 # Global variable for Section 10 (Moments Game)
 active_snaps = {} 
 
+# Cached "ChannelID|MessageID" -> attachment lookups (wiki, moments, capsules)
+attachment_resolver = attachments.AttachmentResolver(bot)
+
+# Blob store for audio capsules (None = legacy copies in #debug-logs)
+capsules = capsule_store.from_env()
+
+# How late a stored job may still run after a restart (seconds). None = always run.
+REMINDER_GRACE = 10 * 60
+SNAP_GRACE = 5 * 60
+CAPSULE_GRACE = None
+# Job store: give up on an unreachable Postgres after this many seconds (the next wakeup retries)
+JOBSTORE_CONNECT_TIMEOUT = 10
+
+def local_time(value, fmt="%Y-%m-%d %H:%M:%S"):
+    """Formats a TIMESTAMPTZ from the database in MYT, the way times were shown when they were stored as text."""
+    if value is None:
+        return "unknown"
+    return value.astimezone(ZoneInfo(database.LOCAL_TZ)).strftime(fmt)
+
 # =========================================
 # 2. REMINDER SYSTEM LOGIC (Backend)
 # =========================================
@@ -46,11 +88,12 @@ async def schedule_nagging_jobs(bot, event_time, task, channel_id, mention_text)
         
         # Only schedule if the time hasn't passed yet
         if run_time > datetime.datetime.now(ZoneInfo("Asia/Kuala_Lumpur")):
-            bot.scheduler.add_job(
+            await bot.scheduler.add_job_async(
                 send_reminder_alert, 
                 'date', 
                 run_date=run_time, 
-                args=[channel_id, mention_text, task, minutes]
+                args=[channel_id, mention_text, task, minutes],
+                misfire_grace_time=REMINDER_GRACE
             )
 
 async def send_reminder_alert(channel_id, mention_text, task, minutes_left):
@@ -64,14 +107,14 @@ async def send_reminder_alert(channel_id, mention_text, task, minutes_left):
             description=f"**Event:** {task}\n\n{mention_text}, go do it now!",
             color=discord.Color.red()
         )
-        await channel.send(content=mention_text, embed=embed)
+        await bot.outbox.send(channel, outbox.HIGH, content=mention_text, embed=embed)
     else:
         embed = discord.Embed(
             title=f"⏰ Upcoming Event: {minutes_left} mins",
             description=f"**Event:** {task}",
             color=discord.Color.orange()
         )
-        await channel.send(content=mention_text, embed=embed)
+        await bot.outbox.send(channel, outbox.HIGH, content=mention_text, embed=embed)
 
 # =========================================
 # 3. DAILY QUESTION SYSTEM
@@ -93,13 +136,15 @@ class AnswerModal(discord.ui.Modal, title='Today\'s Question'):
     async def on_submit(self, interaction: discord.Interaction):
         try:
             print(f"📝 Answer submitted by {interaction.user.display_name} for question {self.question_id}")
-            await database.save_answer(
+            first_answer = await database.save_answer(
                 self.question_id, 
                 interaction.user.id, 
                 interaction.user.display_name, 
                 self.answer.value
             )
             print(f"✅ Answer saved to database")
+            if first_answer:
+                live_dashboard.answer_saved(self.question_id)
             
             await interaction.response.send_message("✅ Answer saved! Waiting for your partner...", ephemeral=True)
             
@@ -165,7 +210,7 @@ class QuestionView(discord.ui.View):
                     embed.add_field(name=f"👤 {user}", value=f"💬 {content}", inline=False)
                 
                 if channel:
-                    await channel.send(embed=embed)
+                    await bot.outbox.send(channel, outbox.NORMAL, embed=embed)
                     print(f"✅ Reveal sent to channel {channel.id}")
                 else:
                     print("❌ Channel is None!")
@@ -187,9 +232,9 @@ async def send_daily_question():
     malaysia_time = datetime.datetime.now(ZoneInfo("Asia/Kuala_Lumpur"))
     q_id = malaysia_time.strftime("%Y-%m-%d_%H-%M-%S")
     
-    # Updated to handle potential AI errors gracefully
+    # Served from the pre-generated reservoir (live AI call only if it is empty)
     try:
-        question_text = await ai_manager.get_ai_question()
+        question_text = await reservoir.take_question()
     except Exception as e:
         print(f"Daily Question Error: {e}")
         question_text = "**What is one thing you are grateful for today?**"
@@ -201,84 +246,125 @@ async def send_daily_question():
     )
     embed.set_footer(text=f"Both partners must answer to reveal. ID: {q_id}")
 
-    await target_channel.send(embed=embed, view=QuestionView(q_id))
+    await bot.outbox.send(target_channel, outbox.NORMAL, embed=embed, view=QuestionView(q_id))
     print(f"✅ Daily Question posted for {q_id}")
 
 # =========================================
 # 4. BOUNTY SYSTEM (Escrow Logic)
 # =========================================
 
+async def load_bounty(interaction):
+    """Reads the bounty behind a board message (one primary-key lookup). None if it isn't on record."""
+    bounty = await database.get_bounty(interaction.message.id)
+    if bounty is None:
+        await interaction.response.send_message("⚠️ This bounty isn't on record (it was posted before bounties were saved).", ephemeral=True)
+    return bounty
+
+async def move_bounty(interaction, new_status, claimed_by=None):
+    """Applies one state change. None if the bounty already moved on (stale button, double click)."""
+    moved = await database.advance_bounty(interaction.message.id, new_status, claimed_by)
+    if moved is None:
+        await interaction.response.send_message("⚠️ This bounty has already moved on.", ephemeral=True)
+        return None
+    old_status, bounty = moved
+    live_dashboard.bounty_moved(old_status, new_status)
+    return bounty
+
+# The views below hold no state: every button reads the bounty by its message ID,
+# so on_ready registers them once with bot.add_view() and they keep working after a restart.
+
 class ApprovalView(discord.ui.View):
-    def __init__(self, reward, employer_id, worker_id):
+    def __init__(self):
         super().__init__(timeout=None)
-        self.reward = reward
-        self.employer_id = employer_id
-        self.worker_id = worker_id
 
     @discord.ui.button(label="✅ Approve & Pay", style=discord.ButtonStyle.success, custom_id="approve_pay")
     async def approve_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if interaction.user.id != self.employer_id:
+        bounty = await load_bounty(interaction)
+        if not bounty:
+            return
+        if interaction.user.id != bounty["employer_id"]:
             await interaction.response.send_message("❌ You are the worker! You must wait for approval.", ephemeral=True)
             return
 
-        await database.add_money(self.worker_id, self.reward)
+        # Escrow is released to the worker in the same transaction as the state change
+        bounty = await move_bounty(interaction, "PAID")
+        if not bounty:
+            return
 
         embed = interaction.message.embeds[0]
         embed.color = discord.Color.green()
-        embed.set_field_at(0, name="Status", value=f"💰 PAID to <@{self.worker_id}>")
+        embed.set_field_at(0, name="Status", value=f"💰 PAID to <@{bounty['claimed_by']}>")
         
         await interaction.response.edit_message(embed=embed, view=None)
-        await interaction.followup.send(f"💸 Transaction Complete! <@{self.worker_id}> has received {self.reward} Us-Bucks.")
+        await interaction.followup.send(f"💸 Transaction Complete! <@{bounty['claimed_by']}> has received {bounty['reward']} Us-Bucks.")
 
     @discord.ui.button(label="❌ Reject (Not Done)", style=discord.ButtonStyle.danger, custom_id="reject_work")
     async def reject_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if interaction.user.id != self.employer_id:
+        bounty = await load_bounty(interaction)
+        if not bounty or interaction.user.id != bounty["employer_id"]:
+            return
+
+        bounty = await move_bounty(interaction, "IN_PROGRESS")
+        if not bounty:
             return
 
         embed = interaction.message.embeds[0]
         embed.color = discord.Color.orange()
-        embed.set_field_at(0, name="Status", value=f"⚠️ Rejected. Back to work, <@{self.worker_id}>!")
+        embed.set_field_at(0, name="Status", value=f"⚠️ Rejected. Back to work, <@{bounty['claimed_by']}>!")
         
-        await interaction.response.edit_message(embed=embed, view=InProgressView(self.reward, self.employer_id, self.worker_id))
+        await interaction.response.edit_message(embed=embed, view=InProgressView())
 
 class InProgressView(discord.ui.View):
-    def __init__(self, reward, employer_id, worker_id):
+    def __init__(self):
         super().__init__(timeout=None)
-        self.reward = reward
-        self.employer_id = employer_id
-        self.worker_id = worker_id
 
     @discord.ui.button(label="📩 Submit for Approval", style=discord.ButtonStyle.primary, custom_id="submit_work")
     async def submit_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if interaction.user.id != self.worker_id:
+        bounty = await load_bounty(interaction)
+        if not bounty:
+            return
+        if interaction.user.id != bounty["claimed_by"]:
             await interaction.response.send_message("❌ This isn't your job!", ephemeral=True)
             return
 
+        bounty = await move_bounty(interaction, "PENDING_APPROVAL")
+        if not bounty:
+            return
+
         embed = interaction.message.embeds[0]
         embed.color = discord.Color.gold()
-        embed.set_field_at(0, name="Status", value=f"⏳ Pending Approval from <@{self.employer_id}>")
+        embed.set_field_at(0, name="Status", value=f"⏳ Pending Approval from <@{bounty['employer_id']}>")
         
-        await interaction.response.edit_message(embed=embed, view=ApprovalView(self.reward, self.employer_id, self.worker_id))
-        await interaction.followup.send(f"<@{self.employer_id}>, please review the work!", ephemeral=False)
+        await interaction.response.edit_message(embed=embed, view=ApprovalView())
+        await interaction.followup.send(f"<@{bounty['employer_id']}>, please review the work!", ephemeral=False)
 
     @discord.ui.button(label="🏳️ I Give Up (Unclaim)", style=discord.ButtonStyle.secondary, custom_id="forfeit_job")
     async def forfeit_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if interaction.user.id != self.worker_id:
+        bounty = await load_bounty(interaction)
+        if not bounty or interaction.user.id != bounty["claimed_by"]:
+            return
+
+        if not await move_bounty(interaction, "OPEN"):
             return
 
         embed = interaction.message.embeds[0]
         embed.color = discord.Color.blue()
         embed.set_field_at(0, name="Status", value="🟢 OPEN")
         
-        await interaction.response.edit_message(embed=embed, view=BountyView(self.reward, self.employer_id))
+        await interaction.response.edit_message(embed=embed, view=BountyView())
 
     @discord.ui.button(label="🗑️ Force Cancel (Refund)", style=discord.ButtonStyle.danger, custom_id="force_cancel")
     async def force_cancel(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if interaction.user.id != self.employer_id:
+        bounty = await load_bounty(interaction)
+        if not bounty:
+            return
+        if interaction.user.id != bounty["employer_id"]:
             await interaction.response.send_message("❌ Only the Employer can cancel.", ephemeral=True)
             return
 
-        await database.add_money(self.employer_id, self.reward)
+        # Refunds the escrow in the same transaction
+        if not await move_bounty(interaction, "CANCELLED"):
+            return
         
         embed = interaction.message.embeds[0]
         embed.color = discord.Color.red()
@@ -288,29 +374,35 @@ class InProgressView(discord.ui.View):
         await interaction.followup.send("💰 Bounty cancelled. Money refunded.", ephemeral=True)
 
 class BountyView(discord.ui.View):
-    def __init__(self, reward, employer_id):
+    def __init__(self):
         super().__init__(timeout=None)
-        self.reward = reward
-        self.employer_id = employer_id
 
     @discord.ui.button(label="🙋‍♂️ I'll do it!", style=discord.ButtonStyle.success, custom_id="claim_bounty")
     async def claim_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if interaction.user.id == self.employer_id:
+        bounty = await load_bounty(interaction)
+        if not bounty:
+            return
+        if interaction.user.id == bounty["employer_id"]:
             await interaction.response.send_message("❌ You can't claim your own bounty!", ephemeral=True)
             return
 
+        if not await move_bounty(interaction, "IN_PROGRESS", claimed_by=interaction.user.id):
+            return
+
         embed = interaction.message.embeds[0]
         embed.color = discord.Color.orange()
         embed.set_field_at(0, name="Status", value=f"🚧 In Progress by {interaction.user.mention}")
         
-        await interaction.response.edit_message(embed=embed, view=InProgressView(self.reward, self.employer_id, interaction.user.id))
+        await interaction.response.edit_message(embed=embed, view=InProgressView())
 
     @discord.ui.button(label="🗑️ Cancel & Refund", style=discord.ButtonStyle.danger, custom_id="cancel_open_bounty")
     async def cancel_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if interaction.user.id != self.employer_id:
+        bounty = await load_bounty(interaction)
+        if not bounty or interaction.user.id != bounty["employer_id"]:
             return
 
-        await database.add_money(self.employer_id, self.reward)
+        if not await move_bounty(interaction, "CANCELLED"):
+            return
 
         embed = interaction.message.embeds[0]
         embed.color = discord.Color.red()
@@ -328,7 +420,11 @@ async def bounty(ctx, reward: int, *, task: str):
         await ctx.send("❌ Reward must be positive.")
         return
 
-    if await database.purchase_item(ctx.author.id, reward):
+    escrowed = await database.purchase_item(
+        ctx.author.id, reward, reason="bounty escrow",
+        idempotency_key=f"bounty:{ctx.message.id}:escrow", payee=database.ESCROW
+    )
+    if escrowed:
         embed = discord.Embed(
             title="📜 WANTED: Task Assistance",
             description=f"**Task:** {task}",
@@ -338,7 +434,33 @@ async def bounty(ctx, reward: int, *, task: str):
         embed.add_field(name="Reward", value=f"💰 {reward} Us-Bucks")
         embed.set_footer(text=f"Employer: {ctx.author.display_name}")
 
-        await target_channel.send(embed=embed, view=BountyView(reward, ctx.author.id))
+        # Posted without buttons: nobody can claim it before the row exists
+        board_message = None
+        recorded = False
+        try:
+            board_message = await bot.outbox.send(target_channel, outbox.NORMAL, embed=embed)
+            # The board message ID is the bounty's key from here on
+            await database.create_bounty(board_message.id, target_channel.id, ctx.author.id, task, reward)
+            recorded = True
+            await bot.outbox.edit(board_message, outbox.NORMAL, view=BountyView())
+        except Exception as e:
+            print(f"❌ Bounty not posted: {e}")
+            if recorded:
+                # Cancelling releases the escrow, and the bounty can't be claimed afterwards
+                await database.advance_bounty(board_message.id, "CANCELLED")
+            else:
+                await database.add_money(
+                    ctx.author.id, reward, reason="bounty refund (not posted)",
+                    idempotency_key=f"bounty:{ctx.message.id}:unposted", payer=database.ESCROW
+                )
+            if board_message:
+                try:
+                    await bot.outbox.delete(board_message, outbox.NORMAL)
+                except discord.HTTPException:
+                    pass
+            await ctx.send("❌ Couldn't post the bounty. Your Us-Bucks were refunded.")
+            return
+        live_dashboard.bounty_opened()
         await ctx.message.delete()
         await ctx.send(f"✅ Bounty posted! **{reward} Us-Bucks** held in escrow.", delete_after=5)
     else:
@@ -381,10 +503,10 @@ async def create_poll(ctx, question, options):
     )
     embed.set_footer(text="Vote with reactions, or click Spin to decide randomly.")
 
-    msg = await target_channel.send(embed=embed, view=DecisionView(options))
+    msg = await bot.outbox.send(target_channel, outbox.NORMAL, embed=embed, view=DecisionView(options))
     
-    for i in range(len(options)):
-        await msg.add_reaction(emojis[i])
+    # Queued in order behind the channel's rate budget
+    await asyncio.gather(*(bot.outbox.add_reaction(msg, emojis[i]) for i in range(len(options))))
             
     if ctx.channel.id != target_channel.id:
         await ctx.send(f"✅ Poll created in {target_channel.mention}!", delete_after=3)
@@ -444,21 +566,27 @@ async def decide(ctx, question: str, *options):
 
 async def process_reminder(ctx, raw_args, is_public_ping):
     now_malaysia = datetime.datetime.now(ZoneInfo("Asia/Kuala_Lumpur"))
-    now_str = now_malaysia.strftime("%Y-%m-%d %H:%M:%S")
 
-    await ctx.send("⏳ *Setting alarms...*", delete_after=3)
-    extracted_time = await ai_manager.extract_datetime(raw_args, now_str)
+    # 1. Fast path: local parser (reads times in the author's own timezone)
+    event_time = time_parser.parse_datetime(raw_args, now_malaysia, ctx.author.id)
 
-    if not extracted_time or "None" in extracted_time:
-        await ctx.send("❌ I couldn't understand the time. Try format: `tomorrow at 5pm` or `in 2 hours`.")
-        return
+    # 2. Slow path: only ask the AI when the local parser can't read it
+    if event_time is None:
+        now_str = now_malaysia.strftime("%Y-%m-%d %H:%M:%S")
 
-    try:
-        event_time = datetime.datetime.strptime(extracted_time, "%Y-%m-%d %H:%M:%S")
-        event_time = event_time.replace(tzinfo=ZoneInfo("Asia/Kuala_Lumpur"))
-    except ValueError:
-        await ctx.send("❌ Internal Date Error.")
-        return
+        await ctx.send("⏳ *Setting alarms...*", delete_after=3)
+        extracted_time = await ai_manager.extract_datetime(raw_args, now_str)
+
+        if not extracted_time or "None" in extracted_time:
+            await ctx.send("❌ I couldn't understand the time. Try format: `tomorrow at 5pm` or `in 2 hours`.")
+            return
+
+        try:
+            event_time = datetime.datetime.strptime(extracted_time, "%Y-%m-%d %H:%M:%S")
+            event_time = event_time.replace(tzinfo=ZoneInfo("Asia/Kuala_Lumpur"))
+        except ValueError:
+            await ctx.send("❌ Internal Date Error.")
+            return
 
     if event_time < now_malaysia:
         await ctx.send("❌ That time has already passed!")
@@ -514,7 +642,10 @@ class BuyModal(discord.ui.Modal, title='Purchase Item'):
             await interaction.response.send_message("❌ Item ID not found!", ephemeral=True)
             return
 
-        success = await database.purchase_item(interaction.user.id, item['cost'])
+        success = await database.purchase_item(
+            interaction.user.id, item['cost'], reason=f"shop: {item['name']}",
+            idempotency_key=f"shop:{interaction.id}"
+        )
         
         if not success:
             await interaction.response.send_message("💸 **Insufficient Funds!** Answer more daily questions.", ephemeral=True)
@@ -528,7 +659,7 @@ class BuyModal(discord.ui.Modal, title='Purchase Item'):
             description=f"🎉 {interaction.user.mention} just bought **{item['name']}** for {item['cost']} Us-Bucks!",
             color=discord.Color.gold()
         )
-        await interaction.channel.send(embed=receipt_embed)
+        await bot.outbox.send(interaction.channel, outbox.NORMAL, embed=receipt_embed)
 
         # 2. Reset the Menu (Delete old, send new)
         try:
@@ -568,7 +699,7 @@ async def send_shop_menu(channel):
             inline=False
         )
     
-    await channel.send(embed=embed, view=ShopView())
+    await bot.outbox.send(channel, outbox.NORMAL, embed=embed, view=ShopView())
 
 
 @bot.command()
@@ -673,6 +804,30 @@ async def wiki(ctx):
     
     await ctx.send(embed=embed)
 
+async def send_wiki_entry(ctx, key_name, wiki_entry):
+    """DMs a wiki entry to the author."""
+    content, attachment_data = wiki_entry
+
+    # Dynamic Refresh Logic for wiki attachments (cached until the CDN link expires)
+    image_url = await attachment_resolver.resolve_url(attachment_data)
+
+    embed = discord.Embed(
+        title=f"📝 {key_name.title()}",
+        description=content if content else "",
+        color=discord.Color.green()
+    )
+    
+    if image_url:
+        embed.set_image(url=image_url)
+    elif attachment_data: 
+        embed.set_footer(text="⚠️ Image not found (Original message was deleted?)")
+
+    try:
+        await ctx.author.send(embed=embed)
+        await ctx.message.add_reaction("📩")
+    except discord.Forbidden:
+        await ctx.send("❌ Enable DMs!")
+
 @bot.command()
 async def get(ctx, *, key: str):
     # Check if in wiki channel
@@ -688,63 +843,33 @@ async def get(ctx, *, key: str):
     
     if wiki_entry:
         # Found a wiki entry
-        content, attachment_data = wiki_entry
-        image_url = None
-
-        # Dynamic Refresh Logic for wiki attachments
-        if attachment_data:
-            try:
-                c_id, m_id = attachment_data.split('|')
-                channel = bot.get_channel(int(c_id))
-                if channel:
-                    msg = await channel.fetch_message(int(m_id))
-                    if msg.attachments:
-                        image_url = msg.attachments[0].url
-            except Exception:
-                image_url = None
-
-        embed = discord.Embed(
-            title=f"📝 {search_key.title()}",
-            description=content if content else "",
-            color=discord.Color.green()
-        )
-        
-        if image_url:
-            embed.set_image(url=image_url)
-        elif attachment_data: 
-            embed.set_footer(text="⚠️ Image not found (Original message was deleted?)")
-
-        try:
-            await ctx.author.send(embed=embed)
-            await ctx.message.add_reaction("📩")
-        except discord.Forbidden:
-            await ctx.send("❌ Enable DMs!")
+        await send_wiki_entry(ctx, search_key, wiki_entry)
         return
     
-    # If no wiki entry, try to find a moment by caption
-    moment = await database.get_moment_by_caption(search_key)
+    # If no exact key, search wiki entries and moment captions together
+    results = await database.search_memories(search_key)
+    best = results[0] if results and results[0][3] else None
+
+    if best and best[0] == "wiki":
+        key_name = best[1]
+        wiki_entry = await database.get_wiki_entry(key_name)
+        if wiki_entry:
+            await send_wiki_entry(ctx, key_name, wiki_entry)
+            return
+
+    moment = await database.get_moment(best[1]) if best and best[0] == "moment" else None
     
     if moment:
         # Found a moment
         user_id, caption, attachment_data, timestamp, source = moment
-        image_url = None
         
         # Get image URL for moment
-        if attachment_data:
-            try:
-                c_id, m_id = attachment_data.split('|')
-                channel = bot.get_channel(int(c_id))
-                if channel:
-                    msg = await channel.fetch_message(int(m_id))
-                    if msg.attachments:
-                        image_url = msg.attachments[0].url
-            except Exception:
-                image_url = None
+        image_url = await attachment_resolver.resolve_url(attachment_data)
         
         source_label = "⚡ SNAP CHALLENGE" if source == "SNAP" else "📝 MANUAL LOG"
         embed = discord.Embed(
             title=f"📸 {caption}",
-            description=f"**Type:** {source_label}\n📅 {timestamp}\n👤 <@{user_id}>",
+            description=f"**Type:** {source_label}\n📅 {local_time(timestamp)}\n👤 <@{user_id}>",
             color=discord.Color.purple()
         )
         
@@ -761,6 +886,11 @@ async def get(ctx, *, key: str):
         return
     
     # Not found in either wiki or moments
+    suggestions = list(dict.fromkeys(title for _, _, title, _, _ in results))[:3]
+    if suggestions:
+        did_you_mean = ", ".join(f"`{title}`" for title in suggestions)
+        await ctx.send(f"❌ Not found: **{search_key}**\n\n🤔 Did you mean: {did_you_mean}?")
+        return
     await ctx.send(f"❌ Not found: **{search_key}**\n\nSearches both wiki entries and moment captions.")
 
 
@@ -795,8 +925,14 @@ class DareVerifyView(discord.ui.View):
             await interaction.response.send_message("❌ Only the Challenger can approve payment!", ephemeral=True)
             return
 
-        await database.add_money(self.victim_id, self.reward)
-        await database.update_dare_status(self.dare_id, "COMPLETED")
+        paid = await database.add_money(
+            self.victim_id, self.reward, reason="dare reward", idempotency_key=f"dare:{self.dare_id}:reward"
+        )
+        if not paid:
+            await interaction.response.send_message("⚠️ This dare was already paid out.", ephemeral=True)
+            return
+        old_status = await database.update_dare_status(self.dare_id, "COMPLETED")
+        live_dashboard.dare_moved(old_status, "COMPLETED")
 
         embed = interaction.message.embeds[0]
         embed.color = discord.Color.green()
@@ -856,7 +992,8 @@ class DareActiveView(discord.ui.View):
             await interaction.response.send_message("❌ You aren't the one doing this dare!", ephemeral=True)
             return
 
-        await database.update_dare_status(self.dare_id, "WAITING_APPROVAL")
+        old_status = await database.update_dare_status(self.dare_id, "WAITING_APPROVAL")
+        live_dashboard.dare_moved(old_status, "WAITING_APPROVAL")
         
         embed = interaction.message.embeds[0]
         embed.color = discord.Color.gold()
@@ -874,8 +1011,12 @@ class DareActiveView(discord.ui.View):
 
     async def approve_bot_dare(self, interaction):
         # Special helper to auto-complete bot dares
-        await database.add_money(self.victim_id, self.reward)
-        await database.update_dare_status(self.dare_id, "COMPLETED")
+        if not await database.add_money(
+            self.victim_id, self.reward, reason="dare reward", idempotency_key=f"dare:{self.dare_id}:reward"
+        ):
+            return  # Already paid out
+        old_status = await database.update_dare_status(self.dare_id, "COMPLETED")
+        live_dashboard.dare_moved(old_status, "COMPLETED")
         embed = interaction.message.embeds[0]
         embed.color = discord.Color.green()
         embed.set_field_at(0, name="Status", value=f"🎉 **COMPLETED!** (Bot Approved)")
@@ -906,7 +1047,8 @@ class DarePendingView(discord.ui.View):
             await interaction.response.send_message("❌ You can't accept your own dare!", ephemeral=True)
             return
 
-        await database.update_dare_status(self.dare_id, "IN_PROGRESS", victim_id=interaction.user.id)
+        old_status = await database.update_dare_status(self.dare_id, "IN_PROGRESS", victim_id=interaction.user.id)
+        live_dashboard.dare_moved(old_status, "IN_PROGRESS")
 
         embed = interaction.message.embeds[0]
         embed.color = discord.Color.orange()
@@ -920,12 +1062,12 @@ async def dare(ctx):
     """Manually start a dare for your partner."""
     # Modified to catch AI errors without crashing
     try:
-        task, price = await ai_manager.get_ai_dare()
+        task, price = await reservoir.take_dare()
     except Exception as e:
         print(f"Manual Dare Error: {e}")
         task, price = "Hold a plank for 45 seconds.", 30
 
-    dare_id = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    dare_id = datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
     
     await database.create_dare(dare_id, ctx.author.id, task, price)
     
@@ -937,7 +1079,7 @@ async def dare(ctx):
     embed.add_field(name="Status", value="🟡 Waiting for a victim...")
     embed.set_footer(text=f"DARE: {dare_id} | {ctx.author.id} | 0 | {price}")
     
-    await ctx.send(embed=embed, view=DarePendingView(dare_id, ctx.author.id, price))
+    await bot.outbox.send(ctx.channel, outbox.NORMAL, embed=embed, view=DarePendingView(dare_id, ctx.author.id, price))
 
 
 # =========================================
@@ -960,8 +1102,9 @@ async def trigger_snap_for_user(user_id):
     active_snaps[user_id] = deadline
     
     # 3. Send Alert
-    await channel.send(
-        f"📸 **SNAP TIME!** <@{user_id}>\n"
+    await bot.outbox.send(
+        channel, outbox.HIGH,
+        content=f"📸 **SNAP TIME!** <@{user_id}>\n"
         f"⚠️ **What are you doing right now?**\n"
         f"Reply with `!snap <caption >` and a photo within **15 minutes**!"
     )
@@ -977,10 +1120,10 @@ async def save_moment_logic(ctx, caption, source, reward):
 
     # Save Data
     attachment_data = f"{ctx.channel.id}|{ctx.message.id}"
-    timestamp = datetime.datetime.now(ZoneInfo("Asia/Kuala_Lumpur")).strftime("%Y-%m-%d %H:%M:%S")
+    timestamp = datetime.datetime.now(ZoneInfo("Asia/Kuala_Lumpur"))
     
     await database.add_moment(ctx.author.id, caption, attachment_data, timestamp, source)
-    await database.add_money(ctx.author.id, reward)
+    await database.add_money(ctx.author.id, reward, reason=f"moment ({source.lower()})", idempotency_key=f"moment:{ctx.message.id}")
     
     embed = discord.Embed(
         description=f"✅ **Memory Saved!**\n💰 Earned **{reward} Us-Bucks**.",
@@ -1023,30 +1166,36 @@ async def log(ctx, *, caption: str = "Memory Log"):
     """Manually add a photo anytime."""
     await save_moment_logic(ctx, caption, "LOG", 5) 
 
+# !flashback modes and their weights when no mode is given
+FLASHBACK_MODES = {"today": 3, "stale": 2, "random": 1}
+
 @bot.command()
-async def flashback(ctx):
-    """Shows a random photo from the past."""
-    row = await database.get_random_moment()
+async def flashback(ctx, mode: str = None):
+    """Shows a photo from the past. Modes: today (on this day), stale (least recently shown), random."""
+    mode = (mode or "").lower()
+    if mode not in FLASHBACK_MODES:
+        # No mode given: mix them, favouring anniversaries and forgotten ones
+        mode = random.choices(list(FLASHBACK_MODES), weights=list(FLASHBACK_MODES.values()))[0]
+
+    row = None
+    if mode == "today":
+        today = datetime.datetime.now(ZoneInfo("Asia/Kuala_Lumpur"))
+        row = await database.get_on_this_day_moment(today.month, today.day)
+    elif mode == "stale":
+        row = await database.get_least_recently_shown_moment()
+    if not row:
+        row = await database.get_random_moment()
     if not row:
         await ctx.send("📭 No memories found yet!")
         return
         
-    user_id, caption, attachment_data, timestamp, source = row
+    moment_id, user_id, caption, attachment_data, timestamp, source = row
     
-    image_url = None
-    if attachment_data:
-        try:
-            c_id, m_id = attachment_data.split('|')
-            channel = bot.get_channel(int(c_id))
-            msg = await channel.fetch_message(int(m_id))
-            if msg.attachments:
-                image_url = msg.attachments[0].url
-        except:
-            image_url = None
+    image_url = await attachment_resolver.resolve_url(attachment_data)
 
     embed = discord.Embed(
         title="🕰️ Flashback",
-        description=f"**{caption}**\n📅 {timestamp}\n👤 Captured by <@{user_id}>",
+        description=f"**{caption}**\n📅 {local_time(timestamp)}\n👤 Captured by <@{user_id}>",
         color=discord.Color.blue()
     )
     if image_url:
@@ -1056,6 +1205,76 @@ async def flashback(ctx):
         
     await ctx.send(embed=embed)
 
+MOMENTS_PER_PAGE = 3
+
+class MomentsView(discord.ui.View):
+    """
+    Pages through moments newest-first. Each page is fetched on demand with a
+    keyset cursor, so only the rows on screen are ever loaded; the cursors of
+    visited pages are kept so Previous doesn't need an OFFSET either.
+    """
+    def __init__(self, total_estimate):
+        super().__init__()
+        self.total_estimate = total_estimate
+        self.total_pages = max(1, (total_estimate + MOMENTS_PER_PAGE - 1) // MOMENTS_PER_PAGE)
+        self.cursors = [None]   # cursors[n] = start of page n
+        self.current_page = 0
+        self.page_rows = []
+        self.has_more = False
+
+    async def load_page(self):
+        self.page_rows, self.has_more = await database.get_moments_page(
+            MOMENTS_PER_PAGE, self.cursors[self.current_page]
+        )
+        # The count is an estimate; never promise fewer pages than we can see
+        if self.has_more:
+            self.total_pages = max(self.total_pages, self.current_page + 2)
+        else:
+            self.total_pages = self.current_page + 1
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.prev_button.disabled = self.current_page == 0
+        self.next_button.disabled = not self.has_more
+
+    def build_embed(self):
+        embed = discord.Embed(
+            title="📸 All Captured Moments",
+            description=f"Page {self.current_page + 1} of {self.total_pages} • Total: {self.total_estimate} moments",
+            color=discord.Color.purple()
+        )
+
+        for moment in self.page_rows:
+            moment_id, user_id, caption, attachment_data, timestamp, source = moment
+
+            source_emoji = "⚡ SNAP CHALLENGE" if source == "SNAP" else "📝 MANUAL LOG"
+            moment_info = f"**Type:** {source_emoji}\n📅 **{local_time(timestamp)}**\n👤 <@{user_id}>"
+            embed.add_field(
+                name=f"✨ {caption}",
+                value=moment_info,
+                inline=False
+            )
+        return embed
+
+    @discord.ui.button(label="◀️ Previous", style=discord.ButtonStyle.blurple)
+    async def prev_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.current_page > 0:
+            self.current_page -= 1
+            await self.show_page(interaction)
+
+    @discord.ui.button(label="Next ▶️", style=discord.ButtonStyle.blurple)
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.has_more and self.page_rows:
+            last = self.page_rows[-1]
+            del self.cursors[self.current_page + 1:]
+            self.cursors.append((last[4], last[0]))  # (timestamp, moment_id)
+            self.current_page += 1
+            await self.show_page(interaction)
+
+    async def show_page(self, interaction: discord.Interaction):
+        await self.load_page()
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+
 @bot.command()
 async def moments(ctx):
     """Browse all captured moments from snaps and logs."""
@@ -1065,90 +1284,15 @@ async def moments(ctx):
         await ctx.send(f"❌ This command only works in <#{wiki_channel_id}>")
         return
     
-    all_moments = await database.get_all_moments()
+    # Show first page (3 moments per page with full details)
+    view = MomentsView(await database.estimate_moment_count())
+    await view.load_page()
     
-    if not all_moments:
+    if not view.page_rows:
         await ctx.send("📭 No captured moments yet! Use `!snap` or `!log` to start capturing memories.")
         return
     
-    # Create a paginated view (show 3 moments per page with full details)
-    moments_per_page = 3
-    total_pages = (len(all_moments) + moments_per_page - 1) // moments_per_page
-    
-    class MomentsView(discord.ui.View):
-        def __init__(self, moments_list, page=0):
-            super().__init__()
-            self.moments_list = moments_list
-            self.current_page = page
-            self.total_pages = (len(moments_list) + moments_per_page - 1) // moments_per_page
-            self.update_buttons()
-        
-        def update_buttons(self):
-            self.prev_button.disabled = self.current_page == 0
-            self.next_button.disabled = self.current_page >= self.total_pages - 1
-        
-        @discord.ui.button(label="◀️ Previous", style=discord.ButtonStyle.blurple)
-        async def prev_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-            if self.current_page > 0:
-                self.current_page -= 1
-                self.update_buttons()
-                await self.show_page(interaction)
-        
-        @discord.ui.button(label="Next ▶️", style=discord.ButtonStyle.blurple)
-        async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-            if self.current_page < self.total_pages - 1:
-                self.current_page += 1
-                self.update_buttons()
-                await self.show_page(interaction)
-        
-        async def show_page(self, interaction: discord.Interaction):
-            start_idx = self.current_page * moments_per_page
-            end_idx = min(start_idx + moments_per_page, len(self.moments_list))
-            page_moments = self.moments_list[start_idx:end_idx]
-            
-            embed = discord.Embed(
-                title="📸 All Captured Moments",
-                description=f"Page {self.current_page + 1} of {self.total_pages} • Total: {len(self.moments_list)} moments",
-                color=discord.Color.purple()
-            )
-            
-            for i, moment in enumerate(page_moments, start=start_idx + 1):
-                user_id, caption, attachment_data, timestamp, source = moment
-                
-                source_emoji = "⚡ SNAP CHALLENGE" if source == "SNAP" else "📝 MANUAL LOG"
-                moment_info = f"**Type:** {source_emoji}\n📅 **{timestamp}**\n👤 <@{user_id}>"
-                embed.add_field(
-                    name=f"✨ {caption}",
-                    value=moment_info,
-                    inline=False
-                )
-            
-            await interaction.response.edit_message(embed=embed, view=self)
-    
-    # Show first page
-    view = MomentsView(all_moments)
-    start_idx = 0
-    end_idx = min(moments_per_page, len(all_moments))
-    page_moments = all_moments[start_idx:end_idx]
-    
-    embed = discord.Embed(
-        title="📸 All Captured Moments",
-        description=f"Page 1 of {total_pages} • Total: {len(all_moments)} moments",
-        color=discord.Color.purple()
-    )
-    
-    for i, moment in enumerate(page_moments, start=1):
-        user_id, caption, attachment_data, timestamp, source = moment
-        
-        source_emoji = "⚡ SNAP CHALLENGE" if source == "SNAP" else "📝 MANUAL LOG"
-        moment_info = f"**Type:** {source_emoji}\n📅 **{timestamp}**\n👤 <@{user_id}>"
-        embed.add_field(
-            name=f"✨ {caption}",
-            value=moment_info,
-            inline=False
-        )
-    
-    await ctx.send(embed=embed, view=view)
+    await ctx.send(embed=view.build_embed(), view=view)
 
 
 # =========================================
@@ -1165,25 +1309,31 @@ async def deliver_capsule_job(capsule_id, sender_id, attachment_data, reason):
     target_channel = bot.get_channel(target_channel_id)
     if not target_channel: return
 
-    # 1. Fetch the original file from storage (Debug Logs)
+    # 1. Fetch the original file from storage (blob store, or Debug Logs for older capsules)
     audio_file = None
     try:
-        # attachment_data is stored as "ChannelID|MessageID"
-        c_id, m_id = attachment_data.split('|')
-        source_channel = bot.get_channel(int(c_id))
-        source_msg = await source_channel.fetch_message(int(m_id))
-        
-        if source_msg.attachments:
+        if capsule_store.is_blob(attachment_data):
+            if not capsules:
+                raise LookupError("CAPSULE_STORE is not configured")
+            # Streamed from the store as it uploads
+            audio_file = await capsules.open_file(attachment_data)
+        else:
+            # attachment_data is stored as "ChannelID|MessageID"
+            source_attachment = await attachment_resolver.resolve(attachment_data)
+            if not source_attachment:
+                raise LookupError("source message or attachment not found")
+
             # We convert it back to a file object to re-upload
-            audio_file = await source_msg.attachments[0].to_file()
+            audio_file = await source_attachment.to_file()
             
     except Exception as e:
         print(f"❌ Error retrieving capsule file: {e}")
-        await target_channel.send(f"⚠️ **Error:** Capsule from <@{sender_id}> got lost in the mail (Source message deleted).")
+        await bot.outbox.send(target_channel, outbox.HIGH, content=f"⚠️ **Error:** Capsule from <@{sender_id}> got lost in the mail (Source message deleted).")
         return
 
     # 2. Mark as 'ARCHIVED' so it shows in mixtape later
-    await database.mark_capsule_delivered(capsule_id)
+    old_status = await database.mark_capsule_delivered(capsule_id)
+    live_dashboard.capsule_dug_up(old_status)
 
     # 3. Create the delivery note
     embed = discord.Embed(
@@ -1193,7 +1343,7 @@ async def deliver_capsule_job(capsule_id, sender_id, attachment_data, reason):
     )
     
     # 4. Send the embed AND the file together
-    await target_channel.send(content=f"🔔 <@{sender_id}> sent this for you!", embed=embed, file=audio_file)
+    await bot.outbox.send(target_channel, outbox.HIGH, content=f"🔔 <@{sender_id}> sent this for you!", embed=embed, file=audio_file)
 
 
 # --- MENUS AND BUTTONS ---
@@ -1232,11 +1382,13 @@ class CapsuleTypeView(discord.ui.View):
         deliver_time = datetime.datetime.now(ZoneInfo("Asia/Kuala_Lumpur")) + datetime.timedelta(minutes=minutes)
         
         # 2. Save & Schedule
-        c_id = await database.add_capsule(self.sender_id, self.attachment_data, "random", deliver_time.strftime("%Y-%m-%d %H:%M:%S"), "PENDING")
+        c_id = await database.add_capsule(self.sender_id, self.attachment_data, "random", deliver_time, "PENDING")
+        live_dashboard.capsule_buried()
         
-        bot.scheduler.add_job(
+        await bot.scheduler.add_job_async(
             deliver_capsule_job, 'date', run_date=deliver_time,
-            args=[c_id, self.sender_id, self.attachment_data, "🎲 Surprise Delivery"]
+            args=[c_id, self.sender_id, self.attachment_data, "🎲 Surprise Delivery"],
+            id=f"capsule_{c_id}", replace_existing=True, misfire_grace_time=CAPSULE_GRACE
         )
         await interaction.response.send_message(f"🤐 **Buried!** Will surface in {minutes//60} hours.", ephemeral=True)
 
@@ -1258,11 +1410,13 @@ class CapsuleTypeView(discord.ui.View):
             next_morning += datetime.timedelta(days=1) # Move to tomorrow if 7 AM passed
         
         # 3. Save & Schedule
-        c_id = await database.add_capsule(self.sender_id, self.attachment_data, "morning", next_morning.strftime("%Y-%m-%d %H:%M:%S"), "PENDING")
+        c_id = await database.add_capsule(self.sender_id, self.attachment_data, "morning", next_morning, "PENDING")
+        live_dashboard.capsule_buried()
         
-        bot.scheduler.add_job(
+        await bot.scheduler.add_job_async(
             deliver_capsule_job, 'date', run_date=next_morning,
-            args=[c_id, self.sender_id, self.attachment_data, "☀️ Good Morning"]
+            args=[c_id, self.sender_id, self.attachment_data, "☀️ Good Morning"],
+            id=f"capsule_{c_id}", replace_existing=True, misfire_grace_time=CAPSULE_GRACE
         )
         await interaction.response.send_message(f"🌅 **Scheduled!** Delivery at 7:00 AM their time.", ephemeral=True)
 
@@ -1296,7 +1450,7 @@ async def mixtape(ctx):
 
     desc = ""
     for sender, label, date in rows:
-        desc += f"• **{label.upper()}** from <@{sender}> ({date[:10]})\n"
+        desc += f"• **{label.upper()}** from <@{sender}> ({local_time(date, '%Y-%m-%d')})\n"
         
     embed = discord.Embed(title="📼 The Mixtape", description=desc, color=discord.Color.purple())
     await ctx.send(embed=embed)
@@ -1317,14 +1471,31 @@ async def on_message(message):
         att = message.attachments[0]
         if att.content_type and "audio" in att.content_type:
             
-            # 1. SECURE THE FILE (Backup to Debug Channel)
-            debug_channel = bot.get_channel(config.CHANNELS.get("debug_logs"))
-            if debug_channel:
-                backup = await debug_channel.send(f"💾 Audio Backup ({message.author.name})", file=await att.to_file())
-                
-                # STORE ID "ChannelID|MessageID"
-                attachment_data = f"{debug_channel.id}|{backup.id}"
-                
+            # 1. SECURE THE FILE (Blob store, or a backup copy in the Debug Channel)
+            attachment_data = None
+            if capsules:
+                try:
+                    # Streamed to the store in chunks; identical clips are stored once
+                    attachment_data = await capsules.ingest(att)
+                except Exception as e:
+                    print(f"❌ Capsule store error: {e}")
+                    await bot.outbox.send(
+                        message.channel, outbox.NORMAL,
+                        content=f"⚠️ {message.author.mention}, I couldn't save that clip. Please try again!", delete_after=10
+                    )
+                    return
+            else:
+                debug_channel = bot.get_channel(config.CHANNELS.get("debug_logs"))
+                if debug_channel:
+                    backup_msg = await bot.outbox.send(
+                        debug_channel, outbox.NORMAL,
+                        content=f"💾 Audio Backup ({message.author.name})", file=await att.to_file()
+                    )
+                    
+                    # STORE ID "ChannelID|MessageID"
+                    attachment_data = f"{debug_channel.id}|{backup_msg.id}"
+
+            if attachment_data:
                 # 2. DELETE ORIGINAL (Hide it)
                 await message.delete()
                 
@@ -1336,114 +1507,61 @@ async def on_message(message):
                     )
                 except:
                     # Fallback if DMs closed
-                    await message.channel.send(
-                        f"{message.author.mention}, enable DMs to set the delivery time!",
+                    await bot.outbox.send(
+                        message.channel, outbox.NORMAL,
+                        content=f"{message.author.mention}, enable DMs to set the delivery time!",
                         delete_after=10
                     )
 
 
 
-# =========================================
-# 12. LIVE DASHBOARD (The Stats Board)
-# =========================================
+# --- ATTACHMENT CACHE UPKEEP ---
+@bot.event
+async def on_raw_message_delete(payload):
+    attachment_resolver.forget(payload.channel_id, payload.message_id)
 
-@tasks.loop(minutes=1) 
-async def update_dashboard():
-    """Updates the pinned stats board every 1 min."""
-    channel_id = config.CHANNELS.get("live_stats")
-    
-    # 1. Fetch channel safely
-    channel = bot.get_channel(channel_id)
-    if not channel: return
+@bot.event
+async def on_raw_bulk_message_delete(payload):
+    for message_id in payload.message_ids:
+        attachment_resolver.forget(payload.channel_id, message_id)
+
+@bot.event
+async def on_raw_message_edit(payload):
+    attachment_resolver.update_from_message(payload.message)
 
-    # 2. Wrap the entire update logic in try/except to prevent 500 crashes
+@tasks.loop(minutes=15)
+async def prefetch_attachments():
+    """Refreshes frequently viewed attachments before their CDN links expire."""
     try:
-        # --- A. CLOCKS ---
-        tz_husb = ZoneInfo("Asia/Kuala_Lumpur") 
-        tz_wife = ZoneInfo("Africa/Lusaka") 
-        
-        time_husb = datetime.datetime.now(tz_husb).strftime("%I:%M %p")
-        time_wife = datetime.datetime.now(tz_wife).strftime("%I:%M %p")
-        
-        # --- B. COUNTERS ---
-        now = datetime.datetime.now()
-        try:
-            start_date = datetime.datetime.strptime(config.DATES["relationship_start"], "%Y-%m-%d")
-            days_together = (now - start_date).days
-        except:
-            days_together = "0"
+        await attachment_resolver.refresh_hot()
+    except Exception as e:
+        print(f"⚠️ Attachment prefetch error: {e}")
 
+@tasks.loop(hours=1)
+async def report_loop_stalls():
+    """Posts the lag report to #debug-logs, but only when there were new stalls."""
+    stalls = loop_watchdog.stall_count()
+    if stalls <= loop_watchdog.reported_stalls:
+        return
+    debug_channel = bot.get_channel(config.CHANNELS.get("debug_logs"))
+    if debug_channel:
         try:
-            last_seen_date = datetime.datetime.strptime(config.DATES["last_seen"], "%Y-%m-%d")
-            days_apart = (now - last_seen_date).days
-        except:
-            days_apart = "0"
-
-        # --- C. DATABASE STATS ---
-        today_str = datetime.datetime.now(tz_husb).strftime("%Y-%m-%d")
-        stats = await database.get_dashboard_stats(today_str)
-
-        # Format Question Status
-        q_count = stats['daily_q_count']
-        if q_count == 2:
-            q_status = "✅ Completed by both"
-        elif q_count == 1:
-            q_status = "⏳ Waiting for partner"
-        else:
-            q_status = "❌ Not started yet"
+            await bot.outbox.send(debug_channel, outbox.LOW, content=f"```\n{loop_watchdog.report()[:1900]}\n```")
+            loop_watchdog.reported_stalls = stalls
+        except Exception as e:
+            print(f"⚠️ Loop stall report error: {e}")
 
-        # --- D. BUILD EMBED ---
-        embed = discord.Embed(title="📊 Relationship Control Center", color=discord.Color.dark_teal())
-        
-        # Row 1: Clocks
-        embed.add_field(name="🇲🇾 Husband", value=f"**{time_husb}**", inline=True)
-        embed.add_field(name="🇿🇲 Wife", value=f"**{time_wife}**", inline=True)
-        
-        # Row 2: The Counters
-        embed.add_field(
-            name="⏳ Timeline", 
-            value=f"❤️ **{days_together}** Days Together\n💔 **{days_apart}** Days Apart", 
-            inline=False
-        )
-        
-        # Row 3: Action Items
-        action_text = (
-            f"🔥 **{stats['active_dares']}** Active Dares\n"
-            f"📜 **{stats['open_bounties']}** Open Bounties\n"
-            f"❓ Daily Question: **{q_status}**"
-        )
-        embed.add_field(name="⚡ Pending Actions", value=action_text, inline=False)
 
-        # Row 4: Buried Treasure
-        embed.add_field(
-            name="🏴‍☠️ Buried Treasure", 
-            value=f"🎙️ **{stats['buried_capsules']}** Audio Capsules Hidden", 
-            inline=False
-        )
-        
-        embed.set_footer(text=f"Auto-updates every 1 min • Last: {datetime.datetime.now(tz_husb).strftime('%H:%M')}")
+# =========================================
+# 12. LIVE DASHBOARD (The Stats Board)
+# =========================================
 
-        # --- E. EDIT OR SEND (Safely) ---
-        # We only try to read the last 5 messages to find the bot's own post
-        try:
-            history = [msg async for msg in channel.history(limit=5)]
-            last_bot_msg = None
-            for msg in history:
-                if msg.author == bot.user:
-                    last_bot_msg = msg
-                    break
-                    
-            if last_bot_msg:
-                await last_bot_msg.edit(content=None, embed=embed)
-            else:
-                await channel.send(embed=embed)
-        except Exception as e:
-            # If Discord 500s here, just skip this update
-            print(f"⚠️ Dashboard Discord Error: {e}")
-            pass
+live_dashboard = dashboard.LiveDashboard(bot)
 
-    except Exception as e:
-        print(f"⚠️ Dashboard Logic Error: {e}")
+@tasks.loop(minutes=dashboard.CLOCK_INTERVAL_MINUTES) 
+async def update_dashboard():
+    """Ticks the clocks. Counter changes push their own refreshes."""
+    await live_dashboard.refresh()
 
 
 # =========================================
@@ -1479,14 +1597,24 @@ class WatchPartyView(discord.ui.View):
             embed.color = discord.Color.green()
             await interaction.response.edit_message(embed=embed, view=None)
             
-            # The Countdown Animation
+            # The Countdown Animation (ticks timed against one deadline, latency-compensated)
             msg = interaction.message
-            for i in range(5, 0, -1):
-                await msg.channel.send(f"# {i}...")
-                await asyncio.sleep(1)
-            
-            await msg.channel.send("# ▶️ PLAY NOW!")
-            await msg.channel.send("Enjoy the movie! 🎬")
+            settings = getattr(config, "WATCH_COUNTDOWN", {})
+            engine = countdown.CountdownEngine(
+                msg.channel, bot.outbox,
+                seconds=settings.get("seconds", 5),
+                mode=settings.get("mode", "edit"),
+                latency_hint=bot.latency
+            )
+            await engine.run()
+            await bot.outbox.send(msg.channel, outbox.NORMAL, content="Enjoy the movie! 🎬")
+
+            # Drift report for tuning
+            report = engine.format_report()
+            print(report)
+            debug_channel = bot.get_channel(config.CHANNELS.get("debug_logs"))
+            if debug_channel:
+                await bot.outbox.send(debug_channel, outbox.LOW, content=report)
 
 @bot.command()
 async def watch(ctx, *, title="Mystery Movie"):
@@ -1524,30 +1652,62 @@ async def backup_database_job():
 
     print("⏳ Starting remote Postgres backup...")
     try:
-        filename = f"/tmp/backup_{timestamp}.dump"
-        
-        subprocess.run(f"pg_dump {db_url} -F c -f {filename}", shell=True, check=True)
-        
-        if os.path.exists(filename):
-            file = discord.File(filename, filename=f"heroku_backup_{timestamp}.dump")
-            
-            embed = discord.Embed(title="☁️ Cloud Database Backup", color=discord.Color.light_grey())
-            embed.add_field(name="Time", value=timestamp)
-            embed.set_footer(text="Restore using: pg_restore -d <db_url> <file>")
-            
-            await channel.send(embed=embed, file=file)
-            print("✅ Postgres backup uploaded successfully.")
-        else:
-            print("❌ Backup Failed: Dump file was not created.")
+        # Streams pg_dump into upload-sized parts + manifest; the loop stays responsive
+        manifest = await backup.full_backup(channel, db_url, f"heroku_backup_{timestamp}", bot.outbox)
+
+        embed = discord.Embed(title="☁️ Cloud Database Backup", color=discord.Color.light_grey())
+        embed.add_field(name="Time", value=timestamp)
+        embed.add_field(name="Size", value=f"{manifest['total_size'] / 1024 / 1024:.1f} MB in {len(manifest['parts'])} part(s)")
+        embed.add_field(name="Duration", value=f"{manifest['seconds']}s")
+        embed.set_footer(text="Restore: python backup.py reassemble <name>.manifest.json backup.dump, then pg_restore -d <db_url> backup.dump")
+
+        await bot.outbox.send(channel, outbox.LOW, embed=embed)
+        print(f"✅ Postgres backup uploaded ({manifest['total_size']} bytes, {manifest['seconds']}s).")
 
     except Exception as e:
         print(f"❌ Backup Error: {e}")
+        await bot.outbox.send(channel, outbox.LOW, content=f"❌ **Backup failed:** {e}")
 
-@bot.command()
-async def backup(ctx):
-    """Manually trigger a backup right now."""
-    await ctx.send("⏳ **Running manual cloud backup...**")
-    await backup_database_job()
+async def incremental_backup_job():
+    """Uploads only the rows changed since the last backup (falls back to a full dump)."""
+    channel = bot.get_channel(config.CHANNELS.get("database_backup"))
+    if not channel:
+        print("⚠️ Backup Failed: Channel not found.")
+        return
+
+    timestamp = datetime.datetime.now(ZoneInfo("Asia/Kuala_Lumpur")).strftime("%Y-%m-%d_%H-%M")
+    try:
+        manifest = await backup.incremental_backup(channel, f"delta_{timestamp}", bot.outbox)
+    except LookupError:
+        print("⚠️ No full backup to build on yet, taking a full one.")
+        await backup_database_job()
+        return
+    except Exception as e:
+        print(f"❌ Incremental Backup Error: {e}")
+        await bot.outbox.send(channel, outbox.LOW, content=f"❌ **Incremental backup failed:** {e}")
+        return
+
+    if manifest is None:
+        print("💤 Incremental backup: nothing changed.")
+        return
+
+    embed = discord.Embed(title="🧩 Incremental Backup", color=discord.Color.light_grey())
+    embed.add_field(name="Time", value=timestamp)
+    embed.add_field(name="Rows", value=str(manifest["rows"]))
+    embed.add_field(name="Size", value=f"{manifest['total_size'] / 1024:.1f} KB")
+    embed.set_footer(text="Restore: pg_restore the last full dump, then python backup.py replay <db_url> <deltas in order>")
+    await bot.outbox.send(channel, outbox.LOW, embed=embed)
+    print(f"✅ Incremental backup uploaded ({manifest['rows']} rows, {manifest['total_size']} bytes).")
+
+@bot.command(name="backup")
+async def backup_command(ctx, mode: str = "full"):
+    """Manually trigger a backup right now (`!backup` full dump, `!backup delta` changes only)."""
+    if mode.lower() in ("delta", "incremental"):
+        await ctx.send("⏳ **Running incremental backup...**")
+        await incremental_backup_job()
+    else:
+        await ctx.send("⏳ **Running manual cloud backup...**")
+        await backup_database_job()
     await ctx.send("✅ Done! Check the backup channel.")
 
 # =========================================
@@ -1589,7 +1749,7 @@ async def setup_start_menu():
             "• **What:** Random pings 3x/day. 15 mins to reply with a photo.\n"
             "• `!snap <caption>` → Reply to a challenge (attach photo). [⚡ SNAP CHALLENGE]\n"
             "• `!log <caption>` → Log a memory manually anytime. [📝 MANUAL LOG]\n"
-            "• `!flashback` → See a random photo from the past.\n\n"
+            "• `!flashback [today|stale|random]` → See a photo from the past.\n\n"
             
             "**#audio-capsule (Time Travel Voice Notes)**\n"
             "• **What:** Send voice notes for the future.\n"
@@ -1654,7 +1814,7 @@ async def setup_start_menu():
 
     embed.set_footer(text="System Online • Relationship OS v1.0")
     
-    await channel.send(embed=embed)
+    await bot.outbox.send(channel, outbox.NORMAL, embed=embed)
 
 
 # =========================================
@@ -1672,12 +1832,12 @@ async def trigger_random_dare():
 
     # Critical fix: Try to get dare, fallback if AI crashes/times out
     try:
-        task, price = await ai_manager.get_ai_dare()
+        task, price = await reservoir.take_dare()
     except Exception as e:
         print(f"⚠️ Scheduler AI Error: {e}")
         task, price = "Send a voice note singing a song of your choice.", 50
 
-    dare_id = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    dare_id = datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
     await database.create_dare(dare_id, 0, task, price) 
     
     embed = discord.Embed(
@@ -1688,7 +1848,7 @@ async def trigger_random_dare():
     embed.add_field(name="Reward", value=f"💰 {price} Us-Bucks")
     embed.set_footer(text=f"DARE: {dare_id} | 0 | 0 | {price}")
     
-    await channel.send(embed=embed, view=DarePendingView(dare_id, 0, price))
+    await bot.outbox.send(channel, outbox.NORMAL, embed=embed, view=DarePendingView(dare_id, 0, price))
 
 async def schedule_todays_snaps():
     """
@@ -1703,12 +1863,12 @@ async def schedule_todays_snaps():
     
     # CRITICAL FIX: Remove any existing snap jobs to prevent duplicates
     jobs_to_remove = []
-    for job in bot.scheduler.get_jobs():
+    for job in await bot.scheduler.get_jobs_async():
         if job.func == trigger_snap_for_user:
             jobs_to_remove.append(job.id)
     
     for job_id in jobs_to_remove:
-        bot.scheduler.remove_job(job_id)
+        await bot.scheduler.remove_job_async(job_id)
         print(f"   -> Cleared old snap job: {job_id}")
     
     for player in config.PLAYERS:
@@ -1737,113 +1897,248 @@ async def schedule_todays_snaps():
                 
                 # Only schedule if time is in the future
                 if run_time > now_local:
-                    bot.scheduler.add_job(
+                    await bot.scheduler.add_job_async(
                         trigger_snap_for_user, 
                         'date', 
                         run_date=run_time,
-                        args=[p_id]
+                        args=[p_id],
+                        misfire_grace_time=SNAP_GRACE
                     )
                     print(f"   -> Scheduled for {p_id} at {run_time.strftime('%H:%M')} ({p_tz_str})")
                     
         except Exception as e:
             print(f"❌ Error scheduling for {p_id}: {e}")
 
-@bot.event
-async def on_ready():
-    print(f'✅ Logged in as {bot.user}')
-    
-    # --- CRITICAL FIX: PREVENT DUPLICATE TASKS ON RECONNECT ---
-    # If the bot reconnects (common on Heroku), this prevents re-scheduling everything 50 times.
-    if hasattr(bot, 'tasks_initialized') and bot.tasks_initialized:
-        print("🔄 Reconnected (Skipping task setup)")
-        return
+def create_scheduler():
+    """
+    Scheduler backed by a Postgres job store (table: apscheduler_jobs).
+    Job-store I/O runs on the scheduler's worker thread (see scheduling.py).
+    """
+    jobstores = {
+        "default": SQLAlchemyJobStore(
+            url=database.sqlalchemy_url(),
+            engine_options={
+                "pool_pre_ping": True,
+                "pool_size": 1,
+                "connect_args": {"sslmode": database.DATABASE_SSLMODE, "connect_timeout": JOBSTORE_CONNECT_TIMEOUT},
+            }
+        )
+    }
+    job_defaults = {
+        "coalesce": True,           # Many missed runs of a recurring job -> run once
+        "misfire_grace_time": 3600,
+        "max_instances": 1,
+    }
+    return scheduling.OffLoopScheduler(jobstores=jobstores, job_defaults=job_defaults)
+
+async def ensure_job(job_id, func, trigger, **kwargs):
+    """
+    Adds a recurring job unless the store already has it with the same trigger.
+    Keeping the stored job keeps its next run time, so a run missed while the
+    dyno was down still fires (within its misfire grace time).
+    """
+    job = await bot.scheduler.get_job_async(job_id)
+    if job and job.func == func and str(job.trigger) == str(trigger):
+        return job
+    return await bot.scheduler.add_job_async(func, trigger, id=job_id, replace_existing=True, **kwargs)
 
-    # --- INITIALIZATION START ---
-    await database.init_db()
-    bot.add_view(ShopView())
-    bot.add_view(QuestionView(None))  # Persistent view for daily questions
-    bot.add_view(DarePendingView(None, None, None))  # Persistent view for dare challenges
-    bot.add_view(DareActiveView(None, None, None, None))  # Persistent view for active dares
-    bot.add_view(DareVerifyView(None, None, None, None))  # Persistent view for dare verification
-    bot.scheduler = AsyncIOScheduler()
-    
+async def register_daily_jobs():
+    """The daily game jobs. Also used by benchmarks/bench_scheduler.py to replay them on a virtual clock."""
     # 1. Daily Question (9 AM MYT)
-    bot.scheduler.add_job(
+    await ensure_job(
+        "daily_question",
         send_daily_question, 
-        'cron', 
-        hour=9, 
-        minute=0, 
-        timezone=ZoneInfo("Asia/Kuala_Lumpur")
+        CronTrigger(hour=9, minute=0, timezone=ZoneInfo("Asia/Kuala_Lumpur")),
+        misfire_grace_time=6 * 3600
     )
     
     # 2. Daily Random Dare (6 PM MYT)
-    bot.scheduler.add_job(
+    await ensure_job(
+        "random_dare",
         trigger_random_dare, 
-        'cron', 
-        hour=18, 
-        minute=0, 
-        timezone=ZoneInfo("Asia/Kuala_Lumpur")
+        CronTrigger(hour=18, minute=0, timezone=ZoneInfo("Asia/Kuala_Lumpur")),
+        misfire_grace_time=3 * 3600
     )
 
-    # 3. Multi-Snap Planner (BeReal) - Run once now, and schedule for future midnights
-    await schedule_todays_snaps()
-    bot.scheduler.add_job(
+    # 3. Multi-Snap Planner (BeReal) - Schedule for future midnights (and today, on first boot)
+    await ensure_job(
+        "snap_planner",
         schedule_todays_snaps, 
-        'cron', 
-        hour=0, 
-        minute=0, 
-        timezone=datetime.timezone.utc
+        CronTrigger(hour=0, minute=0, timezone=datetime.timezone.utc),
+        misfire_grace_time=12 * 3600
     )
 
-    # 4. Restore Pending Audio Capsules
+async def import_pending_capsules():
+    """
+    Schedules capsules saved before the job store was persistent.
+    Only runs against an empty job store - afterwards the store is the source of truth.
+    """
     pending_caps = await database.get_pending_capsules()
-    print(f"💾 Restoring {len(pending_caps)} pending Audio Capsules...")
+    print(f"💾 Importing {len(pending_caps)} pending Audio Capsules...")
     
     for cap in pending_caps:
-        c_id, sender_id, attachment_data, deliver_at_str = cap
+        c_id, sender_id, attachment_data, deliver_time = cap
         try:
-            deliver_time = datetime.datetime.strptime(deliver_at_str, "%Y-%m-%d %H:%M:%S")
-            deliver_time = deliver_time.replace(tzinfo=ZoneInfo("Asia/Kuala_Lumpur"))
-            
             now = datetime.datetime.now(ZoneInfo("Asia/Kuala_Lumpur"))
             
             # If missed, send in 10 seconds. If future, schedule normally.
             run_date = max(now + datetime.timedelta(seconds=10), deliver_time)
             
             print(f"   -> Capsule {c_id} restored for {run_date}")
-            bot.scheduler.add_job(
+            await bot.scheduler.add_job_async(
                 deliver_capsule_job, 
                 'date', 
                 run_date=run_date,
-                args=[c_id, sender_id, attachment_data, "Restored Delivery"]
+                args=[c_id, sender_id, attachment_data, "Restored Delivery"],
+                id=f"capsule_{c_id}",
+                replace_existing=True,
+                misfire_grace_time=CAPSULE_GRACE
             )
         except Exception as e:
             print(f"❌ Failed to restore capsule {c_id}: {e}")
 
+@bot.event
+async def on_ready():
+    print(f'✅ Logged in as {bot.user}')
+    
+    # --- CRITICAL FIX: PREVENT DUPLICATE TASKS ON RECONNECT ---
+    # If the bot reconnects (common on Heroku), this prevents re-scheduling everything 50 times.
+    if hasattr(bot, 'tasks_initialized') and bot.tasks_initialized:
+        print("🔄 Reconnected (Skipping task setup)")
+        return
+
+    # --- INITIALIZATION START ---
+    loop_watchdog.start()  # First, so a slow startup shows up too
+    await database.init_db()
+    bot.add_view(ShopView())
+    bot.add_view(QuestionView(None))  # Persistent view for daily questions
+    bot.add_view(DarePendingView(None, None, None))  # Persistent view for dare challenges
+    bot.add_view(DareActiveView(None, None, None, None))  # Persistent view for active dares
+    bot.add_view(DareVerifyView(None, None, None, None))  # Persistent view for dare verification
+    bot.add_view(BountyView())  # Bounty buttons look their state up by message ID
+    bot.add_view(InProgressView())
+    bot.add_view(ApprovalView())
+
+    # Jobs live in Postgres, so reminders, snaps and capsules survive dyno restarts.
+    # Starting first loads the stored jobs; missed runs fire within their grace time.
+    bot.scheduler = create_scheduler()
+    await bot.scheduler.start_async()
+    first_boot = not await bot.scheduler.get_jobs_async()
+    
+    # 1-3. Daily question, random dare and snap planner
+    await register_daily_jobs()
+
+    if first_boot:
+        await schedule_todays_snaps()
+        # 4. One-time import of capsules scheduled before jobs were persisted
+        await import_pending_capsules()
+
     # 5. Start Dashboard Loop
     if not update_dashboard.is_running():
         update_dashboard.start()
         print("📊 Dashboard Loop Started")
 
-    # 6. Auto-Backup (Every 12 Hours)
-    bot.scheduler.add_job(
+    if not prefetch_attachments.is_running():
+        prefetch_attachments.start()
+
+    if not report_loop_stalls.is_running():
+        report_loop_stalls.start()
+
+    # 6. Auto-Backup (Changes every 12 hours, full dump weekly on Sunday 4 AM MYT)
+    await ensure_job(
+        "backup_incremental",
+        incremental_backup_job, 
+        IntervalTrigger(hours=12, timezone=ZoneInfo("Asia/Kuala_Lumpur"))
+    )
+    await ensure_job(
+        "backup",
         backup_database_job, 
-        'interval', 
-        hours=12,
-        timezone=ZoneInfo("Asia/Kuala_Lumpur")
+        CronTrigger(day_of_week='sun', hour=4, minute=0, timezone=ZoneInfo("Asia/Kuala_Lumpur"))
+    )
+
+    # 7. AI Reservoir Refill (Off-peak: 3 AM & 3 PM MYT, plus once now)
+    await ensure_job(
+        "reservoir_refill",
+        reservoir.refill, 
+        CronTrigger(hour='3,15', minute=0, timezone=ZoneInfo("Asia/Kuala_Lumpur"))
     )
+    bot.reservoir_refill = asyncio.create_task(reservoir.refill())
 
-    # 7. Setup Start Menu
+    # 8. Setup Start Menu
     await setup_start_menu()
-    
-    bot.scheduler.start()
+
+    # 9. Local /metrics endpoint (only when METRICS_PORT is set)
+    try:
+        bot.metrics_server = await metrics.start_server()
+    except OSError as e:
+        print(f"⚠️ Metrics endpoint not started: {e}")
     
     # Mark tasks as initialized so we don't do this again until a hard restart
     bot.tasks_initialized = True
     
     debug_channel = bot.get_channel(config.CHANNELS.get("debug_logs"))
     if debug_channel:
-        await debug_channel.send(f"🤖 **EchoBot REBOOTED** | Anti-Spam Active | Heartbeat Secured")
+        await bot.outbox.send(debug_channel, outbox.LOW, content=f"🤖 **EchoBot REBOOTED** | Anti-Spam Active | Heartbeat Secured")
+
+@bot.command(name="outbox")
+async def outbox_stats(ctx):
+    """Shows outbound queue depth, wait times and coalesced edits."""
+    await ctx.send(f"```\n{bot.outbox.summary()}\n```")
+
+@bot.command(name="metrics")
+async def metrics_summary(ctx):
+    """Posts command/button/DB/AI latencies and error counts to #debug-logs."""
+    debug_channel = bot.get_channel(config.CHANNELS.get("debug_logs"))
+    if not debug_channel:
+        await ctx.send("❌ Error: Debug channel not set.")
+        return
+    await bot.outbox.send(debug_channel, outbox.LOW, content=f"```\n{metrics.REGISTRY.summary()}\n```")
+    if ctx.channel.id != debug_channel.id:
+        await ctx.send(f"📈 Metrics posted in {debug_channel.mention}.", delete_after=5)
+
+@bot.command(name="lag")
+async def loop_lag(ctx):
+    """Posts event-loop lag percentiles and the worst blocking calls to #debug-logs."""
+    debug_channel = bot.get_channel(config.CHANNELS.get("debug_logs"))
+    if not debug_channel:
+        await ctx.send("❌ Error: Debug channel not set.")
+        return
+    await bot.outbox.send(debug_channel, outbox.LOW, content=f"```\n{loop_watchdog.report()[:1900]}\n```")
+    if ctx.channel.id != debug_channel.id:
+        await ctx.send(f"🐢 Lag report posted in {debug_channel.mention}.", delete_after=5)
+
+@bot.command(name="profile")
+@commands.is_owner()
+async def profile_command(ctx, seconds: int = 30):
+    """Owner only: samples where the bot spends its time for N seconds and posts a flamegraph to #debug-logs."""
+    debug_channel = bot.get_channel(config.CHANNELS.get("debug_logs"))
+    if not debug_channel:
+        await ctx.send("❌ Error: Debug channel not set.")
+        return
+
+    seconds = max(1, min(seconds, profiler.MAX_SECONDS))
+    await ctx.send(f"🔬 Profiling for {seconds}s...", delete_after=seconds + 5)
+    session = profiler.SamplingProfiler()
+    try:
+        await session.run(seconds)
+    except RuntimeError as e:
+        await ctx.send(f"⏳ Not started: {e}.")
+        return
+
+    stamp = datetime.datetime.now(ZoneInfo("Asia/Kuala_Lumpur")).strftime("%Y%m%d-%H%M%S")
+    speedscope_file = discord.File(io.BytesIO(session.speedscope()), filename=f"profile-{stamp}.speedscope.json")
+    await bot.outbox.send(
+        debug_channel, outbox.LOW,
+        content=f"```\n{session.summary()[:1900]}\n```\nOpen the file at https://www.speedscope.app",
+        file=speedscope_file
+    )
+    if ctx.channel.id != debug_channel.id:
+        await ctx.send(f"🔬 Profile posted in {debug_channel.mention}.", delete_after=5)
+
+@bot.command(name="cache")
+async def cache_stats(ctx):
+    """Shows the wallet balance cache hit rate."""
+    await ctx.send(f"```\n{database.balance_cache.summary()}\n```")
 
 @bot.command()
 async def test_q(ctx):
@@ -1863,9 +2158,24 @@ async def test_snap(ctx):
 @bot.command()
 async def update(ctx):
     """Forces the dashboard to update immediately."""
-    await update_dashboard()
+    await live_dashboard.refresh(force=True)
     await ctx.send("✅ Dashboard updated!", delete_after=3)
 
+async def run_bot():
+    """What bot.run() does, plus closing the capsule store's HTTP session on the bot's loop."""
+    try:
+        async with bot:
+            await bot.start(TOKEN)
+    finally:
+        if capsules:
+            await capsules.close()
+
 if __name__ == "__main__":
     if TOKEN:
-        bot.run(TOKEN)
\ No newline at end of file
+        discord.utils.setup_logging()  # bot.run() would set this up
+        try:
+            asyncio.run(run_bot())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            database.close_pool()
\ No newline at end of file
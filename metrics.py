@@ -0,0 +1,277 @@
+import os
+import time
+import inspect
+import functools
+from collections import Counter
+from contextlib import contextmanager
+import discord
+from aiohttp import web
+
+# Latency buckets in seconds (upper bounds; +Inf is implied)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Rows in the #debug-logs summary
+SUMMARY_TOP = 15
+# discord.py internals instrument_bot wraps, with the leading parameters the wrappers rely on
+WRAPPED_INTERNALS = (
+    ("View", "_scheduled_task", ("self", "item", "interaction")),
+    ("View", "on_error", ("self", "interaction", "error", "item")),
+    ("Modal", "_scheduled_task", ("self", "interaction")),
+    ("Modal", "on_error", ("self", "interaction", "error")),
+)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram, as Prometheus expects it."""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)   # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.sum += seconds
+        self.count += 1
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def quantile(self, q):
+        """Estimate from the buckets (linear within a bucket, like histogram_quantile)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, bound in enumerate(BUCKETS):
+            if seen + self.counts[i] >= rank:
+                inside = (rank - seen) / self.counts[i] if self.counts[i] else 0
+                return lower + (bound - lower) * inside
+            seen += self.counts[i]
+            lower = bound
+        return BUCKETS[-1]   # Somewhere above the last bound
+
+
+class Registry:
+    """
+    Latency histograms and error counters keyed by (kind, name), e.g.
+    ("db", "get_balance") or ("command", "get"). Everything is recorded on
+    the event loop thread, so no locking is needed.
+    """
+
+    def __init__(self):
+        self.latency = {}          # (kind, name) -> Histogram
+        self.errors = Counter()    # (kind, name) -> failed calls
+        self.started = time.time()
+
+    def observe(self, kind, name, seconds, error=False):
+        key = (kind, name)
+        histogram = self.latency.get(key)
+        if histogram is None:
+            histogram = self.latency[key] = Histogram()
+        histogram.observe(seconds)
+        if error:
+            self.errors[key] += 1
+
+    def error(self, kind, name):
+        self.errors[(kind, name)] += 1
+
+    # ==========================================
+    # EXPOSITION (Prometheus text format)
+    # ==========================================
+    def render(self):
+        lines = [
+            "# HELP bot_call_duration_seconds Latency of bot commands, view callbacks, DB and AI calls.",
+            "# TYPE bot_call_duration_seconds histogram",
+        ]
+        for (kind, name), h in sorted(self.latency.items()):
+            labels = f'kind="{kind}",name="{_escape(name)}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS, h.counts):
+                cumulative += count
+                lines.append(f'bot_call_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'bot_call_duration_seconds_bucket{{{labels},le="+Inf"}} {h.count}')
+            lines.append(f"bot_call_duration_seconds_sum{{{labels}}} {h.sum:.6f}")
+            lines.append(f"bot_call_duration_seconds_count{{{labels}}} {h.count}")
+
+        lines.append("# HELP bot_call_errors_total Calls that raised (or reported) an error.")
+        lines.append("# TYPE bot_call_errors_total counter")
+        for (kind, name), count in sorted(self.errors.items()):
+            lines.append(f'bot_call_errors_total{{kind="{kind}",name="{_escape(name)}"}} {count}')
+
+        lines.append("# HELP bot_uptime_seconds Seconds since the metrics registry was created.")
+        lines.append("# TYPE bot_uptime_seconds gauge")
+        lines.append(f"bot_uptime_seconds {time.time() - self.started:.0f}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, top=SUMMARY_TOP):
+        """Busiest calls by total time, for #debug-logs."""
+        if not self.latency:
+            return "📈 No calls recorded yet."
+        ranked = sorted(self.latency.items(), key=lambda item: item[1].sum, reverse=True)[:top]
+        lines = [f"📈 Metrics ({(time.time() - self.started) / 3600:.1f}h, top {len(ranked)} by total time)"]
+        lines.append(f"{'call':<32} {'count':>6} {'p50':>8} {'p99':>8} {'total':>8} {'err':>4}")
+        for (kind, name), h in ranked:
+            label = f"{kind}:{name}"[:32]
+            lines.append(
+                f"{label:<32} {h.count:>6} {_ms(h.quantile(0.5)):>8} {_ms(h.quantile(0.99)):>8} "
+                f"{h.sum:>7.1f}s {self.errors[(kind, name)]:>4}"
+            )
+        failing = sum(self.errors.values())
+        if failing:
+            lines.append(f"⚠️ {failing} failed calls in total")
+        return "\n".join(lines)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _ms(seconds):
+    return f"{seconds * 1000:.0f}ms" if seconds < 10 else f"{seconds:.0f}s"
+
+
+REGISTRY = Registry()
+
+
+# ==========================================
+# INSTRUMENTATION
+# ==========================================
+def timed(kind, name=None):
+    """Decorator for coroutines: records latency, and an error if it raises."""
+    def wrap(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except BaseException:
+                REGISTRY.observe(kind, label, time.perf_counter() - started, error=True)
+                raise
+            REGISTRY.observe(kind, label, time.perf_counter() - started)
+            return result
+        return wrapper
+    return wrap
+
+
+@contextmanager
+def timer(kind, name):
+    """Records the latency of the enclosed block (and an error if it raises)."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        REGISTRY.observe(kind, name, time.perf_counter() - started, error=True)
+        raise
+    REGISTRY.observe(kind, name, time.perf_counter() - started)
+
+
+def instrument_bot(bot):
+    """
+    Times every command (through the command events) and every View / Modal
+    callback. discord.py has no public hook around component callbacks, so
+    the dispatch coroutine and on_error of View and Modal are wrapped once, here
+    - unless this discord.py no longer has them as expected, in which case only
+    commands are timed and buttons keep working untouched.
+    """
+    async def on_command(ctx):
+        ctx.metrics_started = time.perf_counter()
+
+    async def on_command_completion(ctx):
+        _record_command(ctx, error=False)
+
+    async def on_command_error(ctx, error):
+        _record_command(ctx, error=True)
+
+    bot.add_listener(on_command)
+    bot.add_listener(on_command_completion)
+    bot.add_listener(on_command_error)
+
+    if getattr(discord.ui.View, "_metrics_wrapped", False):
+        return
+    problem = _check_internals()
+    if problem:
+        print(f"⚠️ Metrics: buttons/modals not timed, discord.py {discord.__version__} {problem}")
+        return
+
+    view_task, view_on_error = discord.ui.View._scheduled_task, discord.ui.View.on_error
+    modal_task, modal_on_error = discord.ui.Modal._scheduled_task, discord.ui.Modal.on_error
+
+    async def timed_view_task(view, item, interaction, *args):
+        with timer("view", _item_label(view, item)):
+            await view_task(view, item, interaction, *args)
+
+    async def timed_modal_task(modal, interaction, *args):
+        with timer("view", type(modal).__name__):
+            await modal_task(modal, interaction, *args)
+
+    # Callback exceptions never reach the dispatch coroutine (discord.py hands them to on_error)
+    async def counted_view_error(view, interaction, error, item, *args):
+        REGISTRY.error("view", _item_label(view, item))
+        await view_on_error(view, interaction, error, item, *args)
+
+    async def counted_modal_error(modal, interaction, error, *args):
+        REGISTRY.error("view", type(modal).__name__)
+        await modal_on_error(modal, interaction, error, *args)
+
+    discord.ui.View._scheduled_task = timed_view_task
+    discord.ui.View.on_error = counted_view_error
+    discord.ui.Modal._scheduled_task = timed_modal_task
+    discord.ui.Modal.on_error = counted_modal_error
+    discord.ui.View._metrics_wrapped = True
+
+
+def _check_internals():
+    """None if every method in WRAPPED_INTERNALS is a coroutine with the expected parameters, else what's wrong."""
+    for class_name, method, params in WRAPPED_INTERNALS:
+        func = getattr(getattr(discord.ui, class_name, None), method, None)
+        if func is None or not inspect.iscoroutinefunction(func):
+            return f"has no coroutine {class_name}.{method}"
+        try:
+            actual = tuple(inspect.signature(func).parameters)
+        except (TypeError, ValueError):
+            return f"hides the signature of {class_name}.{method}"
+        if actual[:len(params)] != params:
+            return f"changed {class_name}.{method}{params} to {actual}"
+    return None
+
+
+def _item_label(view, item):
+    return f"{type(view).__name__}.{getattr(item, 'custom_id', None) or getattr(item, 'label', None) or type(item).__name__}"
+
+
+def _record_command(ctx, error):
+    started = getattr(ctx, "metrics_started", None)
+    if started is None or ctx.command is None:
+        return   # Unknown command or failed a check before it started
+    REGISTRY.observe("command", ctx.command.qualified_name, time.perf_counter() - started, error=error)
+
+
+# ==========================================
+# HTTP ENDPOINT (/metrics)
+# ==========================================
+async def start_server(host=None, port=None):
+    """
+    Serves REGISTRY at http://host:port/metrics. Port comes from METRICS_PORT;
+    without one nothing is started (returns None). Binds to localhost unless
+    METRICS_HOST says otherwise.
+    """
+    port = port or os.getenv("METRICS_PORT")
+    if not port:
+        return None
+    host = host or os.getenv("METRICS_HOST", "127.0.0.1")
+
+    async def handle(request):
+        return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, int(port)).start()
+    print(f"📈 Metrics served on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,168 @@
+import time
+import heapq
+import asyncio
+import itertools
+from collections import Counter
+
+# Priority classes (lower goes first)
+URGENT = 0   # Watch party countdown
+HIGH = 1     # Reminders, capsule deliveries
+NORMAL = 2   # Polls, posts
+LOW = 3      # Dashboard refreshes
+PRIORITY_NAMES = {URGENT: "urgent", HIGH: "high", NORMAL: "normal", LOW: "low"}
+
+# Per-channel budget: Discord allows roughly 5 messages per 5 seconds per channel
+BUCKET_CAPACITY = 5
+BUCKET_REFILL_PER_SECOND = 1.0
+
+
+class TokenBucket:
+    def __init__(self, capacity=BUCKET_CAPACITY, rate=BUCKET_REFILL_PER_SECOND):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Takes a token and returns 0, or returns how long to wait for the next one."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class _Job:
+    __slots__ = ("priority", "seq", "enqueued", "factory", "future", "key")
+
+    def __init__(self, priority, seq, factory, future, key=None):
+        self.priority = priority
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.factory = factory
+        self.future = future
+        self.key = key
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class Outbox:
+    """
+    Central queue for outbound channel traffic. Every channel gets a token
+    bucket and a priority heap drained by its own short-lived worker, so a
+    burst in one channel never delays another and urgent messages overtake
+    routine ones. Queued edits to the same message collapse into the last one.
+    Interaction responses don't go through here (they have their own 3s deadline).
+    """
+
+    def __init__(self):
+        self._queues = {}         # channel_id -> heap of _Job
+        self._buckets = {}        # channel_id -> TokenBucket
+        self._workers = {}        # channel_id -> Task
+        self._pending_edits = {}  # message_id -> queued _Job
+        self._seq = itertools.count()
+
+        self.counters = Counter()  # sent / failed / coalesced
+        self.max_depth = 0
+        self.waits = {name: {"count": 0, "total": 0.0, "max": 0.0} for name in PRIORITY_NAMES.values()}
+
+    # ==========================================
+    # 1. ENQUEUE (Awaitable like the discord.py call they replace)
+    # ==========================================
+    def send(self, channel, priority=NORMAL, **kwargs):
+        """Queues channel.send(**kwargs); await it for the sent Message."""
+        return self._submit(channel.id, priority, lambda: channel.send(**kwargs))
+
+    def edit(self, message, priority=LOW, **kwargs):
+        """Queues message.edit(**kwargs). A still-queued edit of the same message is replaced."""
+        job = self._pending_edits.get(message.id)
+        if job and not job.future.done():
+            job.factory = lambda: message.edit(**kwargs)
+            if priority < job.priority:
+                job.priority = priority
+                heapq.heapify(self._queues[message.channel.id])
+            self.counters["coalesced"] += 1
+            return job.future
+        return self._submit(message.channel.id, priority, lambda: message.edit(**kwargs), key=message.id)
+
+    def add_reaction(self, message, emoji, priority=NORMAL):
+        return self._submit(message.channel.id, priority, lambda: message.add_reaction(emoji))
+
+    def delete(self, message, priority=NORMAL):
+        return self._submit(message.channel.id, priority, lambda: message.delete())
+
+    def _submit(self, channel_id, priority, factory, key=None):
+        future = asyncio.get_running_loop().create_future()
+        job = _Job(priority, next(self._seq), factory, future, key)
+        if key is not None:
+            self._pending_edits[key] = job
+
+        queue = self._queues.setdefault(channel_id, [])
+        heapq.heappush(queue, job)
+        self.max_depth = max(self.max_depth, len(queue))
+
+        if channel_id not in self._workers:
+            self._workers[channel_id] = asyncio.create_task(self._drain(channel_id))
+        return future
+
+    # ==========================================
+    # 2. WORKER (One per busy channel)
+    # ==========================================
+    async def _drain(self, channel_id):
+        queue = self._queues[channel_id]
+        bucket = self._buckets.setdefault(channel_id, TokenBucket())
+        try:
+            while queue:
+                delay = bucket.take()
+                if delay:
+                    # Re-check the heap afterwards: something more urgent may have arrived
+                    await asyncio.sleep(delay)
+                    continue
+
+                job = heapq.heappop(queue)
+                if job.key is not None and self._pending_edits.get(job.key) is job:
+                    del self._pending_edits[job.key]
+                if job.future.done():
+                    continue  # Caller gave up (cancelled)
+
+                self._record_wait(job)
+                try:
+                    result = await job.factory()
+                except Exception as e:
+                    self.counters["failed"] += 1
+                    job.future.set_exception(e)
+                    job.future.exception()  # Don't warn if the caller didn't await it
+                else:
+                    self.counters["sent"] += 1
+                    job.future.set_result(result)
+        finally:
+            del self._workers[channel_id]
+            if not queue:
+                del self._queues[channel_id]
+
+    def _record_wait(self, job):
+        waited = time.monotonic() - job.enqueued
+        stats = self.waits[PRIORITY_NAMES[job.priority]]
+        stats["count"] += 1
+        stats["total"] += waited
+        stats["max"] = max(stats["max"], waited)
+
+    # ==========================================
+    # 3. METRICS
+    # ==========================================
+    def depth(self):
+        return sum(len(q) for q in self._queues.values())
+
+    def summary(self):
+        lines = [
+            f"📬 Outbox: {self.counters['sent']} sent, {self.counters['failed']} failed, "
+            f"{self.counters['coalesced']} edits coalesced | queued now {self.depth()}, peak {self.max_depth}"
+        ]
+        for name, stats in self.waits.items():
+            if stats["count"]:
+                avg = stats["total"] / stats["count"] * 1000
+                lines.append(f"  {name:<6} {stats['count']:>5} jobs | wait avg {avg:.0f} ms, max {stats['max'] * 1000:.0f} ms")
+        return "\n".join(lines)
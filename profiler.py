@@ -0,0 +1,242 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+import inspect
+import functools
+from collections import Counter, defaultdict
+
+# Wall-clock sampling period (seconds)
+SAMPLE_INTERVAL = 0.01
+# Longest profile the command accepts
+MAX_SECONDS = 300
+MAX_DEPTH = 96
+SUMMARY_TOP = 8
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Instrumentation wrappers, not bot code: never blamed in the summary
+NOT_PROFILED = ("metrics.py", "loop_monitor.py", "profiler.py")
+
+_active = threading.Lock()   # One profile at a time
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler that understands asyncio. A background thread
+    samples every SAMPLE_INTERVAL:
+      - every thread's stack (the event loop, the DB pool, ...), and
+      - every suspended task's await chain, which a thread sampler can't see,
+    so time spent waiting on the database or Gemini shows up as well as time
+    spent running. Results are a speedscope file and a top-N text summary.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.frames = {}                   # (file, name, line) -> index in the speedscope frame table
+        self.lanes = defaultdict(Counter)  # lane -> {stack (frame indexes): seconds}
+        self.coroutines = defaultdict(lambda: {"running": 0.0, "awaiting": 0.0})
+        self.functions = defaultdict(lambda: {"total": 0.0, "self": 0.0})
+        self.samples = 0
+        self.loop_busy = 0.0
+        self.loop_idle = 0.0
+        self.overhead = 0.0
+        self.wall = 0.0
+        self._stop = threading.Event()
+
+    # ==========================================
+    # 1. RUN (From the event loop)
+    # ==========================================
+    async def run(self, seconds):
+        """Samples for `seconds`. Raises RuntimeError if another profile is running."""
+        if not _active.acquire(blocking=False):
+            raise RuntimeError("a profile is already running")
+        try:
+            self._loop = asyncio.get_running_loop()
+            self._loop_thread = threading.get_ident()
+            self._own_task = asyncio.current_task()   # Just sleeps for the whole profile
+            sampler = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+            started = time.perf_counter()
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                self._stop.set()
+                await asyncio.to_thread(sampler.join)
+            self.wall = time.perf_counter() - started
+        finally:
+            _active.release()
+
+    def _sample_loop(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            self._sample(now - last)   # Weighted by the real gap, so a late sample still counts its time
+            last = now
+            self.overhead += time.perf_counter() - now
+
+    # ==========================================
+    # 2. SAMPLING (Profiler thread)
+    # ==========================================
+    def _sample(self, weight):
+        self.samples += 1
+        names = {t.ident: t.name for t in threading.enumerate()}
+        running = asyncio.current_task(self._loop)
+
+        for ident, frame in sys._current_frames().items():
+            if ident == threading.get_ident():
+                continue
+            stack = _thread_stack(frame)
+            if ident == self._loop_thread:
+                lane = "event loop"
+                if stack and os.path.basename(stack[-1][0]) == "selectors.py":
+                    self.loop_idle += weight
+                    self._add(lane, stack, weight)
+                    continue
+                self.loop_busy += weight
+                owner = _running_coroutine(frame)
+                if owner:
+                    self.coroutines[owner]["running"] += weight
+            else:
+                lane = f"thread: {names.get(ident, ident)}".rstrip("0123456789_")
+            self._add(lane, stack, weight)
+            self._count_functions(stack, weight)
+
+        try:
+            tasks = asyncio.all_tasks(self._loop)
+        except RuntimeError:
+            return   # Task set changed mid-copy; skip this round
+        for task in tasks:
+            if task is running or task is self._own_task:
+                continue
+            chain, awaited = _await_chain(task.get_coro())
+            if not chain:
+                continue
+            owner = _innermost_profiled(chain)
+            if owner:
+                self.coroutines[owner]["awaiting"] += weight
+            self._add("awaiting tasks", chain + [("", awaited, 0)], weight)
+
+    def _add(self, lane, stack, weight):
+        key = tuple(self.frames.setdefault(frame, len(self.frames)) for frame in stack)
+        self.lanes[lane][key] += weight
+
+    def _count_functions(self, stack, weight):
+        seen = set()
+        for frame in stack:
+            if frame[1] == "<module>":
+                continue   # The import-time frame sits under everything (bot.run is called from it)
+            if _is_profiled(frame[0]) and frame not in seen:
+                seen.add(frame)
+                self.functions[_label(frame)]["total"] += weight
+        innermost = _innermost_profiled(stack)
+        if innermost and not innermost.endswith(":<module>"):
+            self.functions[innermost]["self"] += weight
+
+    # ==========================================
+    # 3. OUTPUT
+    # ==========================================
+    def speedscope(self, name="EchoBot"):
+        """The profile as a speedscope file (https://www.speedscope.app), one profile per lane."""
+        profiles = []
+        for lane, stacks in sorted(self.lanes.items()):
+            weights = [round(seconds * 1000, 3) for seconds in stacks.values()]
+            profiles.append({
+                "type": "sampled",
+                "name": lane,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(sum(weights), 3),
+                "samples": [list(stack) for stack in stacks],
+                "weights": weights,
+            })
+        frames = [
+            {"name": f"{fn} ({os.path.basename(file)})" if file else fn, "file": file, "line": line}
+            for file, fn, line in self.frames
+        ]
+        return json.dumps({
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "profiler.py",
+            "activeProfileIndex": next((i for i, p in enumerate(profiles) if p["name"] == "event loop"), 0),
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }).encode()
+
+    def summary(self, top=SUMMARY_TOP):
+        loop_total = (self.loop_busy + self.loop_idle) or 1
+        lines = [
+            f"🔬 Profile: {self.wall:.1f}s wall, {self.samples} samples every {self.interval * 1000:.0f} ms "
+            f"(sampler overhead {100 * self.overhead / (self.wall or 1):.1f}%)",
+            f"Event loop busy {100 * self.loop_busy / loop_total:.0f}% | idle {100 * self.loop_idle / loop_total:.0f}%",
+            "",
+            f"{'coroutine (bot code)':<40} {'running':>8} {'awaiting':>9}",
+        ]
+        ranked = sorted(self.coroutines.items(), key=lambda item: item[1]["running"] + item[1]["awaiting"], reverse=True)
+        for label, t in ranked[:top]:
+            lines.append(f"{label[:40]:<40} {t['running']:>7.2f}s {t['awaiting']:>8.2f}s")
+
+        lines += ["", f"{'function (bot code, all threads)':<40} {'total':>8} {'self':>9}"]
+        ranked = sorted(self.functions.items(), key=lambda item: item[1]["total"], reverse=True)
+        for label, t in ranked[:top]:
+            lines.append(f"{label[:40]:<40} {t['total']:>7.2f}s {t['self']:>8.2f}s")
+        return "\n".join(lines)
+
+
+# ==========================================
+# HELPERS
+# ==========================================
+def _frame_key(code):
+    return (code.co_filename, getattr(code, "co_qualname", code.co_name), code.co_firstlineno)
+
+
+def _thread_stack(frame):
+    """Root-first list of frame keys."""
+    stack = []
+    while frame is not None and len(stack) < MAX_DEPTH:
+        stack.append(_frame_key(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _await_chain(coro):
+    """Frame keys of a suspended task from its outer coroutine inwards, and what the innermost one awaits."""
+    chain = []
+    while coro is not None and len(chain) < MAX_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        # The coroutine's own qualname: @functools.wraps wrappers report the wrapped function
+        chain.append((frame.f_code.co_filename, getattr(coro, "__qualname__", frame.f_code.co_name), frame.f_code.co_firstlineno))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return chain, f"⏳ {type(coro).__name__}" if coro is not None else "⏳ (scheduled)"
+
+
+def _running_coroutine(frame):
+    """Innermost bot-code coroutine on a running thread stack."""
+    while frame is not None:
+        code = frame.f_code
+        if code.co_flags & inspect.CO_COROUTINE and _is_profiled(code.co_filename):
+            return _label(_frame_key(code))
+        frame = frame.f_back
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def _is_profiled(filename):
+    """Bot modules (top level of the project), minus the instrumentation."""
+    path = os.path.abspath(filename)
+    return os.path.dirname(path) == PROJECT_DIR and os.path.basename(path) not in NOT_PROFILED
+
+
+def _innermost_profiled(stack):
+    for frame in reversed(stack):
+        if _is_profiled(frame[0]):
+            return _label(frame)
+    return None
+
+
+def _label(frame):
+    return f"{os.path.basename(frame[0])}:{frame[1]}"
@@ -0,0 +1,74 @@
+import asyncio
+import random
+import ai_manager
+import database
+
+# How many ready-to-post items to keep in Postgres
+QUESTIONS_PER_THEME = 2
+DARES_IN_STOCK = 5
+
+_refill_lock = asyncio.Lock()
+
+# ==========================================
+# 1. REFILLER (Runs off-peak from the scheduler)
+# ==========================================
+async def refill():
+    """
+    Tops up the question buffer for every theme and the dare buffer.
+    Model failures are skipped, never stored - the next refill tries again.
+    """
+    if _refill_lock.locked():
+        return
+
+    async with _refill_lock:
+        levels = await database.get_reservoir_levels()
+        added = 0
+
+        for theme in ai_manager.QUESTION_THEMES:
+            missing = QUESTIONS_PER_THEME - levels.get(("question", theme), 0)
+            for _ in range(max(missing, 0)):
+                try:
+                    question = await ai_manager.generate_question(theme)
+                except Exception as e:
+                    print(f"⚠️ Reservoir: question generation failed ({e})")
+                    break
+                await database.add_reservoir_item("question", theme, question)
+                added += 1
+
+        missing = DARES_IN_STOCK - levels.get(("dare", None), 0)
+        for _ in range(max(missing, 0)):
+            try:
+                task, price = await ai_manager.generate_dare()
+            except Exception as e:
+                print(f"⚠️ Reservoir: dare generation failed ({e})")
+                break
+            await database.add_reservoir_item("dare", None, task, price)
+            added += 1
+
+        print(f"🧺 Reservoir refilled (+{added} items)")
+
+# ==========================================
+# 2. CONSUMERS (Instant, no model call)
+# ==========================================
+async def take_question():
+    """
+    Returns a ready question, keeping the random theme rotation.
+    Falls back to another theme, then to a live model call (which has its own fallback).
+    """
+    row = await database.take_reservoir_item("question", random.choice(ai_manager.QUESTION_THEMES))
+    if not row:
+        row = await database.take_reservoir_item("question")
+    if row:
+        return row[1]
+
+    print("⚠️ Reservoir empty: asking Gemini live for a question")
+    return await ai_manager.get_ai_question()
+
+async def take_dare():
+    """Returns a ready (task, price) dare, or asks the model live if the buffer is empty."""
+    row = await database.take_reservoir_item("dare")
+    if row:
+        return row[1], row[2]
+
+    print("⚠️ Reservoir empty: asking Gemini live for a dare")
+    return await ai_manager.get_ai_dare()
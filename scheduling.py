@@ -0,0 +1,88 @@
+import sys
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from apscheduler.schedulers.base import STATE_STOPPED
+from apscheduler.schedulers.asyncio import AsyncIOScheduler, run_in_event_loop
+from apscheduler.executors.asyncio import AsyncIOExecutor
+from apscheduler.executors.base import run_coroutine_job, run_job
+from apscheduler.util import iscoroutinefunction_partial
+
+
+class LoopExecutor(AsyncIOExecutor):
+    """
+    Runs jobs on the event loop like AsyncIOExecutor, but may be handed them
+    from the scheduler's worker thread (create_task is not thread-safe).
+    """
+
+    def _do_submit_job(self, job, run_times):
+        def callback(f):
+            self._pending_futures.discard(f)
+            try:
+                events = f.result()
+            except BaseException:
+                self._run_job_error(job.id, *sys.exc_info()[1:])
+            else:
+                self._run_job_success(job.id, events)
+
+        if iscoroutinefunction_partial(job.func):
+            coro = run_coroutine_job(job, job._jobstore_alias, run_times, self._logger.name)
+        else:
+            coro = asyncio.to_thread(run_job, job, job._jobstore_alias, run_times, self._logger.name)
+        f = asyncio.run_coroutine_threadsafe(coro, self._eventloop)
+        f.add_done_callback(callback)
+        self._pending_futures.add(f)
+
+
+class OffLoopScheduler(AsyncIOScheduler):
+    """
+    AsyncIOScheduler that keeps job-store I/O off the event loop. The job store
+    is synchronous (SQLAlchemy): every wakeup reads the due jobs and writes their
+    next run times. Here that runs on one worker thread, and the bot's own
+    add/get/remove calls go through the same thread via the *_async methods,
+    so a slow or unreachable Postgres delays jobs instead of freezing the gateway.
+    Jobs themselves still run as coroutines on the loop.
+    """
+
+    def _configure(self, config):
+        super()._configure(config)
+        self._store_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scheduler")
+        self.last_wakeup = None   # Future of the latest due-job pass (the replay benchmark waits on it)
+
+    def _create_default_executor(self):
+        return LoopExecutor()
+
+    @run_in_event_loop
+    def wakeup(self):
+        self._stop_timer()
+        self.last_wakeup = self._eventloop.run_in_executor(self._store_thread, self._process_jobs)
+        self.last_wakeup.add_done_callback(self._processed)
+
+    def _processed(self, future):
+        if future.cancelled() or self.state == STATE_STOPPED:
+            return
+        if future.exception():
+            # _process_jobs handles job-store errors itself; anything else shouldn't stop the scheduler
+            self._logger.error("Error processing jobs", exc_info=future.exception())
+            self._start_timer(self.jobstore_retry_interval)
+            return
+        self._start_timer(future.result())
+
+    async def _off_loop(self, func, *args, **kwargs):
+        return await asyncio.wrap_future(self._store_thread.submit(func, *args, **kwargs))
+
+    async def start_async(self, paused=False):
+        """start() loads the stored jobs (and creates the table on first run)."""
+        self._eventloop = asyncio.get_running_loop()
+        await self._off_loop(self.start, paused)
+
+    async def add_job_async(self, *args, **kwargs):
+        return await self._off_loop(self.add_job, *args, **kwargs)
+
+    async def get_job_async(self, job_id):
+        return await self._off_loop(self.get_job, job_id)
+
+    async def get_jobs_async(self):
+        return await self._off_loop(self.get_jobs)
+
+    async def remove_job_async(self, job_id):
+        return await self._off_loop(self.remove_job, job_id)
@@ -0,0 +1,295 @@
+import re
+import datetime
+from zoneinfo import ZoneInfo
+import config
+
+# Fallback when the author isn't in config.PLAYERS (same as the old AI-only path)
+DEFAULT_TZ = ZoneInfo("Asia/Kuala_Lumpur")
+
+# Extra names people use for the players' timezones ("8pm malaysia time")
+TZ_ALIASES = {
+    "Asia/Kuala_Lumpur": ["kl", "malaysia", "myt"],
+    "Africa/Harare": ["zimbabwe"],
+    "Africa/Lusaka": ["zambia"],
+}
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11,
+    "twelve": 12, "fifteen": 15, "twenty": 20, "thirty": 30, "forty": 40,
+    "forty five": 45, "fifty": 50,
+}
+
+UNIT_MINUTES = {
+    "m": 1, "min": 1, "mins": 1, "minute": 1, "minutes": 1,
+    "h": 60, "hr": 60, "hrs": 60, "hour": 60, "hours": 60,
+    "d": 1440, "day": 1440, "days": 1440,
+    "w": 10080, "wk": 10080, "wks": 10080, "week": 10080, "weeks": 10080,
+}
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+# Hour used when only a part of the day is given ("tomorrow morning")
+DAY_PARTS = {"morning": 9, "afternoon": 15, "evening": 19, "tonight": 21, "night": 21}
+
+_WORDS = "|".join(sorted(NUMBER_WORDS, key=len, reverse=True))
+_UNIT = r"(?:" + "|".join(sorted(UNIT_MINUTES, key=len, reverse=True)) + r")"
+# "2h" is fine, but number words need a space before the unit ("in am" is not 1 minute)
+_REL_TERM = rf"\b(?:\d+(?:\.\d+)?\s*|(?:{_WORDS})\s+){_UNIT}\b"
+# Full or abbreviated month names only ("2 decks" is not 2 December)
+_MONTH = r"(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\b\.?"
+
+RE_HALF_HOUR = re.compile(r"\bin\s+half\s+an?\s+hour\b")
+RE_RELATIVE = re.compile(rf"\bin\s+((?:{_REL_TERM}[\s,]*(?:and\s+)?)+)")
+RE_FROM_NOW = re.compile(rf"\b((?:{_REL_TERM}[\s,]*(?:and\s+)?)+)\s*(?:from\s+now|later)\b")
+RE_REL_PART = re.compile(rf"\b(?:(\d+(?:\.\d+)?)\s*|({_WORDS})\s+)({_UNIT})\b")
+
+RE_ISO_DATE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+RE_SLASH_DATE = re.compile(r"\b(\d{1,2})/(\d{1,2})(?:/(\d{2}|\d{4}))?\b")      # DD/MM[/YYYY]
+RE_DAY_MONTH = re.compile(rf"\b(\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?{_MONTH}(?:\s+(\d{{4}}))?\b")
+RE_MONTH_DAY = re.compile(rf"\b{_MONTH}\s+(\d{{1,2}})(st|nd|rd|th)?(?:,?\s+(\d{{4}}))?\b")
+# What may follow a bare "<month> <n>" for it to be a date ("may 2 jokes" is not)
+RE_DATE_TAIL = re.compile(r"\s*(?:$|[,.!?]|(?:at|by|on|@)\b|\d{1,2}(?:[:.]\d{2})?\s*(?:am|pm|a\.m\.|p\.m\.)|\d{1,2}:\d{2})")
+RE_WEEKDAY = re.compile(r"\b(?:(next|this|on)\s+)?(" + "|".join(WEEKDAYS) + r")\b")
+RE_DAY_WORD = re.compile(r"\b(day after tomorrow|tomorrow|tmrw|tmr|today|tonight)\b")
+
+RE_TIME_12H = re.compile(r"\b(\d{1,2})(?:[:.](\d{2}))?\s*(am|pm|a\.m\.|p\.m\.)(?![a-z])")
+RE_TIME_24H = re.compile(r"\b([01]?\d|2[0-3]):([0-5]\d)\b")
+RE_TIME_BARE = re.compile(r"\b(?:at|@|by)\s+(\d{1,2})\b(?!\s*[:./]|\s*" + _UNIT + r"\b)")
+RE_TIME_WORD = re.compile(r"\b(noon|midday|midnight)\b")
+RE_DAY_PART = re.compile(r"\b(morning|afternoon|evening|tonight|night)\b")
+
+
+# ==========================================
+# 1. TIMEZONES (From config.PLAYERS)
+# ==========================================
+def tz_for_user(user_id):
+    """Returns the player's timezone, or DEFAULT_TZ for anyone else."""
+    for p in config.PLAYERS:
+        if p["id"] == user_id:
+            return ZoneInfo(p["tz"])
+    return DEFAULT_TZ
+
+def partner_tz_for_user(user_id):
+    for p in config.PLAYERS:
+        if p["id"] != user_id:
+            return ZoneInfo(p["tz"])
+    return None
+
+def _tz_names():
+    """Maps every spoken name of a player's timezone to its tz key."""
+    names = {}
+    for p in config.PLAYERS:
+        key = p["tz"]
+        names[key.split("/")[-1].replace("_", " ").lower()] = key
+        for alias in TZ_ALIASES.get(key, []):
+            names[alias] = key
+    return names
+
+def _extract_tz(text, user_id):
+    """Finds "<place> time" / "my time" / "your time". Returns (tz or None, text without it)."""
+    m = re.search(r"\b(my|your|his|her|their|partner'?s)\s+time\b", text)
+    if m:
+        if m.group(1) == "my":
+            tz = tz_for_user(user_id)
+        else:
+            tz = partner_tz_for_user(user_id)
+        if tz:
+            return tz, _cut(text, m)
+
+    for name, key in sorted(_tz_names().items(), key=lambda kv: -len(kv[0])):
+        m = re.search(rf"\b(?:in\s+{re.escape(name)}|{re.escape(name)}\s+time)\b", text)
+        if m:
+            return ZoneInfo(key), _cut(text, m)
+    return None, text
+
+
+# ==========================================
+# 2. PARSER
+# ==========================================
+def _cut(text, match):
+    return text[:match.start()] + " " + text[match.end():]
+
+def _number(token):
+    token = token.strip()
+    if token in NUMBER_WORDS:
+        return NUMBER_WORDS[token]
+    return float(token)
+
+def _relative_minutes(text):
+    """Returns (minutes, text without the phrase) for "in 2 hours" style input."""
+    m = RE_HALF_HOUR.search(text)
+    if m:
+        return 30, _cut(text, m)
+
+    m = RE_RELATIVE.search(text) or RE_FROM_NOW.search(text)
+    if not m:
+        return None, text
+
+    minutes = 0
+    for digits, word, unit in RE_REL_PART.findall(m.group(1)):
+        minutes += _number(digits or word) * UNIT_MINUTES[unit]
+    return minutes, _cut(text, m)
+
+def _extract_date(text, today):
+    """Returns (date or None, day-part hint or None, text without the phrase)."""
+    m = RE_ISO_DATE.search(text)
+    if m:
+        y, mo, d = (int(g) for g in m.groups())
+        return datetime.date(y, mo, d), None, _cut(text, m)
+
+    for regex, order in ((RE_DAY_MONTH, "dm"), (RE_MONTH_DAY, "md")):
+        m = regex.search(text)
+        if m:
+            if order == "dm":
+                day, month, year = m.group(1), m.group(2), m.group(3)
+            else:
+                month, day, suffix, year = m.groups()
+                # "may", "march": a bare month + number is only a date when a time or the end follows
+                if not (suffix or year or RE_DATE_TAIL.match(text, m.end())):
+                    raise ValueError("month name or verb")
+            rest = _cut(text, m)
+            if RE_DAY_WORD.search(rest) or RE_WEEKDAY.search(rest):
+                raise ValueError("two dates")     # "march 3 ... tomorrow"
+            return _future_date(today, int(day), MONTHS[month[:3]], year), None, rest
+
+    m = RE_SLASH_DATE.search(text)
+    if m:
+        day, month, year = m.groups()
+        if year and len(year) == 2:
+            year = "20" + year
+        return _future_date(today, int(day), int(month), year), None, _cut(text, m)
+
+    m = RE_DAY_WORD.search(text)
+    if m:
+        word = m.group(1)
+        if word == "day after tomorrow":
+            return today + datetime.timedelta(days=2), None, _cut(text, m)
+        if word in ("tomorrow", "tmrw", "tmr"):
+            return today + datetime.timedelta(days=1), None, _cut(text, m)
+        hint = "tonight" if word == "tonight" else None
+        return today, hint, _cut(text, m)
+
+    m = RE_WEEKDAY.search(text)
+    if m:
+        prefix, name = m.groups()
+        days_ahead = (WEEKDAYS.index(name) - today.weekday()) % 7
+        if prefix == "next" and days_ahead == 0:
+            days_ahead = 7
+        return today + datetime.timedelta(days=days_ahead), None, _cut(text, m)
+
+    return None, None, text
+
+def _future_date(today, day, month, year):
+    """Day/month without a year means the next time that date comes around."""
+    if year:
+        return datetime.date(int(year), month, day)
+    candidate = datetime.date(today.year, month, day)
+    if candidate < today:
+        candidate = datetime.date(today.year + 1, month, day)
+    return candidate
+
+def _extract_time(text):
+    """Returns ((hour, minute, ambiguous) or None, day-part hint or None)."""
+    hint = None
+    m = RE_DAY_PART.search(text)
+    if m:
+        hint = m.group(1)
+        text = _cut(text, m)
+
+    m = RE_TIME_12H.search(text)
+    if m:
+        hour, minute, meridiem = int(m.group(1)), int(m.group(2) or 0), m.group(3)
+        if not 1 <= hour <= 12 or minute > 59:
+            raise ValueError("bad 12h time")
+        hour = hour % 12 + (12 if meridiem.startswith("p") else 0)
+        return (hour, minute, False), hint
+
+    m = RE_TIME_24H.search(text)
+    if m:
+        return (int(m.group(1)), int(m.group(2)), False), hint
+
+    m = RE_TIME_WORD.search(text)
+    if m:
+        return ((0 if m.group(1) == "midnight" else 12), 0, False), hint
+
+    m = RE_TIME_BARE.search(text)
+    if m:
+        hour = int(m.group(1))
+        if not 0 <= hour <= 23:
+            raise ValueError("bad hour")
+        return (hour, 0, 1 <= hour <= 12), hint
+
+    return None, hint
+
+def parse_datetime(text, now, user_id=None):
+    """
+    Turns common reminder phrasings into an aware datetime, or returns None
+    so the caller can fall back to the AI parser.
+
+    Understands "in 2 hours", "30 mins from now", "tomorrow at 8pm",
+    "friday 7:30pm", "25 dec at 9am", "2026-03-01 14:00", "at noon" and
+    "8pm harare time" / "9am your time". Times are read in the author's
+    timezone from config.PLAYERS unless another one is named. A dated time
+    that comes out in the past, or a month name that may just be a word
+    ("tell may 2 jokes"), returns None too. `now` must be timezone-aware.
+    """
+    text = f" {text.lower()} "
+    try:
+        tz, text = _extract_tz(text, user_id)
+        minutes, text = _relative_minutes(text)
+        local_tz = tz or tz_for_user(user_id)
+        local_now = now.astimezone(local_tz)
+
+        date, date_hint, text = _extract_date(text, local_now.date())
+        clock, hint = _extract_time(text)
+    except ValueError:
+        # Matched something that isn't a real date/time ("31/02", "25pm")
+        return None
+
+    hint = hint or date_hint
+
+    if minutes is not None:
+        if date or clock:
+            return None     # "in 2 hours tomorrow at 5pm" - let the AI sort it out
+        return (now + datetime.timedelta(minutes=minutes)).astimezone(local_tz)
+
+    if clock is None:
+        if date is None or hint not in DAY_PARTS:
+            return None     # No time given ("buy milk tomorrow")
+        clock = (DAY_PARTS[hint], 0, False)
+
+    hour, minute, ambiguous = clock
+    if ambiguous:
+        if hint in ("tonight", "night") and hour == 12:
+            hour = 0        # "at 12 tonight" is midnight
+        elif hint in ("afternoon", "evening", "tonight", "night"):
+            hour = hour % 12 + 12
+        elif hint != "morning" and date is not None and hour <= 6:
+            hour += 12      # "tomorrow at 5" means 5 PM
+
+    if date is None:
+        # Time only: the next time the clock shows it
+        candidates = [(hour, minute)]
+        if ambiguous and hint is None:
+            candidates.append(((hour + 12) % 24, minute))     # "at 12": noon or midnight
+        upcoming = []
+        for day_offset in (0, 1):
+            day = local_now.date() + datetime.timedelta(days=day_offset)
+            for h, mi in candidates:
+                result = datetime.datetime(day.year, day.month, day.day, h, mi, tzinfo=local_tz)
+                if result > local_now:
+                    upcoming.append(result)
+        return min(upcoming, default=None)
+
+    if hour == 0 and minute == 0 and hint in ("tonight", "night"):
+        date += datetime.timedelta(days=1)     # "midnight tonight"
+    result = datetime.datetime(date.year, date.month, date.day, hour, minute, tzinfo=local_tz)
+    if result <= local_now:
+        return None     # Misread somewhere ("today at 9" at 10 PM); let the AI have a go
+    return result